@@ -1,7 +1,19 @@
-from app.agents.base_agent import BaseAgent
-from app.agents.constants import AgentType
-from app.agents.content import ContentAgent
-from app.agents.dev import DevAgent
-from app.agents.peer import PeerAgent
+import importlib
+
+# Resolved on first access (PEP 562) so importing app.agents.constants or app.agents.routing
+# does not pull in LangChain and the OpenAI client.
+_EXPORTS = {
+    "BaseAgent": "app.agents.base_agent",
+    "AgentType": "app.agents.constants",
+    "ContentAgent": "app.agents.content",
+    "DevAgent": "app.agents.dev",
+    "PeerAgent": "app.agents.peer",
+}
 
 __all__ = ["DevAgent", "ContentAgent", "PeerAgent", "AgentType", "BaseAgent"]
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,22 +1,219 @@
+import asyncio
+import logging
+from typing import Callable, List, Optional, Tuple, TypeVar
+
 from langchain_openai import ChatOpenAI
 
 from app.core.config import settings
+from app.core.deadline import stage_timeout
+from app.core.metrics import record_cascade_tier, record_escalation, record_llm_usage, timed_stage, total_tokens
+from app.core.tokens import count_tokens
+from app.services.cache import llm_cache, llm_cache_key
+from app.services.circuit_breaker import openai_breaker
+from app.services.events import TokenBuffer, apublish_event, publish_event, streaming_enabled
+from app.services.rate_limiter import llm_rate_limiter
+from app.services.session_memory import with_history
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Turns a generated answer into the agent's result plus why it should go to a stronger model (None: accept)
+Review = Callable[[str], Tuple[T, Optional[str]]]
+
+
+def _accept(content: str) -> Tuple[str, Optional[str]]:
+    return content, None
+
+
+def _cascade_models(cascade: str) -> List[str]:
+    models = [model.strip() for model in cascade.split(",") if model.strip()]
+    return models or [settings.OPENAI_MODEL_WORKER]
+
+
+def _build_llm(model: str) -> ChatOpenAI:
+    return ChatOpenAI(
+        model=model,
+        temperature=0.2,
+        openai_api_key=settings.OPENAI_API_KEY,
+        max_retries=settings.OPENAI_MAX_RETRIES,
+        timeout=settings.OPENAI_TIMEOUT_SECONDS,
+        stream_usage=True,
+    )
 
 
 class BaseAgent:
     """Shared LLM setup and basic execute behavior for agents."""
 
-    def __init__(self, role: str):
+    # Label for per-agent metrics such as token usage
+    name = "base_agent"
+
+    def __init__(self, role: str, cache_ttl: Optional[int] = None, model_cascade: str = ""):
         self.role = role
-        self.llm = ChatOpenAI(
-            model=settings.OPENAI_MODEL_WORKER,
-            temperature=0.2,
-            openai_api_key=settings.OPENAI_API_KEY
-        ) if settings.OPENAI_API_KEY else None
+        self.cache_ttl = cache_ttl or settings.LLM_CACHE_TTL_SECONDS
+        llms = [_build_llm(model) for model in _cascade_models(model_cascade)] if settings.OPENAI_API_KEY else [None]
+        # The cheapest model serves every call; answers failing the agent's check move up escalation_llms
+        self.llm = llms[0]
+        self.escalation_llms = llms[1:]
+
+    @staticmethod
+    def _cache_key(llm, prompt: str) -> str:
+        return llm_cache_key(llm.model_name, llm.temperature, prompt)
+
+    def _estimated_tokens(self, prompt: str) -> int:
+        return count_tokens(prompt) + settings.LLM_EXPECTED_COMPLETION_TOKENS
+
+    @staticmethod
+    def _invoke(llm, prompt: str, stream: bool) -> Tuple[str, Optional[dict]]:
+        """One provider call, timed out by the task deadline; returns the content and LangChain usage_metadata."""
+        timeout = stage_timeout(settings.OPENAI_TIMEOUT_SECONDS, "LLM call")
+        if not stream:
+            message = llm.invoke(prompt, timeout=timeout)
+            return message.content, message.usage_metadata
+        usage = None
+        chunks = []
+        buffer = TokenBuffer()
+        for chunk in llm.stream(prompt, timeout=timeout):
+            chunks.append(chunk.content)
+            # With stream_usage the provider sends token counts on the final chunk
+            usage = chunk.usage_metadata or usage
+            text = buffer.add(chunk.content)
+            if text:
+                publish_event("token", text)
+        text = buffer.drain()
+        if text:
+            publish_event("token", text)
+        return "".join(chunks), usage
+
+    @staticmethod
+    async def _ainvoke(llm, prompt: str, stream: bool) -> Tuple[str, Optional[dict]]:
+        timeout = stage_timeout(settings.OPENAI_TIMEOUT_SECONDS, "LLM call")
+        if not stream:
+            message = await llm.ainvoke(prompt, timeout=timeout)
+            return message.content, message.usage_metadata
+        usage = None
+        chunks = []
+        buffer = TokenBuffer()
+        async for chunk in llm.astream(prompt, timeout=timeout):
+            chunks.append(chunk.content)
+            usage = chunk.usage_metadata or usage
+            text = buffer.add(chunk.content)
+            if text:
+                await apublish_event("token", text)
+        text = buffer.drain()
+        if text:
+            await apublish_event("token", text)
+        return "".join(chunks), usage
+
+    def _complete(self, prompt: str, stream: bool = False, llm=None) -> str:
+        """
+        Cached, rate-limited LLM call behind the OpenAI circuit breaker. With stream=True and a bound
+        task, tokens are published to the task's event stream as they arrive; internal prompts leave
+        it off. llm defaults to the agent's cheapest model.
+        """
+        llm = llm or self.llm
+        stream = stream and streaming_enabled()
+        key = self._cache_key(llm, prompt)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            if stream:
+                publish_event("token", cached)
+            return cached
+
+        content, usage = openai_breaker.call(lambda: llm_rate_limiter.call(
+            llm.model_name,
+            self._estimated_tokens(prompt),
+            lambda: self._invoke(llm, prompt, stream),
+            lambda result: total_tokens(result[1]),
+        ))
+        record_llm_usage(self.name, llm.model_name, usage)
+        llm_cache.set(key, content, ttl=self.cache_ttl)
+        return content
+
+    async def _acomplete(self, prompt: str, stream: bool = False, llm=None) -> str:
+        llm = llm or self.llm
+        stream = stream and streaming_enabled()
+        key = self._cache_key(llm, prompt)
+        cached = await asyncio.to_thread(llm_cache.get, key)
+        if cached is not None:
+            if stream:
+                await apublish_event("token", cached)
+            return cached
+
+        content, usage = await openai_breaker.acall(lambda: llm_rate_limiter.acall(
+            llm.model_name,
+            self._estimated_tokens(prompt),
+            lambda: self._ainvoke(llm, prompt, stream),
+            lambda result: total_tokens(result[1]),
+        ))
+        record_llm_usage(self.name, llm.model_name, usage)
+        await asyncio.to_thread(llm_cache.set, key, content, self.cache_ttl)
+        return content
+
+    def _escalate(self, tiers: list, tier: int, reason: str) -> dict:
+        model, stronger = tiers[tier].model_name, tiers[tier + 1].model_name
+        logger.info(f"{self.name}: {model} answer rejected ({reason}), escalating to {stronger}")
+        record_escalation(self.name, model, reason)
+        # Tokens already streamed belong to the rejected answer; clients start over on this event
+        return {"from_model": model, "to_model": stronger, "reason": reason}
+
+    def _cascade(self, prompt: str, review: Review = _accept, stream: bool = False) -> T:
+        """
+        Generate with the cheapest model first and move to the next, stronger one only while
+        review() rejects the answer; the last tier's answer is taken as-is. The serving model
+        and tier are recorded on the task. Answers see the session's conversation when the task
+        has one; internal prompts (rewrites, summaries) go through _complete without it.
+        """
+        prompt = with_history(prompt)
+        tiers = [self.llm, *self.escalation_llms]
+        for tier, llm in enumerate(tiers):
+            result, reason = review(self._complete(prompt, stream, llm))
+            if reason is None or tier == len(tiers) - 1:
+                record_cascade_tier(self.name, llm.model_name, tier)
+                return result
+            escalation = self._escalate(tiers, tier, reason)
+            if stream:
+                publish_event("escalated", escalation)
+
+    async def _acascade(self, prompt: str, review: Review = _accept, stream: bool = False) -> T:
+        prompt = with_history(prompt)
+        tiers = [self.llm, *self.escalation_llms]
+        for tier, llm in enumerate(tiers):
+            result, reason = review(await self._acomplete(prompt, stream, llm))
+            if reason is None or tier == len(tiers) - 1:
+                record_cascade_tier(self.name, llm.model_name, tier)
+                return result
+            escalation = self._escalate(tiers, tier, reason)
+            if stream:
+                await apublish_event("escalated", escalation)
+
+    @staticmethod
+    def _summary_prompt(summary: str, transcript: str) -> str:
+        return (
+            "You keep a running summary of a conversation between a user and an assistant. "
+            "Update it with the new turns below. Keep facts, decisions, names, numbers, code/file names "
+            "and open questions the user may refer back to; drop pleasantries and repetition. "
+            f"Stay under {settings.SESSION_SUMMARY_MAX_TOKENS * 3 // 4} words and return only the summary.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\n"
+            f"New turns:\n{transcript}"
+        )
+
+    def summarize(self, summary: str, transcript: str) -> str:
+        """Fold transcript into a session's running summary; without an LLM the text is kept as-is (and clipped later)."""
+        if not self.llm:
+            return f"{summary}\n{transcript}".strip()
+        return self._complete(self._summary_prompt(summary, transcript))
 
     def execute(self, task: str) -> str:
         # Base execution for fallback
         if not self.llm:
             return f"[Mock] {self.role} executed task: {task}"
-        response = self.llm.invoke(task)
-        return response.content
+        with timed_stage("generate"):
+            return self._cascade(task, stream=True)
+
+    async def aexecute(self, task: str) -> str:
+        """Async counterpart of execute; never blocks the event loop on I/O."""
+        if not self.llm:
+            return f"[Mock] {self.role} executed task: {task}"
+        with timed_stage("generate"):
+            return await self._acascade(task, stream=True)
@@ -7,3 +7,14 @@ class AgentType(str, Enum):
 
 
 AGENT_IDS = [agent.value for agent in AgentType]
+
+# Not a routing target; identifies the router in metrics
+PEER_AGENT_ID = "peer_agent"
+
+AGENT_DESCRIPTIONS = {
+    AgentType.DEV: "Handles software development tasks, coding, debugging, file manipulation, and technical questions.",
+    AgentType.CONTENT: "Handles research, general questions, creative writing, summarization, and non-technical tasks.",
+}
+
+DEV_LANG_KEYWORDS = ["python", "javascript", "typescript", "bash", "powershell", "dockerfile"]
+DEV_INTENT_KEYWORDS = ["create a file", "write a file", "code", "kod", "script", "dosya", "yaz"]
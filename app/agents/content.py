@@ -1,17 +1,69 @@
+import asyncio
+import contextvars
+import json
 import logging
-from typing import List, Optional
-
-import requests
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
 
 from app.agents.base_agent import BaseAgent
+from app.agents.constants import AgentType
+from app.agents.context_packer import pack_context
 from app.core.config import settings
+from app.core.deadline import stage_timeout
+from app.core.metrics import record_context_packing, timed_stage
+from app.services.cache import search_cache, search_cache_key
+from app.services.circuit_breaker import CircuitOpenError, openai_breaker, search_breaker
+from app.services.events import apublish_event, publish_event
+from app.services.http_client import get_async_http_client, get_http_session
 
 logger = logging.getLogger(__name__)
 
+GOOGLE_CSE_URL = "https://www.googleapis.com/customsearch/v1"
+
+_LIST_MARKER_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+# "Sources:" heading of a grounded answer, tolerating markdown emphasis/heading markers
+_SOURCES_RE = re.compile(r"^[\s#*_]*sources[*_]*\s*:", re.IGNORECASE | re.MULTILINE)
+
+# Shared pool for concurrent CSE calls in the sync research path; threads start lazily, after fork
+_search_pool = ThreadPoolExecutor(max_workers=settings.CONTENT_SEARCH_WORKERS, thread_name_prefix="cse-search")
+
+
+def _submit(fn, *args):
+    # Carry context variables (e.g. cache bypass) into the pool thread
+    return _search_pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _normalize_url(link: str) -> str:
+    parts = urlsplit(link.strip())
+    return f"{parts.netloc.lower()}{parts.path.rstrip('/')}?{parts.query}"
+
 
 class ContentAgent(BaseAgent):
+    name = AgentType.CONTENT.value
+
     def __init__(self):
-        super().__init__("Content Agent")
+        super().__init__(
+            "Content Agent",
+            cache_ttl=settings.LLM_CACHE_TTL_CONTENT_SECONDS,
+            model_cascade=settings.CONTENT_MODEL_CASCADE,
+        )
+
+    @staticmethod
+    def _rewrite_prompt(task: str) -> str:
+        return (
+            "Rewrite the user's request into a concise, English web search query. "
+            "Keep it factual and include key entities (teams/city/topic) and timeframe if implied. "
+            "Return only the query, nothing else.\n\n"
+            f"User request: {task}"
+        )
+
+    @staticmethod
+    def _clean_query(rewritten: str, task: str) -> str:
+        rewritten = rewritten.strip().replace("\n", " ")
+        return rewritten or task
 
     def _rewrite_query(self, task: str) -> str:
         """
@@ -20,75 +72,237 @@ class ContentAgent(BaseAgent):
         """
         if not self.llm:
             return task
-        prompt = (
-            "Rewrite the user's request into a concise, English web search query. "
-            "Keep it factual and include key entities (teams/city/topic) and timeframe if implied. "
-            "Return only the query, nothing else.\n\n"
-            f"User request: {task}"
-        )
         try:
-            response = self.llm.invoke(prompt)
-            rewritten = getattr(response, "content", "") or str(response)
-            rewritten = rewritten.strip().replace("\n", " ")
-            return rewritten or task
+            with timed_stage("rewrite"):
+                return self._clean_query(self._complete(self._rewrite_prompt(task)), task)
         except Exception as e:
             logger.error(f"Query rewrite failed: {e}", exc_info=True)
             return task
 
-    def _google_search(self, task: str, max_results: int = 5) -> Optional[List[dict]]:
+    async def _arewrite_query(self, task: str) -> str:
+        if not self.llm:
+            return task
+        try:
+            with timed_stage("rewrite"):
+                return self._clean_query(await self._acomplete(self._rewrite_prompt(task)), task)
+        except Exception as e:
+            logger.error(f"Query rewrite failed: {e}", exc_info=True)
+            return task
+
+    @staticmethod
+    def _multi_query_prompt(task: str, count: int) -> str:
+        return (
+            f"Rewrite the user's request into {count} complementary, concise English web search queries. "
+            "Each query should cover a different angle (entities, timeframe, official sources, recent news). "
+            "Return one query per line, nothing else.\n\n"
+            f"User request: {task}"
+        )
+
+    @staticmethod
+    def _parse_queries(response: str, count: int) -> List[str]:
+        queries = []
+        for line in response.splitlines():
+            query = _LIST_MARKER_RE.sub("", line).strip().strip('"')
+            if query and query.lower() not in (q.lower() for q in queries):
+                queries.append(query)
+        return queries[:count]
+
+    def _rewrite_queries(self, task: str) -> List[str]:
+        """One LLM call producing several search queries; falls back to the raw task."""
+        count = settings.CONTENT_RESEARCH_QUERIES
+        if not self.llm:
+            return [task]
+        try:
+            with timed_stage("rewrite"):
+                return self._parse_queries(self._complete(self._multi_query_prompt(task, count)), count) or [task]
+        except Exception as e:
+            logger.error(f"Multi-query rewrite failed: {e}", exc_info=True)
+            return [task]
+
+    async def _arewrite_queries(self, task: str) -> List[str]:
+        count = settings.CONTENT_RESEARCH_QUERIES
+        if not self.llm:
+            return [task]
+        try:
+            with timed_stage("rewrite"):
+                return self._parse_queries(await self._acomplete(self._multi_query_prompt(task, count)), count) or [task]
+        except Exception as e:
+            logger.error(f"Multi-query rewrite failed: {e}", exc_info=True)
+            return [task]
+
+    @staticmethod
+    def _merge_results(result_lists: List[Optional[List[dict]]]) -> Optional[List[dict]]:
+        """Interleave results across queries, dropping repeated URLs, so every query contributes."""
+        merged = []
+        seen = set()
+        lists = [items for items in result_lists if items]
+        for rank in range(max((len(items) for items in lists), default=0)):
+            for items in lists:
+                if rank >= len(items):
+                    continue
+                item = items[rank]
+                link = item.get("link")
+                key = _normalize_url(link) if link else item.get("snippet")
+                if key in seen:
+                    continue
+                seen.add(key)
+                merged.append(item)
+        return merged[:settings.CONTENT_MAX_SOURCES] or None
+
+    def _research(self, task: str) -> Optional[List[dict]]:
+        if self._search_params(task, 1) is None:
+            return None
+        # The raw-task search overlaps with the rewrite call; query searches run side by side
+        raw_future = _submit(self._google_search, task)
+        queries = self._rewrite_queries(task)
+        futures = [_submit(self._google_search, query) for query in queries if query != task]
+        return self._merge_results([raw_future.result()] + [f.result() for f in futures])
+
+    async def _aresearch(self, task: str) -> Optional[List[dict]]:
+        if self._search_params(task, 1) is None:
+            return None
+        raw_search = asyncio.create_task(self._agoogle_search(task))
+        queries = await self._arewrite_queries(task)
+        results = await asyncio.gather(
+            raw_search,
+            *(self._agoogle_search(query) for query in queries if query != task),
+        )
+        return self._merge_results(list(results))
+
+    @staticmethod
+    def _search_params(task: str, max_results: int) -> Optional[dict]:
         api_key = settings.GOOGLE_API_KEY
         cse_id = settings.GOOGLE_CSE_ID
         if not api_key or not cse_id:
             return None
+        return {"q": task, "key": api_key, "cx": cse_id, "num": max_results}
+
+    def _google_search(self, task: str, max_results: int = 5) -> Optional[List[dict]]:
+        params = self._search_params(task, max_results)
+        if params is None:
+            return None
+        publish_event("searching", {"query": task})
+        key = search_cache_key(task, max_results)
+        cached = search_cache.get(key)
+        if cached is not None:
+            return json.loads(cached) or None
+        if not search_breaker.allow():
+            return None
         try:
-            resp = requests.get(
-                "https://www.googleapis.com/customsearch/v1",
-                params={"q": task, "key": api_key, "cx": cse_id, "num": max_results},
-                timeout=5,
-            )
+            timeout = stage_timeout(settings.SEARCH_TIMEOUT_SECONDS, "search")
+            resp = get_http_session().get(GOOGLE_CSE_URL, params=params, timeout=timeout)
             resp.raise_for_status()
-            items: List[dict] = resp.json().get("items") or []
-            if not items:
-                return None
-            return items[:max_results]
+            items: List[dict] = (resp.json().get("items") or [])[:max_results]
         except Exception as e:
+            search_breaker.record_failure(e)
             logger.error(f"Google search failed: {e}", exc_info=True)
             return None
+        search_breaker.record_success()
+        # Empty results are cached too, they cost the same CSE quota
+        search_cache.set(key, json.dumps(items))
+        return items or None
+
+    async def _agoogle_search(self, task: str, max_results: int = 5) -> Optional[List[dict]]:
+        params = self._search_params(task, max_results)
+        if params is None:
+            return None
+        await apublish_event("searching", {"query": task})
+        key = search_cache_key(task, max_results)
+        cached = await asyncio.to_thread(search_cache.get, key)
+        if cached is not None:
+            return json.loads(cached) or None
+        if not await asyncio.to_thread(search_breaker.allow):
+            return None
+        try:
+            timeout = stage_timeout(settings.SEARCH_TIMEOUT_SECONDS, "search")
+            resp = await get_async_http_client().get(GOOGLE_CSE_URL, params=params, timeout=timeout)
+            resp.raise_for_status()
+            items: List[dict] = (resp.json().get("items") or [])[:max_results]
+        except Exception as e:
+            await asyncio.to_thread(search_breaker.record_failure, e)
+            logger.error(f"Google search failed: {e}", exc_info=True)
+            return None
+        await asyncio.to_thread(search_breaker.record_success)
+        await asyncio.to_thread(search_cache.set, key, json.dumps(items))
+        return items or None
+
+    @staticmethod
+    def _grounded_prompt(task: str, search_items: List[dict]) -> str:
+        with timed_stage("pack_context"):
+            packed = pack_context(
+                task,
+                search_items,
+                settings.CONTENT_CONTEXT_TOKEN_BUDGET,
+                settings.CONTENT_SNIPPET_SIMILARITY,
+            )
+        record_context_packing(packed.tokens_unpacked, packed.tokens)
+        logger.info(
+            f"Packed {len(packed.items)}/{len(search_items)} search results into {packed.tokens} tokens "
+            f"(saved {packed.tokens_saved}; {packed.duplicates_dropped} duplicates, "
+            f"{packed.over_budget_dropped} over budget)"
+        )
+        return (
+            "You are a research assistant. Use ONLY the provided search results to answer concisely. "
+            "If the question is about an event time/date (e.g., a match), include the specific date/time if present in the results. "
+            "If no exact date is present, clearly state that the date/time was not found in the provided results. "
+            "Add a 'Sources' section using only the Source links given with the results; do not invent links.\n\n"
+            f"User asked: {task}\n\n"
+            f"Search Results:\n{packed.text or 'not available'}\n\n"
+            "Format:\n"
+            "Answer: <concise answer>\n"
+            "Sources:\n"
+            "- <source link> (optional short note)\n"
+        )
+
+    @staticmethod
+    def _review_grounded(answer: str) -> Tuple[str, Optional[str]]:
+        """A grounded answer must end with a Sources section listing at least one link."""
+        match = _SOURCES_RE.search(answer)
+        if match is None or "http" not in answer[match.end():]:
+            return answer, "missing_sources"
+        return answer, None
 
     def execute(self, task: str) -> str:
         if not self.llm:
             return super().execute(task)
-        
-        query = self._rewrite_query(task)
-        search_items = self._google_search(query)
+        if openai_breaker.is_open():
+            # No answer could be generated; spare the search quota
+            raise CircuitOpenError("openai is unavailable (circuit open)")
+
+        # In research mode the rewrite overlaps the raw-task search, so "search" spans both
+        if settings.CONTENT_RESEARCH_MODE:
+            with timed_stage("search"):
+                search_items = self._research(task)
+        else:
+            query = self._rewrite_query(task)
+            with timed_stage("search"):
+                search_items = self._google_search(query)
 
         if search_items:
-            snippets = []
-            sources = []
-            for item in search_items:
-                title = item.get("title") or ""
-                snippet = item.get("snippet") or ""
-                link = item.get("link") or ""
-                snippets.append(f"{title} {snippet} {link}".strip())
-                if link:
-                    sources.append(link)
-
-            sources_text = "\n".join(f"- {s}" for s in sources) or "- not available"
-            search_blob = "\n".join(snippets)
-            prompt = (
-                "You are a research assistant. Use ONLY the provided search snippets to answer concisely. "
-                "If the question is about an event time/date (e.g., a match), include the specific date/time if present in snippets. "
-                "If no exact date is present, clearly state that the date/time was not found in the provided results. "
-                "Add a 'Sources' section using only the Allowed Sources list; do not invent links.\n\n"
-                f"User asked: {task}\n\n"
-                f"Search Results:\n{search_blob}\n\n"
-                f"Allowed Sources:\n{sources_text}\n\n"
-                "Format:\n"
-                "Answer: <concise answer>\n"
-                "Sources:\n"
-                "- <source link> (optional short note)\n"
-            )
-            return super().execute(prompt)
+            prompt = self._grounded_prompt(task, search_items)
+            with timed_stage("generate"):
+                return self._cascade(prompt, self._review_grounded, stream=True)
 
         # If search unavailable or empty, fall back to plain LLM answer
         return super().execute(task)
+
+    async def aexecute(self, task: str) -> str:
+        if not self.llm:
+            return await super().aexecute(task)
+        if await asyncio.to_thread(openai_breaker.is_open):
+            raise CircuitOpenError("openai is unavailable (circuit open)")
+
+        if settings.CONTENT_RESEARCH_MODE:
+            with timed_stage("search"):
+                search_items = await self._aresearch(task)
+        else:
+            query = await self._arewrite_query(task)
+            with timed_stage("search"):
+                search_items = await self._agoogle_search(query)
+
+        if search_items:
+            prompt = self._grounded_prompt(task, search_items)
+            with timed_stage("generate"):
+                return await self._acascade(prompt, self._review_grounded, stream=True)
+
+        return await super().aexecute(task)
@@ -0,0 +1,123 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Set
+
+from pydantic import BaseModel
+
+from app.core.tokens import count_tokens
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "by", "for", "from", "how", "in", "is", "it", "of", "on",
+    "or", "the", "to", "what", "when", "where", "which", "who", "why", "with",
+}
+
+
+class PackedContext(BaseModel):
+    items: List[dict]
+    text: str
+    tokens: int
+    tokens_unpacked: int
+    duplicates_dropped: int
+    over_budget_dropped: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_unpacked - self.tokens)
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def _shingles(words: List[str], size: int = 3) -> Set[tuple]:
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: Set[tuple], b: Set[tuple]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _clean(text: str) -> str:
+    return " ".join((text or "").replace("\xa0", " ").split()).strip(" .…")
+
+
+def render_item(index: int, item: dict) -> str:
+    # Each link appears exactly once, next to the text it supports
+    line = f"[{index}] {_clean(item.get('title'))}: {_clean(item.get('snippet'))}"
+    link = (item.get("link") or "").strip()
+    return f"{line}\n    Source: {link}" if link else line
+
+
+def unpacked_size(items: List[dict]) -> int:
+    """Tokens the previous layout spent: every title/snippet/link, then every link again as a source list."""
+    blob = "\n".join(f"{i.get('title') or ''} {i.get('snippet') or ''} {i.get('link') or ''}".strip() for i in items)
+    sources = "\n".join(f"- {i['link']}" for i in items if i.get("link"))
+    return count_tokens(blob) + count_tokens(sources)
+
+
+def _relevance(task_words: List[str], items: List[dict]) -> List[float]:
+    """BM25-style overlap between the task and each result, with a small bonus for the search engine's own rank."""
+    docs = [_words(f"{item.get('title') or ''} {item.get('snippet') or ''}") for item in items]
+    avg_len = sum(len(d) for d in docs) / len(docs) if docs else 0.0
+    doc_freq: Dict[str, int] = Counter(w for d in docs for w in set(d))
+    query = set(task_words)
+    scores = []
+    for rank, doc in enumerate(docs):
+        tf = Counter(doc)
+        score = 0.0
+        for word in query:
+            if not tf[word]:
+                continue
+            idf = math.log(1 + (len(docs) - doc_freq[word] + 0.5) / (doc_freq[word] + 0.5))
+            norm = tf[word] * 2.2 / (tf[word] + 1.2 * (0.25 + 0.75 * len(doc) / (avg_len or 1)))
+            score += idf * norm
+        scores.append(score + 0.1 / (1 + rank))
+    return scores
+
+
+def pack_context(task: str, items: List[dict], token_budget: int, similarity: float = 0.8) -> PackedContext:
+    """
+    Build the search-results block for a grounded prompt: drop near-duplicate snippets
+    (word 3-gram Jaccard >= similarity), rank by relevance to the task and keep the best
+    results that fit in token_budget. Kept results are renumbered in ranked order.
+    """
+    scores = _relevance(_words(task), items)
+    ranked = sorted(range(len(items)), key=lambda i: scores[i], reverse=True)
+
+    kept: List[dict] = []
+    kept_shingles: List[Set[tuple]] = []
+    duplicates = over_budget = 0
+    used = 0
+    lines: List[str] = []
+    for i in ranked:
+        item = items[i]
+        shingles = _shingles(_words(f"{item.get('title') or ''} {item.get('snippet') or ''}"))
+        if any(_jaccard(shingles, other) >= similarity for other in kept_shingles):
+            duplicates += 1
+            continue
+        line = render_item(len(kept) + 1, item)
+        cost = count_tokens(line + "\n")
+        if used + cost > token_budget:
+            # A shorter lower-ranked result may still fit
+            over_budget += 1
+            continue
+        kept.append(item)
+        kept_shingles.append(shingles)
+        lines.append(line)
+        used += cost
+
+    text = "\n".join(lines)
+    return PackedContext(
+        items=kept,
+        text=text,
+        tokens=count_tokens(text),
+        tokens_unpacked=unpacked_size(items),
+        duplicates_dropped=duplicates,
+        over_budget_dropped=over_budget,
+    )
@@ -1,29 +1,106 @@
+import ast
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional, Tuple
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import PydanticOutputParser
+from pydantic import BaseModel, Field
 
 from app.agents.base_agent import BaseAgent
+from app.agents.constants import DEV_INTENT_KEYWORDS, DEV_LANG_KEYWORDS, AgentType
 from app.core.config import settings
+from app.core.metrics import timed_stage
+from app.services.events import apublish_event, publish_event
+from app.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class CodeArtifact(BaseModel):
+    filename: str = Field(description="Concise filename with a relevant extension, no directories")
+    language: str = Field(description="Programming language of the code, e.g. python")
+    code: str = Field(description="Complete file content only: no prose, no markdown fences")
+
+
+def _strip_fences(text: str) -> str:
+    lines = text.strip().splitlines()
+    if lines and lines[0].startswith("```"):
+        lines = lines[1:]
+        if lines and lines[-1].strip().startswith("```"):
+            lines = lines[:-1]
+    return "\n".join(lines)
 
 
 class DevAgent(BaseAgent):
+    name = AgentType.DEV.value
+
     def __init__(self):
-        super().__init__("Dev Agent")
+        super().__init__(
+            "Dev Agent", cache_ttl=settings.LLM_CACHE_TTL_DEV_SECONDS, model_cascade=settings.DEV_MODEL_CASCADE
+        )
         self.output_dir = Path(settings.OUTPUT_DIR)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._local_counters = {}
+        self._counter_lock = threading.Lock()
+        self.parser = PydanticOutputParser(pydantic_object=CodeArtifact)
 
-    def _ensure_unique_path(self, filename: str) -> Path:
-        path = self.output_dir / filename
-        if not path.exists():
-            return path
-        stem = path.stem
-        suffix = path.suffix
-        counter = 1
+    def _shard_dir(self, filename: str) -> Path:
+        """Spread files over per-day or hash-prefix subdirectories so no directory grows unbounded."""
+        if settings.OUTPUT_SHARDING == "date":
+            directory = self.output_dir / datetime.now(timezone.utc).strftime("%Y/%m/%d")
+        elif settings.OUTPUT_SHARDING == "hash":
+            directory = self.output_dir / hashlib.sha1(filename.encode("utf-8")).hexdigest()[:2]
+        else:
+            directory = self.output_dir
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory
+
+    def _next_counter(self, path: Path) -> int:
+        """Next suffix for a taken name: a shared Redis counter, or a per-process one if Redis is down."""
+        key = f"outputs:counter:{hashlib.sha1(str(path).encode('utf-8')).hexdigest()}"
+        try:
+            client = get_redis()
+            pipe = client.pipeline(transaction=False)
+            pipe.incr(key)
+            pipe.expire(key, settings.OUTPUT_COUNTER_TTL_SECONDS)
+            return pipe.execute()[0]
+        except Exception as e:
+            logger.warning(f"Output counter unavailable, using local counter: {e}")
+            with self._counter_lock:
+                self._local_counters[key] = self._local_counters.get(key, 0) + 1
+                return self._local_counters[key]
+
+    @staticmethod
+    def _create_exclusive(path: Path) -> int:
+        return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+
+    def _allocate_file(self, filename: str) -> Tuple[Path, int]:
+        """
+        Atomically claim a unique path and return it with an open descriptor.
+        O_EXCL makes the claim safe across workers sharing the volume; the counter
+        makes it O(1) instead of probing name_1, name_2, ... one by one.
+        """
+        path = self._shard_dir(filename) / filename
+        try:
+            return path, self._create_exclusive(path)
+        except FileExistsError:
+            pass
         while True:
-            candidate = self.output_dir / f"{stem}_{counter}{suffix}"
-            if not candidate.exists():
-                return candidate
-            counter += 1
+            # Only loops when the counter lags files created before it existed
+            candidate = path.with_name(f"{path.stem}_{self._next_counter(path)}{path.suffix}")
+            try:
+                return candidate, self._create_exclusive(candidate)
+            except FileExistsError:
+                continue
 
-    def _suggest_filename(self, task: str, llm_suggest: bool) -> str:
+    @staticmethod
+    def _heuristic_filename(task: str) -> str:
         # Quick heuristic based on common languages
         lower_task = task.lower()
         ext = "py"
@@ -38,17 +115,6 @@ class DevAgent(BaseAgent):
         elif "dockerfile" in lower_task:
             return "Dockerfile"
 
-        if llm_suggest and self.llm:
-            prompt = (
-                "Suggest a concise filename (no directories) for this coding task. "
-                "Use a relevant extension. Return only the filename.\n"
-                f"Task: {task}"
-            )
-            suggestion = super().execute(prompt)
-            if isinstance(suggestion, str):
-                safe = Path(suggestion.strip()).name
-                if safe:
-                    return safe
         # Fallback slug from task text
         words = "".join(
             ch if ch.isalnum() else " " for ch in task
@@ -56,14 +122,75 @@ class DevAgent(BaseAgent):
         slug = "-".join(words[:5]).lower() or "solution"
         return f"{slug}.{ext}"
 
+    @staticmethod
+    def _clean_filename(suggestion) -> str:
+        if isinstance(suggestion, str):
+            return Path(suggestion.strip()).name
+        return ""
+
+    def _artifact_prompt(self, task: str) -> str:
+        return (
+            "You are an experienced developer. Write the full code for this request as a single file. "
+            "Default to Python unless another language is requested. "
+            "If the request names a file or spells out its content, use them exactly.\n"
+            f"Request: {task}\n\n"
+            f"{self.parser.get_format_instructions()}"
+        )
+
+    def _parse_artifact(self, task: str, response: str) -> CodeArtifact:
+        """Parse the structured reply; unparseable output is still saved as code under a heuristic name."""
+        fallback = self._heuristic_filename(task)
+        try:
+            artifact = self.parser.parse(response)
+        except OutputParserException as e:
+            logger.warning(f"Structured code output did not parse, saving raw response: {e}")
+            artifact = CodeArtifact(filename=fallback, language="", code=_strip_fences(response))
+        filename = self._clean_filename(artifact.filename)
+        if fallback == "Dockerfile" or not filename:
+            filename = fallback
+        return artifact.model_copy(update={"filename": filename})
+
+    @staticmethod
+    def _artifact_problem(artifact: CodeArtifact) -> Optional[str]:
+        """Cheap local check of generated code: Python that does not parse goes to a stronger model."""
+        is_python = artifact.language.strip().lower() in ("python", "py") or artifact.filename.endswith(".py")
+        if not is_python:
+            return None
+        try:
+            ast.parse(artifact.code)
+        except (SyntaxError, ValueError):
+            return "syntax_error"
+        return None
+
+    def _review_artifact(self, task: str):
+        def review(response: str) -> Tuple[CodeArtifact, Optional[str]]:
+            artifact = self._parse_artifact(task, response)
+            return artifact, self._artifact_problem(artifact)
+        return review
+
+    def _generate_artifact(self, task: str) -> CodeArtifact:
+        # The reply is JSON for the parser, so it is not streamed; clients get the accepted code in one chunk
+        with timed_stage("generate"):
+            artifact = self._cascade(self._artifact_prompt(task), self._review_artifact(task))
+        publish_event("token", artifact.code)
+        return artifact
+
+    async def _agenerate_artifact(self, task: str) -> CodeArtifact:
+        with timed_stage("generate"):
+            artifact = await self._acascade(self._artifact_prompt(task), self._review_artifact(task))
+        await apublish_event("token", artifact.code)
+        return artifact
+
     def write_file(self, filename: str, content: str) -> dict:
         try:
             if ".." in filename or filename.startswith(("/", "\\")):
                 return {"message": "Invalid filename"}
             safe_name = Path(filename).name or "solution.txt"
-            filepath = self._ensure_unique_path(safe_name)
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(content)
+            with timed_stage("file_write"):
+                filepath, fd = self._allocate_file(safe_name)
+                publish_event("writing_file", {"file_path": str(filepath)})
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(content)
             return {
                 "message": f"Successfully wrote to {filepath}",
                 "file_path": str(filepath)
@@ -71,36 +198,37 @@ class DevAgent(BaseAgent):
         except Exception as e:
             return {"message": f"Failed to write file: {e}"}
 
-    def execute(self, task: str) -> str:
+    @staticmethod
+    def _wants_file(task: str) -> bool:
         lower_task = task.lower()
-        lang_keywords = ["python", "javascript", "typescript", "bash", "powershell", "dockerfile"]
-        intent_keywords = ["create a file", "write a file", "code", "kod", "script", "dosya", "yaz"]
-        mentions_lang = any(kw in lower_task for kw in lang_keywords)
-        wants_file = mentions_lang or any(kw in lower_task for kw in intent_keywords)
+        mentions_lang = any(kw in lower_task for kw in DEV_LANG_KEYWORDS)
+        return mentions_lang or any(kw in lower_task for kw in DEV_INTENT_KEYWORDS)
+
+    def execute(self, task: str) -> str:
+        wants_file = self._wants_file(task)
 
         if not self.llm:
             if wants_file:
-                filename = self._suggest_filename(task, llm_suggest=False)
-                return self.write_file(filename, "# TODO: implement\n")
+                return self.write_file(self._heuristic_filename(task), "# TODO: implement\n")
             return super().execute(task)
-        
-        # Check if task asks to create a file (Simple heuristic)
-        if "create a file" in lower_task or "write a file" in lower_task:
-            prompt = f"""
-            Extract filename and content from this task: "{task}"
-            Format output exactly as: FILENAME|CONTENT
-            Example: test.py|print('hello')
-            """
-            response = super().execute(prompt)
-            if "|" in response:
-                filename, content = response.split("|", 1)
-                return self.write_file(filename.strip(), content.strip())
 
         if wants_file:
-            # Default to generating code and saving it
-            filename = self._suggest_filename(task, llm_suggest=True)
-            prompt = f"Write the full code for this request. Return only executable code, no prose.\nRequest: {task}"
-            code = super().execute(prompt)
-            return self.write_file(filename, code)
+            # One structured call returns filename, language and code together
+            artifact = self._generate_artifact(task)
+            return self.write_file(artifact.filename, artifact.code)
         
         return super().execute(task)
+
+    async def aexecute(self, task: str) -> str:
+        wants_file = self._wants_file(task)
+
+        if not self.llm:
+            if wants_file:
+                return await asyncio.to_thread(self.write_file, self._heuristic_filename(task), "# TODO: implement\n")
+            return await super().aexecute(task)
+
+        if wants_file:
+            artifact = await self._agenerate_artifact(task)
+            return await asyncio.to_thread(self.write_file, artifact.filename, artifact.code)
+
+        return await super().aexecute(task)
@@ -1,22 +1,35 @@
+import logging
+import threading
+from typing import Tuple
+
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
-from pydantic import BaseModel, Field
 
-from app.agents.constants import AGENT_IDS, AgentType
+from app.agents.routing import LocalRouter, RouteDecision
+from app.agents.constants import PEER_AGENT_ID
 from app.core.config import settings
+from app.core.deadline import stage_timeout
+from app.core.metrics import ROUTE_DECISIONS, record_llm_usage, total_tokens
+from app.core.tokens import count_tokens
+from app.services.circuit_breaker import CircuitOpenError, openai_breaker
+from app.services.rate_limiter import llm_rate_limiter
+from app.services.session_memory import with_history
 
+logger = logging.getLogger(__name__)
 
-class RouteDecision(BaseModel):
-    agent_type: AgentType = Field(description=f"The type of agent to route to. Options: {AGENT_IDS}")
-    reasoning: str = Field(description="Reason for the routing decision")
 
 class PeerAgent:
     def __init__(self):
+        self.local_router = LocalRouter()
+        self.stats = {"local": 0, "llm": 0}
+        self._stats_lock = threading.Lock()
         self.llm = ChatOpenAI(
             model=settings.OPENAI_MODEL_ROUTER,
             temperature=0,
-            openai_api_key=settings.OPENAI_API_KEY
+            openai_api_key=settings.OPENAI_API_KEY,
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            timeout=settings.OPENAI_TIMEOUT_SECONDS,
         ) if settings.OPENAI_API_KEY else None
         
         self.parser = PydanticOutputParser(pydantic_object=RouteDecision)
@@ -36,11 +49,74 @@ class PeerAgent:
             partial_variables={"format_instructions": self.parser.get_format_instructions()}
         )
 
+    @property
+    def local_route_ratio(self) -> float:
+        """Fraction of routed tasks that never reached the LLM."""
+        total = self.stats["local"] + self.stats["llm"]
+        return self.stats["local"] / total if total else 0.0
+
+    def _count(self, path: str) -> None:
+        with self._stats_lock:
+            self.stats[path] += 1
+        ROUTE_DECISIONS.labels(path).inc()
+
+    def _local_route(self, task: str) -> Tuple[RouteDecision, bool]:
+        """Returns the local decision and whether it is good enough to skip the LLM."""
+        # Cheap local pass first; only ambiguous tasks pay for an LLM round trip
+        local_decision = self.local_router.classify(task)
+        if not self.llm or local_decision.confidence >= settings.ROUTER_LOCAL_CONFIDENCE_THRESHOLD:
+            self._count("local")
+            return local_decision, True
+
+        logger.info(f"Local router unsure (confidence={local_decision.confidence}), escalating to LLM")
+        return local_decision, False
+
+    def _estimated_tokens(self, task: str) -> int:
+        # A routing reply is a short JSON object
+        return count_tokens(self.prompt.format(task=task)) + 100
+
+    def _chain(self):
+        return self.prompt | self.llm.bind(timeout=stage_timeout(settings.OPENAI_TIMEOUT_SECONDS, "routing"))
+
+    def _circuit_open(self, local_decision: RouteDecision) -> RouteDecision:
+        # OpenAI is failing for every worker; keyword routing beats waiting out its timeouts
+        logger.warning("OpenAI circuit open, routing with the local decision")
+        self._count("local")
+        return local_decision
+
     def route(self, task: str) -> RouteDecision:
-        if not self.llm:
-            if "python" in task.lower() or "code" in task.lower() or "script" in task.lower():
-                return RouteDecision(agent_type=AgentType.DEV, reasoning="Keyword match (fallback)")
-            return RouteDecision(agent_type=AgentType.CONTENT, reasoning="Default (fallback)")
+        local_decision, confident = self._local_route(task)
+        if confident:
+            return local_decision
+        # Keywords score the latest request alone; the LLM also sees the session's conversation
+        task = with_history(task)
+        try:
+            message = openai_breaker.call(lambda: llm_rate_limiter.call(
+                self.llm.model_name,
+                self._estimated_tokens(task),
+                lambda: self._chain().invoke({"task": task}),
+                lambda result: total_tokens(result.usage_metadata),
+            ))
+        except CircuitOpenError:
+            return self._circuit_open(local_decision)
+        self._count("llm")
+        record_llm_usage(PEER_AGENT_ID, self.llm.model_name, message.usage_metadata)
+        return self.parser.invoke(message)
 
-        chain = self.prompt | self.llm | self.parser
-        return chain.invoke({"task": task})
+    async def aroute(self, task: str) -> RouteDecision:
+        local_decision, confident = self._local_route(task)
+        if confident:
+            return local_decision
+        task = with_history(task)
+        try:
+            message = await openai_breaker.acall(lambda: llm_rate_limiter.acall(
+                self.llm.model_name,
+                self._estimated_tokens(task),
+                lambda: self._chain().ainvoke({"task": task}),
+                lambda result: total_tokens(result.usage_metadata),
+            ))
+        except CircuitOpenError:
+            return self._circuit_open(local_decision)
+        self._count("llm")
+        record_llm_usage(PEER_AGENT_ID, self.llm.model_name, message.usage_metadata)
+        return await self.parser.ainvoke(message)
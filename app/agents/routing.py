@@ -0,0 +1,159 @@
+import re
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.agents.constants import (
+    AGENT_DESCRIPTIONS,
+    AGENT_IDS,
+    DEV_INTENT_KEYWORDS,
+    DEV_LANG_KEYWORDS,
+    AgentType,
+)
+
+
+class RouteDecision(BaseModel):
+    agent_type: AgentType = Field(description=f"The type of agent to route to. Options: {AGENT_IDS}")
+    reasoning: str = Field(description="Reason for the routing decision")
+    confidence: Optional[float] = Field(default=None, description="Confidence in the decision between 0 and 1")
+
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = {"handles", "and", "tasks", "non", "the", "a", "of"}
+
+# Hand-tuned evidence on top of the agent descriptions. Single words match whole
+# tokens (plus a plural "s"), so "bugün" does not hit "bug" nor "scripture" "script".
+# Turkish stems in _SUFFIXED_STEMS also match as prefixes so suffixes still hit
+# ("dosyayı" -> "dosya", "yazan" -> "yaz").
+_SUFFIXED_STEMS = {
+    "dosya", "yaz", "kod", "fonksiyon", "hata", "tarih", "hikaye", "şiir", "makale", "başkent", "haber", "maç",
+}
+_DEV_WEIGHTS: Dict[str, float] = {
+    **{kw: 3.0 for kw in DEV_LANG_KEYWORDS},
+    **{kw: 2.0 for kw in DEV_INTENT_KEYWORDS},
+    "yaz": 1.0,
+    "function": 2.0,
+    "fonksiyon": 2.0,
+    "debug": 2.0,
+    "bug": 2.0,
+    "exception": 2.0,
+    "stack trace": 2.0,
+    "compile": 2.0,
+    "refactor": 2.0,
+    "regex": 2.0,
+    "sql": 2.0,
+    "program": 2.0,
+    "algorithm": 1.0,
+    "error": 1.0,
+    "hata": 1.0,
+    "api": 1.0,
+}
+
+_CONTENT_WEIGHTS: Dict[str, float] = {
+    "what": 1.0,
+    "why": 1.0,
+    "who": 1.5,
+    "when": 1.5,
+    "where": 1.5,
+    "how many": 1.5,
+    "explain": 1.0,
+    "capital": 2.0,
+    "news": 2.0,
+    "latest": 1.5,
+    "history": 2.0,
+    "weather": 2.0,
+    "match": 1.5,
+    "summarize": 2.0,
+    "summary": 2.0,
+    "poem": 2.0,
+    "story": 2.0,
+    "essay": 2.0,
+    "article": 2.0,
+    "blog": 2.0,
+    "nedir": 2.0,
+    "kimdir": 2.0,
+    "ne zaman": 2.0,
+    "nerede": 2.0,
+    "hangi": 1.0,
+    "özetle": 2.0,
+    "haber": 2.0,
+    "maç": 2.0,
+    "tarih": 1.5,
+    "hikaye": 2.0,
+    "şiir": 2.0,
+    "makale": 2.0,
+    "başkent": 2.0,
+}
+
+
+def _tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _description_terms() -> Dict[AgentType, set]:
+    """Words unique to each agent description, used as low-weight evidence."""
+    terms = {
+        agent: {t for t in _tokenize(desc) if t not in _STOPWORDS}
+        for agent, desc in AGENT_DESCRIPTIONS.items()
+    }
+    shared = terms[AgentType.DEV] & terms[AgentType.CONTENT]
+    return {agent: words - shared for agent, words in terms.items()}
+
+
+class LocalRouter:
+    """
+    Weighted keyword / n-gram scorer that routes obvious tasks without an LLM call.
+    Confidence is top / (top + other + 1), so a single weak hit never counts as certain.
+    """
+
+    def __init__(self):
+        self.weights: Dict[AgentType, Dict[str, float]] = {
+            AgentType.DEV: dict(_DEV_WEIGHTS),
+            AgentType.CONTENT: dict(_CONTENT_WEIGHTS),
+        }
+        for agent, words in _description_terms().items():
+            for word in words:
+                self.weights[agent].setdefault(word, 1.0)
+
+    @staticmethod
+    def _matches(keyword: str, tokens: List[str], ngrams: set) -> bool:
+        if " " in keyword:
+            return keyword in ngrams
+        if keyword in _SUFFIXED_STEMS:
+            return any(token.startswith(keyword) for token in tokens)
+        return keyword in tokens or f"{keyword}s" in tokens
+
+    def score(self, task: str) -> Dict[AgentType, tuple]:
+        tokens = _tokenize(task)
+        ngrams = {
+            " ".join(tokens[i:i + n])
+            for n in (2, 3)
+            for i in range(len(tokens) - n + 1)
+        }
+        scores = {}
+        for agent, weights in self.weights.items():
+            matched = [kw for kw in weights if self._matches(kw, tokens, ngrams)]
+            scores[agent] = (sum(weights[kw] for kw in matched), matched)
+        if "?" in task:
+            total, matched = scores[AgentType.CONTENT]
+            scores[AgentType.CONTENT] = (total + 1.0, matched + ["?"])
+        return scores
+
+    def classify(self, task: str) -> RouteDecision:
+        scores = self.score(task)
+        dev_score, dev_matched = scores[AgentType.DEV]
+        content_score, content_matched = scores[AgentType.CONTENT]
+
+        if dev_score == 0 and content_score == 0:
+            return RouteDecision(agent_type=AgentType.CONTENT, reasoning="Default (fallback)", confidence=0.0)
+
+        if dev_score > content_score:
+            agent, top, other, matched = AgentType.DEV, dev_score, content_score, dev_matched
+        else:
+            agent, top, other, matched = AgentType.CONTENT, content_score, dev_score, content_matched
+        confidence = round(top / (top + other + 1.0), 3)
+        return RouteDecision(
+            agent_type=agent,
+            reasoning=f"Keyword match (local router): {', '.join(matched)}",
+            confidence=confidence,
+        )
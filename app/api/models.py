@@ -1,14 +1,34 @@
+from datetime import datetime
+
 from pydantic import BaseModel, Field, constr
-from typing import Optional, Any
+from typing import Any, Dict, List, Literal, Optional
+
+MAX_BATCH_SIZE = 500
+
+# Broker priorities (Redis transport: lower is served first)
+TASK_PRIORITIES = {"interactive": 0, "bulk": 9}
 
 class TaskRequest(BaseModel):
     task: constr(strip_whitespace=True, min_length=1) = Field(..., description="The task description provided by the user.")
+    use_cache: bool = Field(True, description="Set to false to bypass cached LLM responses.")
+    priority: Literal["interactive", "bulk"] = Field("interactive", description="Bulk tasks yield to interactive ones on the same queue.")
+    dedupe: bool = Field(True, description="Set to false to always execute, even if an identical task is in flight.")
+    session_id: Optional[constr(strip_whitespace=True, min_length=1, max_length=128)] = Field(None, description="Tasks sharing a session id see the earlier turns of that conversation.")
 
 class TaskResponse(BaseModel):
     task_id: str
     status: str
     message: str
 
+class BatchTaskRequest(BaseModel):
+    tasks: List[TaskRequest] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE, description="Tasks to enqueue in one call.")
+
+class BatchTaskResponse(BaseModel):
+    tasks: List[TaskResponse]
+
+class BatchStatusRequest(BaseModel):
+    task_ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE, description="Task ids to look up in one call.")
+
 class TaskResult(BaseModel):
     task_id: str
     status: str
@@ -17,3 +37,15 @@ class TaskResult(BaseModel):
     reasoning: Optional[str] = None
     file_path: Optional[str] = None
     error: Optional[str] = None
+    deduplicated_from: Optional[str] = None
+    # Milliseconds per stage (queue_wait, route, rewrite, search, generate, file_write, total)
+    timings: Optional[Dict[str, float]] = None
+    # LLM tokens spent on this task: llm_calls, prompt_tokens, completion_tokens, total_tokens,
+    # plus context_tokens_saved by packing search results and cascade_escalations to stronger models
+    usage: Optional[Dict[str, int]] = None
+    # Model that produced the answer and its tier in the agent's cascade (0 = cheapest)
+    model: Optional[str] = None
+    cascade_tier: Optional[int] = None
+    # When the task finished (UTC) and how long the worker spent on it; indexed in task_logs
+    created_at: Optional[datetime] = None
+    duration_ms: Optional[float] = None
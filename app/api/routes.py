@@ -1,15 +1,38 @@
+import asyncio
+import json
 import logging
+import time
 import uuid
+from datetime import datetime
+from typing import List, Optional
 
+from celery import states
 from celery.result import AsyncResult
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
-from app.api.models import TaskRequest, TaskResponse, TaskResult
-from app.services.celery_app import celery_app
-from app.services.queue import process_task
+from app.agents.routing import LocalRouter
+from app.api.models import (
+    TASK_PRIORITIES,
+    BatchStatusRequest,
+    BatchTaskRequest,
+    BatchTaskResponse,
+    TaskRequest,
+    TaskResponse,
+    TaskResult,
+)
+from app.core.config import settings
+from app.core.metrics import ROUTE_DECISIONS
+from app.services.celery_app import PROCESS_TASK, ROUTE_TASK, celery_app, queue_for_agent
+from app.services.events import DONE_EVENT, is_known, iter_events, mark_enqueued, wait_for_done
+from app.services.mongo import get_async_logs_collection
+from app.services.redis_client import get_async_redis
+from app.services.result_store import aunpack_result, unpack_results
+from app.services.task_logs import InvalidLogQuery, log_stats, query_logs
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
+local_router = LocalRouter()
 
 
 @router.post("/execute", response_model=TaskResponse)
@@ -22,7 +45,8 @@ async def execute_task(request: TaskRequest):
     
     try:
         # Async queue - task processed by Celery worker
-        process_task.apply_async(args=[task_id, request.task], task_id=task_id)
+        await asyncio.to_thread(mark_enqueued, [task_id])
+        _enqueue(task_id, request)
         logger.info(f"Task {task_id} queued")
     except Exception as exc:
         logger.error(f"Failed to queue task: {exc}")
@@ -35,30 +59,339 @@ async def execute_task(request: TaskRequest):
     )
 
 
+def _enqueue(task_id: str, request: TaskRequest, producer=None) -> None:
+    """
+    Route before execution: confident local decisions go straight to the agent's queue,
+    the rest to the router pool, which picks the queue after an LLM routing call.
+    """
+    priority = TASK_PRIORITIES[request.priority]
+    decision = local_router.classify(request.task)
+    enqueued_at = time.time()
+    # The task's end-to-end budget starts now, so time spent queued counts against it
+    deadline_at = enqueued_at + settings.TASK_DEADLINE_SECONDS
+    if not settings.OPENAI_API_KEY or decision.confidence >= settings.ROUTER_LOCAL_CONFIDENCE_THRESHOLD:
+        agent = decision.agent_type.value
+        ROUTE_DECISIONS.labels("local").inc()
+        celery_app.send_task(
+            PROCESS_TASK,
+            args=[task_id, request.task],
+            kwargs={
+                "use_cache": request.use_cache,
+                "agent": agent,
+                "reasoning": decision.reasoning,
+                "dedupe": request.dedupe,
+                "session_id": request.session_id,
+                "enqueued_at": enqueued_at,
+                "deadline_at": deadline_at,
+            },
+            task_id=task_id,
+            queue=queue_for_agent(agent),
+            priority=priority,
+            producer=producer,
+        )
+    else:
+        celery_app.send_task(
+            ROUTE_TASK,
+            args=[task_id, request.task],
+            kwargs={
+                "use_cache": request.use_cache,
+                "priority": priority,
+                "dedupe": request.dedupe,
+                "session_id": request.session_id,
+                "enqueued_at": enqueued_at,
+                "deadline_at": deadline_at,
+            },
+            task_id=task_id,
+            queue=settings.ROUTER_QUEUE,
+            priority=priority,
+            producer=producer,
+        )
+
+
+def _enqueue_batch(task_ids: List[str], requests: List[TaskRequest]) -> None:
+    mark_enqueued(task_ids)
+    # One pooled producer (connection + channel) publishes the whole burst
+    with celery_app.producer_or_acquire() as producer:
+        for task_id, request in zip(task_ids, requests):
+            _enqueue(task_id, request, producer=producer)
+
+
+@router.post("/execute/batch", response_model=BatchTaskResponse)
+async def execute_batch(request: BatchTaskRequest):
+    """Submit many tasks in one call; returns every task id at once."""
+    task_ids = [str(uuid.uuid4()) for _ in request.tasks]
+
+    try:
+        await asyncio.to_thread(_enqueue_batch, task_ids, request.tasks)
+        logger.info(f"Batch of {len(task_ids)} tasks queued")
+    except Exception as exc:
+        logger.error(f"Failed to queue batch: {exc}")
+        raise HTTPException(status_code=500, detail="Failed to queue batch")
+
+    return BatchTaskResponse(tasks=[
+        TaskResponse(
+            task_id=task_id,
+            status="queued",
+            message="Task queued. Check status via POST /status/batch"
+        )
+        for task_id in task_ids
+    ])
+
+
 @router.post("/execute/sync", response_model=TaskResult)
 async def execute_task_sync(request: TaskRequest):
-    """Execute task synchronously (for testing)."""
+    """Execute task in the API process, awaiting the async pipeline (for testing)."""
     if not request.task or not request.task.strip():
         raise HTTPException(status_code=400, detail="Task cannot be empty")
 
+    # Imported on first use: the worker pipeline pulls in LangChain and the agents,
+    # which an API process that only enqueues never needs
+    from app.services.queue import aprocess_task
+
     task_id = str(uuid.uuid4())
     
     try:
-        result = process_task(task_id, request.task)
+        result = await aprocess_task(
+            task_id, request.task, use_cache=request.use_cache, dedupe=request.dedupe, session_id=request.session_id
+        )
         return result
     except Exception as exc:
         logger.error(f"Task failed: {exc}")
         raise HTTPException(status_code=500, detail=f"Task failed: {exc}")
 
 
+def _status_payload(task_id: str, status: str, result) -> dict:
+    return {
+        "task_id": task_id,
+        "status": status,
+        "result": result if status == "SUCCESS" else None,
+        "error": str(result) if status == "FAILURE" else None
+    }
+
+
+def _bulk_task_meta(task_ids: List[str]) -> List[dict]:
+    """
+    Fetch result metadata for many tasks; one MGET round trip on the Redis backend,
+    plus one task_results query when some results were offloaded.
+    """
+    backend = celery_app.backend
+    if not hasattr(backend, "mget"):
+        results = [AsyncResult(task_id, app=celery_app) for task_id in task_ids]
+        metas = [{"status": r.status, "result": r.result} for r in results]
+    else:
+        raw_values = backend.mget([backend.get_key_for_task(task_id) for task_id in task_ids])
+        metas = [
+            backend.decode_result(raw) if raw else {"status": "PENDING", "result": None}
+            for raw in raw_values
+        ]
+    results = unpack_results([meta.get("result") for meta in metas])
+    return [{**meta, "result": result} for meta, result in zip(metas, results)]
+
+
+async def _rehydrate(task_id: str, stored):
+    """The full result for a compacted backend value (compressed inline or offloaded to task_results)."""
+    try:
+        return await aunpack_result(stored)
+    except Exception as exc:
+        logger.error(f"Failed to rehydrate result of {task_id}: {exc}")
+        return await _find_logged_result(task_id) or stored
+
+
+async def _in_flight(task_id: str) -> bool:
+    # A PENDING task that still has its enqueue marker or event stream is queued or running, not forgotten
+    try:
+        return await is_known(task_id)
+    except Exception as exc:
+        logger.warning(f"In-flight check for {task_id} failed: {exc}")
+        return False
+
+
+async def _find_logged_result(task_id: str) -> Optional[dict]:
+    """Look up a finished task in task_logs (indexed on task_id) once the backend has forgotten it."""
+    try:
+        return await get_async_logs_collection().find_one({"task_id": task_id}, {"_id": 0})
+    except Exception as exc:
+        logger.error(f"task_logs lookup for {task_id} failed: {exc}")
+        return None
+
+
+def _is_final(raw) -> bool:
+    return raw is not None and celery_app.backend.decode_result(raw)["status"] in states.READY_STATES
+
+
+async def _wait_for_backend(task_id: str) -> None:
+    """
+    Block until the result backend holds a final state (SUCCESS or FAILURE) for the task.
+    The Redis backend publishes every stored state on the result key's channel, so this needs no polling.
+    """
+    key = celery_app.backend.get_key_for_task(task_id)
+    client = get_async_redis()
+    pubsub = client.pubsub()
+    try:
+        await pubsub.subscribe(key)
+        # Checked only once subscribed, so a result stored in between is not missed
+        if _is_final(await client.get(key)):
+            return
+        async for message in pubsub.listen():
+            if message["type"] == "message" and _is_final(message["data"]):
+                return
+    finally:
+        await pubsub.aclose()
+
+
+async def _wait_for_completion(task_id: str, timeout: float) -> Optional[dict]:
+    """
+    Wait until the task finishes or timeout passes. Returns the done event's payload when it arrives
+    first, else None (backend holds a final state, or timeout) and the caller re-reads the backend.
+    The backend wait also covers failed tasks and TASK_EVENTS_ENABLED=false, which publish no done event.
+    """
+    backend_waiter = asyncio.ensure_future(_wait_for_backend(task_id))
+    waiters = {backend_waiter}
+    if settings.TASK_EVENTS_ENABLED:
+        waiters.add(asyncio.ensure_future(wait_for_done(task_id, timeout)))
+    deadline = time.monotonic() + timeout
+    try:
+        while waiters:
+            finished, waiters = await asyncio.wait(
+                waiters, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not finished:
+                return None
+            for waiter in finished:
+                if waiter.exception() is not None:
+                    logger.error(f"Waiting on task {task_id} failed: {waiter.exception()}")
+                elif waiter is backend_waiter:
+                    return None
+                elif waiter.result() is not None:
+                    return waiter.result()
+        return None
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+
+
 @router.get("/status/{task_id}")
-async def get_task_status(task_id: str):
-    """Get status and result of a queued task."""
+async def get_task_status(
+    task_id: str,
+    wait: float = Query(0, ge=0, description="Seconds to long-poll for completion before answering."),
+):
+    """Get status and result of a queued task, optionally waiting for it to finish."""
     task_result = AsyncResult(task_id, app=celery_app)
-    
+    status = await asyncio.to_thread(lambda: task_result.status)
+    waited_out = False
+
+    if status not in ("SUCCESS", "FAILURE") and wait > 0:
+        done = await _wait_for_completion(task_id, min(wait, settings.STATUS_MAX_WAIT_SECONDS))
+        if done is not None:
+            # The done event carries the task's packed return value, which may land in the backend a moment later
+            return _status_payload(task_id, "SUCCESS", await _rehydrate(task_id, done))
+        status = await asyncio.to_thread(lambda: task_result.status)
+        waited_out = True
+
+    # task_logs only matters once the backend has forgotten the task; polls of queued or running
+    # tasks skip it unless the caller already waited in vain
+    if status == "PENDING" and (waited_out or not await _in_flight(task_id)):
+        logged = await _find_logged_result(task_id)
+        if logged is not None:
+            return _status_payload(task_id, "SUCCESS", logged)
+
+    result = task_result.result
+    if status == "SUCCESS":
+        result = await _rehydrate(task_id, result)
+    return _status_payload(task_id, status, result)
+
+
+@router.post("/status/batch")
+async def get_batch_status(request: BatchStatusRequest):
+    """Get status and results of many tasks in one call."""
+    try:
+        metas = await asyncio.to_thread(_bulk_task_meta, request.task_ids)
+    except Exception as exc:
+        logger.error(f"Failed to fetch batch status: {exc}")
+        raise HTTPException(status_code=500, detail="Failed to fetch task status")
+
     return {
-        "task_id": task_id,
-        "status": task_result.status,
-        "result": task_result.result if task_result.status == "SUCCESS" else None,
-        "error": str(task_result.result) if task_result.status == "FAILURE" else None
+        "tasks": [
+            _status_payload(task_id, meta["status"], meta.get("result"))
+            for task_id, meta in zip(request.task_ids, metas)
+        ]
     }
+
+
+@router.get("/logs")
+async def list_task_logs(
+    agent: Optional[str] = Query(None, description="Only tasks handled by this agent."),
+    status: Optional[str] = Query(None, description="Only tasks with this status (completed, failed)."),
+    since: Optional[datetime] = Query(None, description="Only tasks finished at or after this time (ISO 8601)."),
+    until: Optional[datetime] = Query(None, description="Only tasks finished before this time (ISO 8601)."),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. task_id,status,duration_ms."),
+    limit: int = Query(50, ge=1, le=settings.TASK_LOG_PAGE_MAX),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page."),
+):
+    """Page through task_logs newest first; pass next_cursor back to continue."""
+    try:
+        return await query_logs(agent, status, since, until, fields, limit, cursor)
+    except InvalidLogQuery as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        logger.error(f"task_logs query failed: {exc}")
+        raise HTTPException(status_code=500, detail="Failed to query task logs")
+
+
+@router.get("/logs/stats")
+async def task_log_stats(
+    since: Optional[datetime] = Query(None, description="Start of the range (default: 24 hours ago)."),
+    until: Optional[datetime] = Query(None, description="End of the range (default: now)."),
+    agent: Optional[str] = Query(None, description="Only this agent."),
+):
+    """Per-agent task counts, failures and duration percentiles, aggregated in MongoDB."""
+    try:
+        return await log_stats(since, until, agent)
+    except Exception as exc:
+        logger.error(f"task_logs aggregation failed: {exc}")
+        raise HTTPException(status_code=500, detail="Failed to aggregate task logs")
+
+
+def _sse(event: str, data: str, event_id: Optional[str] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id else []
+    lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+    return "\n".join(lines) + "\n\n"
+
+
+async def _relay_task_events(task_id: str, last_event_id: str):
+    deadline = time.monotonic() + settings.TASK_STREAM_MAX_SECONDS
+    try:
+        async for item in iter_events(task_id, last_event_id):
+            if item is not None:
+                event_id, event, data = item
+                if event == DONE_EVENT:
+                    # Published in the backend's compact form
+                    data = json.dumps(await _rehydrate(task_id, json.loads(data)), default=str)
+                yield _sse(event, data, event_id)
+                continue
+            # Idle: the stream may have expired or never existed, so check the result backend once
+            task_result = AsyncResult(task_id, app=celery_app)
+            if await asyncio.to_thread(task_result.ready):
+                result = task_result.result
+                if task_result.status == "SUCCESS":
+                    result = await _rehydrate(task_id, result)
+                payload = _status_payload(task_id, task_result.status, result)
+                yield _sse(DONE_EVENT, json.dumps(payload, default=str))
+                return
+            if time.monotonic() > deadline:
+                return
+            yield ": keep-alive\n\n"
+    except Exception as exc:
+        logger.error(f"Event relay for task {task_id} failed: {exc}")
+        yield _sse("error", json.dumps({"error": "Event stream unavailable"}))
+
+
+@router.get("/stream/{task_id}")
+async def stream_task(task_id: str, last_event_id: Optional[str] = Header(None)):
+    """Server-Sent Events relay of a task's tokens and stage events (routed, searching, writing_file, done)."""
+    return StreamingResponse(
+        _relay_task_events(task_id, last_event_id or "0-0"),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -9,10 +9,139 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL_ROUTER: str = os.getenv("OPENAI_MODEL_ROUTER", "gpt-4o-mini")
     OPENAI_MODEL_WORKER: str = os.getenv("OPENAI_MODEL_WORKER", "gpt-4o-mini")
+    # Comma-separated models per agent, cheapest first (e.g. "gpt-4o-mini,gpt-4o"); the next one is tried
+    # only when an answer fails the agent's local check. Empty means OPENAI_MODEL_WORKER alone
+    DEV_MODEL_CASCADE: str = os.getenv("DEV_MODEL_CASCADE", "")
+    CONTENT_MODEL_CASCADE: str = os.getenv("CONTENT_MODEL_CASCADE", "")
     OUTPUT_DIR: str = os.getenv("OUTPUT_DIR", "outputs")
+    # "date" (YYYY/MM/DD), "hash" (2-char hash prefix) or "none" for a flat OUTPUT_DIR
+    OUTPUT_SHARDING: str = os.getenv("OUTPUT_SHARDING", "date")
+    OUTPUT_COUNTER_TTL_SECONDS: int = int(os.getenv("OUTPUT_COUNTER_TTL_SECONDS", str(7 * 24 * 3600)))
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
     GOOGLE_CSE_ID: str = os.getenv("GOOGLE_CSE_ID", "")
 
+    # Outbound HTTP pooling and search result caching
+    HTTP_POOL_CONNECTIONS: int = int(os.getenv("HTTP_POOL_CONNECTIONS", "4"))
+    HTTP_POOL_MAXSIZE: int = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+    SEARCH_CACHE_MAX_ENTRIES: int = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "512"))
+    SEARCH_CACHE_TTL_SECONDS: int = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", "600"))
+
+    # ContentAgent research mode (opt-in): several rewritten queries searched concurrently
+    CONTENT_RESEARCH_MODE: bool = os.getenv("CONTENT_RESEARCH_MODE", "false").lower() == "true"
+    CONTENT_RESEARCH_QUERIES: int = int(os.getenv("CONTENT_RESEARCH_QUERIES", "3"))
+    CONTENT_MAX_SOURCES: int = int(os.getenv("CONTENT_MAX_SOURCES", "10"))
+    # Grounded prompts: search results are deduped, ranked and packed into this many tokens
+    CONTENT_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTENT_CONTEXT_TOKEN_BUDGET", "1200"))
+    # Word 3-gram Jaccard similarity at or above which two snippets count as duplicates
+    CONTENT_SNIPPET_SIMILARITY: float = float(os.getenv("CONTENT_SNIPPET_SIMILARITY", "0.8"))
+    CONTENT_SEARCH_WORKERS: int = int(os.getenv("CONTENT_SEARCH_WORKERS", "8"))
+
+    # Worker execution: "sync" blocks a pool slot per task; "async" (run Celery with --pool=threads) hands
+    # every task's pipeline to one event loop per process, which overlaps up to WORKER_ASYNC_MAX_IN_FLIGHT
+    WORKER_EXECUTION_MODE: str = os.getenv("WORKER_EXECUTION_MODE", "sync")
+    WORKER_ASYNC_MAX_IN_FLIGHT: int = int(os.getenv("WORKER_ASYNC_MAX_IN_FLIGHT", "64"))
+
+    # Per-task event streams (tokens + stage events) relayed over SSE
+    TASK_EVENTS_ENABLED: bool = os.getenv("TASK_EVENTS_ENABLED", "true").lower() == "true"
+    TASK_EVENTS_MAXLEN: int = int(os.getenv("TASK_EVENTS_MAXLEN", "2000"))
+    TASK_EVENTS_TTL_SECONDS: int = int(os.getenv("TASK_EVENTS_TTL_SECONDS", "3600"))
+    TASK_EVENTS_TOKEN_FLUSH_SECONDS: float = float(os.getenv("TASK_EVENTS_TOKEN_FLUSH_SECONDS", "0.05"))
+    TASK_STREAM_MAX_SECONDS: int = int(os.getenv("TASK_STREAM_MAX_SECONDS", "300"))
+    STATUS_MAX_WAIT_SECONDS: int = int(os.getenv("STATUS_MAX_WAIT_SECONDS", "30"))
+
+    # Background health probing; /health/ready requires the listed components
+    HEALTH_PROBE_INTERVAL_SECONDS: float = float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "5"))
+    HEALTH_CELERY_PING_TIMEOUT_SECONDS: float = float(os.getenv("HEALTH_CELERY_PING_TIMEOUT_SECONDS", "1"))
+    HEALTH_READY_COMPONENTS: str = os.getenv("HEALTH_READY_COMPONENTS", "redis,mongodb")
+
+    # Task log persistence: buffered insert_many with a local spill file on failure
+    TASK_LOG_BATCH_SIZE: int = int(os.getenv("TASK_LOG_BATCH_SIZE", "100"))
+    TASK_LOG_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("TASK_LOG_FLUSH_INTERVAL_SECONDS", "2"))
+    TASK_LOG_SPILL_PATH: str = os.getenv("TASK_LOG_SPILL_PATH", "logs/task_logs.spill.jsonl")
+    # How often the flusher retries the spill file while the process runs
+    TASK_LOG_REPLAY_INTERVAL_SECONDS: float = float(os.getenv("TASK_LOG_REPLAY_INTERVAL_SECONDS", "30"))
+    # A replay claim untouched this long was left by a process that died mid-replay; other writers adopt it
+    TASK_LOG_STALE_CLAIM_SECONDS: float = float(os.getenv("TASK_LOG_STALE_CLAIM_SECONDS", "300"))
+    # task_logs documents expire this many days after created_at (TTL index)
+    TASK_LOG_RETENTION_DAYS: int = int(os.getenv("TASK_LOG_RETENTION_DAYS", "90"))
+    TASK_LOG_PAGE_MAX: int = int(os.getenv("TASK_LOG_PAGE_MAX", "500"))
+
+    # Task results in the Celery backend expire after RESULT_TTL_SECONDS. Bodies over the first size are
+    # zlib-compressed; those still over the second once compressed move to Mongo (task_results)
+    RESULT_TTL_SECONDS: int = int(os.getenv("RESULT_TTL_SECONDS", "86400"))
+    RESULT_COMPRESS_MIN_BYTES: int = int(os.getenv("RESULT_COMPRESS_MIN_BYTES", "2048"))
+    RESULT_OFFLOAD_MIN_BYTES: int = int(os.getenv("RESULT_OFFLOAD_MIN_BYTES", "16384"))
+
+    # Queues: routing happens before execution so each agent has its own queue and worker pool
+    ROUTER_QUEUE: str = os.getenv("ROUTER_QUEUE", "router-queue")
+    DEV_QUEUE: str = os.getenv("DEV_QUEUE", "dev-queue")
+    CONTENT_QUEUE: str = os.getenv("CONTENT_QUEUE", "content-queue")
+
+    # Prometheus metrics: /metrics on the API; workers serve their own exporter (0 disables it)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    WORKER_METRICS_PORT: int = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+    # OpenAI rate limiting: cluster-wide RPM/TPM buckets per model in Redis, plus AIMD concurrency per process
+    LLM_RATE_LIMIT_ENABLED: bool = os.getenv("LLM_RATE_LIMIT_ENABLED", "true").lower() == "true"
+    OPENAI_RPM_LIMIT: int = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+    OPENAI_TPM_LIMIT: int = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+    # Per-model overrides: "gpt-4o-mini=500:200000,gpt-4o=500:30000"
+    OPENAI_RATE_LIMITS: str = os.getenv("OPENAI_RATE_LIMITS", "")
+    # Reserved per call on top of the prompt; settled against the real usage afterwards
+    LLM_EXPECTED_COMPLETION_TOKENS: int = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "400"))
+    LLM_INITIAL_CONCURRENCY: int = int(os.getenv("LLM_INITIAL_CONCURRENCY", "4"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    # Calls slower than this multiple of the moving average shrink the concurrency limit
+    LLM_AIMD_LATENCY_FACTOR: float = float(os.getenv("LLM_AIMD_LATENCY_FACTOR", "2.0"))
+    LLM_RATE_LIMIT_MAX_WAIT_SECONDS: int = int(os.getenv("LLM_RATE_LIMIT_MAX_WAIT_SECONDS", "120"))
+    LLM_RATE_LIMIT_RETRIES: int = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3"))
+    LLM_RATE_LIMIT_COOLDOWN_MS: int = int(os.getenv("LLM_RATE_LIMIT_COOLDOWN_MS", "1000"))
+    # The client's own retries back off per process; 429s are retried by the shared limiter instead
+    OPENAI_MAX_RETRIES: int = int(os.getenv("OPENAI_MAX_RETRIES", "1"))
+
+    # Per-call timeouts; both are further capped by what is left of the task deadline
+    OPENAI_TIMEOUT_SECONDS: float = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+    SEARCH_TIMEOUT_SECONDS: float = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "5"))
+    # End-to-end budget of a task, counted from enqueue (queue wait included)
+    TASK_DEADLINE_SECONDS: float = float(os.getenv("TASK_DEADLINE_SECONDS", "300"))
+
+    # Circuit breakers (OpenAI, Google CSE), shared by every worker through Redis: this many
+    # consecutive failures within the window open the breaker; after CIRCUIT_OPEN_SECONDS one probe call decides
+    CIRCUIT_BREAKER_ENABLED: bool = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_FAILURE_WINDOW_SECONDS: int = int(os.getenv("CIRCUIT_FAILURE_WINDOW_SECONDS", "60"))
+    CIRCUIT_OPEN_SECONDS: int = int(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+    CIRCUIT_PROBE_LEASE_SECONDS: int = int(os.getenv("CIRCUIT_PROBE_LEASE_SECONDS", "60"))
+    # After a Redis connection error, the breakers and the LLM rate limiter skip Redis (failing open)
+    # in this process for this long instead of each call waiting out the connect timeout
+    REDIS_RETRY_AFTER_SECONDS: float = float(os.getenv("REDIS_RETRY_AFTER_SECONDS", "5"))
+
+    # Sessions: per-session turns in Redis; past the token budget the oldest turns are folded into a
+    # running summary (at most SESSION_SUMMARY_MAX_TOKENS), keeping the last few verbatim
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", "86400"))
+    SESSION_HISTORY_TOKEN_BUDGET: int = int(os.getenv("SESSION_HISTORY_TOKEN_BUDGET", "1500"))
+    SESSION_SUMMARY_MAX_TOKENS: int = int(os.getenv("SESSION_SUMMARY_MAX_TOKENS", "300"))
+    SESSION_KEEP_RECENT_TURNS: int = int(os.getenv("SESSION_KEEP_RECENT_TURNS", "2"))
+    SESSION_TURN_MAX_TOKENS: int = int(os.getenv("SESSION_TURN_MAX_TOKENS", "500"))
+    SESSION_COMPACT_LEASE_SECONDS: int = int(os.getenv("SESSION_COMPACT_LEASE_SECONDS", "120"))
+
+    # Singleflight: identical tasks in flight (or finished within the window) share one execution
+    SINGLEFLIGHT_ENABLED: bool = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+    SINGLEFLIGHT_WINDOW_SECONDS: int = int(os.getenv("SINGLEFLIGHT_WINDOW_SECONDS", "30"))
+    # The leader renews its lock while it runs, so a crashed leader's copies take over after one lease
+    SINGLEFLIGHT_LEASE_SECONDS: int = int(os.getenv("SINGLEFLIGHT_LEASE_SECONDS", "15"))
+    SINGLEFLIGHT_POLL_INTERVAL_MS: int = int(os.getenv("SINGLEFLIGHT_POLL_INTERVAL_MS", "100"))
+
+    # Routing: tasks scored at or above this confidence skip the LLM router
+    ROUTER_LOCAL_CONFIDENCE_THRESHOLD: float = float(os.getenv("ROUTER_LOCAL_CONFIDENCE_THRESHOLD", "0.75"))
+
+    # Response caching (in-process LRU + shared Redis tier)
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+    LLM_CACHE_TTL_DEV_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_DEV_SECONDS", "86400"))
+    LLM_CACHE_TTL_CONTENT_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_CONTENT_SECONDS", "900"))
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,51 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Monotonic instant by which the current task must finish
+_deadline: ContextVar[Optional[float]] = ContextVar("task_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The task used up its end-to-end time budget."""
+
+
+@contextmanager
+def task_deadline(deadline_at: Optional[float]):
+    """
+    Bound everything inside the block by deadline_at (epoch seconds, so it can travel between
+    processes with the task message). A nested deadline can only tighten an outer one; None keeps it.
+    """
+    current = _deadline.get()
+    if deadline_at is not None:
+        deadline = time.monotonic() + (deadline_at - time.time())
+        current = deadline if current is None else min(current, deadline)
+    token = _deadline.set(current)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline (negative once passed), or None when unbounded."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check_deadline(stage: str) -> None:
+    if expired():
+        raise DeadlineExceeded(f"Task deadline exceeded before {stage}")
+
+
+def stage_timeout(default: float, stage: str = "call") -> float:
+    """The stage's own timeout, shortened to what is left of the task's budget."""
+    check_deadline(stage)
+    left = remaining()
+    return default if left is None else min(default, left)
@@ -0,0 +1,223 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# LLM-bound work spans milliseconds (cache hits) to minutes (long generations)
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+STAGE_SECONDS = Histogram(
+    "agent_stage_seconds", "Latency of each pipeline stage", ["stage"], buckets=_BUCKETS
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "agent_queue_wait_seconds", "Time between enqueue and a worker starting the task", ["queue"], buckets=_BUCKETS
+)
+TASK_SECONDS = Histogram(
+    "agent_task_seconds", "End-to-end execution time of a task in the worker", ["agent", "status"], buckets=_BUCKETS
+)
+TASKS_TOTAL = Counter("agent_tasks_total", "Finished tasks", ["agent", "status"])
+ROUTE_DECISIONS = Counter(
+    "agent_route_decisions_total", "Routing decisions by path (local keyword scorer or LLM)", ["path"]
+)
+CACHE_REQUESTS = Counter(
+    "agent_cache_requests_total", "Cache lookups by tier outcome (local_hit, redis_hit, miss)", ["cache", "result"]
+)
+LLM_CALLS = Counter("agent_llm_calls_total", "LLM calls that reached the provider", ["agent", "model"])
+LLM_TOKENS = Counter("agent_llm_tokens_total", "LLM tokens by direction (prompt, completion)", ["agent", "model", "kind"])
+TASK_LOG_FLUSH_SECONDS = Histogram(
+    "agent_task_log_flush_seconds", "Duration of one buffered task_logs insert_many", buckets=_BUCKETS
+)
+LLM_RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "agent_llm_rate_limit_wait_seconds", "Time an LLM call waited for RPM/TPM capacity", ["model"], buckets=_BUCKETS
+)
+LLM_THROTTLED = Counter("agent_llm_throttled_total", "LLM calls rejected by the provider with 429", ["model"])
+LLM_CONCURRENCY_LIMIT = Gauge(
+    "agent_llm_concurrency_limit", "Adaptive in-flight LLM call limit", ["model"], multiprocess_mode="livesum"
+)
+CASCADE_TIERS = Counter(
+    "agent_cascade_tier_total", "Answers accepted per agent, model and cascade tier (0 = cheapest)", ["agent", "model", "tier"]
+)
+CASCADE_ESCALATIONS = Counter(
+    "agent_cascade_escalations_total", "Answers rejected by a local check and retried on the next tier",
+    ["agent", "model", "reason"],
+)
+CIRCUIT_REJECTIONS = Counter(
+    "agent_circuit_rejections_total", "Calls short-circuited by an open breaker", ["dependency"]
+)
+CIRCUIT_OPENED = Counter("agent_circuit_opened_total", "Times this process opened a breaker", ["dependency"])
+RESULTS_STORED = Counter(
+    "agent_results_stored_total", "Task results written to the backend by storage form (inline, zlib, mongo)", ["form"]
+)
+RESULT_STORED_BYTES = Counter(
+    "agent_result_stored_bytes_total", "Result body bytes before and after compaction", ["kind"]
+)
+CONTEXT_TOKENS = Counter(
+    "agent_context_tokens_total", "Search-context tokens before and after packing", ["kind"]
+)
+API_REQUEST_SECONDS = Histogram(
+    "agent_api_request_seconds", "API request latency", ["method", "route", "status"], buckets=_BUCKETS
+)
+
+
+class TaskMetrics:
+    """
+    Per-task stage timings (ms, summed when a stage repeats) and LLM token usage.
+    Mutated from pool threads that copied the context, hence the lock.
+    """
+
+    def __init__(self, timings: Optional[Dict[str, float]] = None, usage: Optional[Dict[str, int]] = None):
+        self.timings: Dict[str, float] = dict(timings or {})
+        self.usage: Dict[str, int] = dict(usage or {})
+        # Model (and its cascade tier) that produced the task's answer
+        self.model: Optional[str] = None
+        self.cascade_tier: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def add_timing(self, stage: str, duration_ms: float) -> None:
+        with self._lock:
+            self.timings[stage] = round(self.timings.get(stage, 0.0) + duration_ms, 2)
+
+    def add_usage(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.usage["llm_calls"] = self.usage.get("llm_calls", 0) + 1
+            self.usage["prompt_tokens"] = self.usage.get("prompt_tokens", 0) + prompt_tokens
+            self.usage["completion_tokens"] = self.usage.get("completion_tokens", 0) + completion_tokens
+            self.usage["total_tokens"] = self.usage["prompt_tokens"] + self.usage["completion_tokens"]
+
+    def add_count(self, name: str, value: int) -> None:
+        with self._lock:
+            self.usage[name] = self.usage.get(name, 0) + value
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return dict(self.timings), dict(self.usage)
+
+
+_current: ContextVar[Optional[TaskMetrics]] = ContextVar("task_metrics", default=None)
+
+
+@contextmanager
+def track_task(timings: Optional[Dict[str, float]] = None, usage: Optional[Dict[str, int]] = None):
+    """
+    Collect stage timings and token usage for the task running inside the block,
+    starting from what earlier hops (e.g. route_task) already measured.
+    """
+    task_metrics = TaskMetrics(timings, usage)
+    token = _current.set(task_metrics)
+    try:
+        yield task_metrics
+    finally:
+        _current.reset(token)
+
+
+def current_task_metrics() -> Optional[TaskMetrics]:
+    return _current.get()
+
+
+def record_stage(stage: str, duration_ms: float) -> None:
+    STAGE_SECONDS.labels(stage).observe(duration_ms / 1000)
+    task_metrics = _current.get()
+    if task_metrics is not None:
+        task_metrics.add_timing(stage, duration_ms)
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """Time the block with a monotonic clock; recorded even if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, (time.perf_counter() - start) * 1000)
+
+
+def total_tokens(usage: Optional[dict]) -> Optional[int]:
+    """Total tokens from LangChain usage_metadata, or None when the provider sent none."""
+    if not isinstance(usage, dict):
+        return None
+    return usage.get("total_tokens") or usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+
+def record_llm_usage(agent: str, model: str, usage: Optional[dict]) -> None:
+    """Count an LLM call and its tokens (LangChain usage_metadata; None when the provider sent none)."""
+    LLM_CALLS.labels(agent, model).inc()
+    if not isinstance(usage, dict):
+        return
+    prompt_tokens = usage.get("input_tokens", 0)
+    completion_tokens = usage.get("output_tokens", 0)
+    LLM_TOKENS.labels(agent, model, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(agent, model, "completion").inc(completion_tokens)
+    task_metrics = _current.get()
+    if task_metrics is not None:
+        task_metrics.add_usage(prompt_tokens, completion_tokens)
+
+
+def record_context_packing(tokens_unpacked: int, tokens_packed: int) -> None:
+    CONTEXT_TOKENS.labels("unpacked").inc(tokens_unpacked)
+    CONTEXT_TOKENS.labels("packed").inc(tokens_packed)
+    task_metrics = _current.get()
+    if task_metrics is not None:
+        task_metrics.add_count("context_tokens_saved", max(0, tokens_unpacked - tokens_packed))
+
+
+def record_cascade_tier(agent: str, model: str, tier: int) -> None:
+    CASCADE_TIERS.labels(agent, model, str(tier)).inc()
+    task_metrics = _current.get()
+    if task_metrics is not None:
+        task_metrics.model, task_metrics.cascade_tier = model, tier
+
+
+def record_escalation(agent: str, model: str, reason: str) -> None:
+    CASCADE_ESCALATIONS.labels(agent, model, reason).inc()
+    task_metrics = _current.get()
+    if task_metrics is not None:
+        task_metrics.add_count("cascade_escalations", 1)
+
+
+def _registry():
+    # Prefork workers write per-process files under PROMETHEUS_MULTIPROC_DIR; aggregate them on scrape
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_latest() -> tuple:
+    """Returns (body, content type) for a Prometheus scrape."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_worker_exporter() -> None:
+    """Serve worker metrics on WORKER_METRICS_PORT (0 disables); best-effort so a taken port never stops the worker."""
+    if not settings.METRICS_ENABLED or not settings.WORKER_METRICS_PORT:
+        return
+    try:
+        start_http_server(settings.WORKER_METRICS_PORT, registry=_registry())
+        logger.info(f"Worker metrics exporter listening on :{settings.WORKER_METRICS_PORT}")
+    except OSError as e:
+        logger.error(f"Failed to start worker metrics exporter: {e}")
+
+
+def mark_process_dead(pid: int) -> None:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,56 @@
+import logging
+import threading
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+# Rough characters-per-token ratio for English text with OpenAI tokenizers
+_CHARS_PER_TOKEN = 4
+
+
+def _get_encoding():
+    """
+    The worker model's tiktoken encoding, loaded once per process. tiktoken fetches the BPE file
+    on first use (the Docker image pre-fetches it); when that fails we estimate instead.
+    """
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return _encoding
+    with _encoding_lock:
+        if not _encoding_loaded:
+            try:
+                import tiktoken
+
+                try:
+                    _encoding = tiktoken.encoding_for_model(settings.OPENAI_MODEL_WORKER)
+                except KeyError:
+                    _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                logger.warning(f"Tokenizer unavailable, estimating token counts: {e}")
+                _encoding = None
+            _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, round(len(text) / _CHARS_PER_TOKEN))
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """text cut to at most max_tokens tokens, marked with an ellipsis when anything was dropped."""
+    encoding = _get_encoding()
+    if encoding is None:
+        max_chars = max_tokens * _CHARS_PER_TOKEN
+        return text if len(text) <= max_chars else text[:max_chars] + " …"
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens]) + " …"
@@ -1,38 +1,69 @@
-import logging
-from fastapi import FastAPI
-from redis import Redis
-from pymongo import MongoClient
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
 
 from app.api.routes import router as agent_router
 from app.core.config import settings
 from app.core.logging import configure_logging
-from app.services.celery_app import celery_app
+from app.core.metrics import API_REQUEST_SECONDS, render_latest
+from app.services.health import health_prober
+from app.services.mongo import ensure_indexes
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Index creation runs in the background so a slow Mongo never delays startup
+    asyncio.get_running_loop().run_in_executor(None, ensure_indexes)
+    health_prober.start()
+    yield
+    await health_prober.stop()
 
-app = FastAPI(title="Reperi AI Agent Backend")
+
+app = FastAPI(title="Reperi AI Agent Backend", lifespan=lifespan)
 
 configure_logging()
 
 app.include_router(agent_router, prefix="/v1/agent", tags=["agent"])
 
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, so task ids do not explode label cardinality
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    API_REQUEST_SECONDS.labels(request.method, route, str(response.status_code)).observe(time.perf_counter() - start)
+    return response
+
+
 @app.get("/")
 async def root():
     return {"message": "Reperi AI Backend is running"}
 
+@app.get("/health/live")
+async def liveness():
+    """The process is up and serving; never touches dependencies."""
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Answered from the background prober's cache; 503 until required components are healthy."""
+    if health_prober.is_ready():
+        return {"status": "ready"}
+    return JSONResponse(status_code=503, content={"status": "not_ready"})
+
 @app.get("/health")
 async def health_check():
-    try:
-        redis_client = Redis.from_url(settings.REDIS_URL)
-        redis_client.ping()
-
-        mongo_client = MongoClient(settings.MONGODB_URL, serverSelectionTimeoutMS=2000)
-        mongo_client.server_info()
-
-        celery_inspect = celery_app.control.inspect()
-        workers = celery_inspect.ping() if celery_inspect else None
-        if not workers:
-            return {"status": "degraded", "error": "No Celery workers available"}
-
-        return {"status": "ok", "redis": "connected", "mongodb": "connected", "celery": "connected"}
-    except Exception as exc:
-        logging.exception("Health check failed")
-        return {"status": "degraded", "error": str(exc)}
+    """Detailed view: per-component status and latency from the last background probe."""
+    return health_prober.snapshot()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint; workers expose the same metrics on WORKER_METRICS_PORT."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,140 @@
+import asyncio
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from typing import Any, Coroutine, Optional, Set
+
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, remaining
+
+logger = logging.getLogger(__name__)
+
+# One long-lived loop per worker process: the async LLM, HTTP and Redis clients pool their
+# connections per loop, so every task reuses them instead of reconnecting on a fresh loop
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+# Held from submit until the pipeline finishes; a full set blocks the submitting pool thread, so the
+# worker stops taking messages instead of piling them onto the loop
+_slots: Optional[threading.BoundedSemaphore] = None
+_pending: Set[Future] = set()
+_lock = threading.Lock()
+
+# The pipeline fails itself at the deadline and persists that; the grace lets it finish doing so
+# before within_deadline cancels it
+_DEADLINE_GRACE_SECONDS = 5.0
+
+
+def async_mode() -> bool:
+    return settings.WORKER_EXECUTION_MODE == "async"
+
+
+def _serve(loop: asyncio.AbstractEventLoop, ready: threading.Event) -> None:
+    asyncio.set_event_loop(loop)
+    loop.call_soon(ready.set)
+    loop.run_forever()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """The process's worker loop, started on first use (after a prefork child has forked)."""
+    global _loop, _thread, _slots
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                # Sized to the in-flight limit so the pipelines' asyncio.to_thread calls (cache, breaker,
+                # session lookups) never queue behind the default executor's min(32, cpus + 4) threads
+                loop.set_default_executor(ThreadPoolExecutor(
+                    max_workers=settings.WORKER_ASYNC_MAX_IN_FLIGHT, thread_name_prefix="async-worker-io"
+                ))
+                ready = threading.Event()
+                thread = threading.Thread(target=_serve, args=(loop, ready), name="async-worker-loop", daemon=True)
+                thread.start()
+                ready.wait()
+                _slots = threading.BoundedSemaphore(settings.WORKER_ASYNC_MAX_IN_FLIGHT)
+                _thread, _loop = thread, loop
+                logger.info(f"Async worker loop started (max {settings.WORKER_ASYNC_MAX_IN_FLIGHT} tasks in flight)")
+                if settings.LLM_MAX_CONCURRENCY < settings.WORKER_ASYNC_MAX_IN_FLIGHT:
+                    logger.warning(
+                        f"LLM_MAX_CONCURRENCY={settings.LLM_MAX_CONCURRENCY} caps this process's LLM calls "
+                        f"below WORKER_ASYNC_MAX_IN_FLIGHT={settings.WORKER_ASYNC_MAX_IN_FLIGHT}"
+                    )
+    return _loop
+
+
+def _settle(task: asyncio.Task, done: Future) -> None:
+    if task.cancelled():
+        done.cancel()
+    elif task.exception() is not None:
+        done.set_exception(task.exception())
+    else:
+        done.set_result(task.result())
+
+
+def _release(done: Future, slots: threading.BoundedSemaphore) -> None:
+    with _lock:
+        _pending.discard(done)
+    slots.release()
+
+
+def submit(coro: Coroutine) -> Future:
+    """
+    Start coro on the worker loop and return without waiting for it, once one of the
+    WORKER_ASYNC_MAX_IN_FLIGHT slots is free (blocking the calling pool thread until then).
+    The caller's context variables (bound task, metrics, deadline, cache bypass) carry over into the coroutine.
+    """
+    loop = get_loop()
+    slots = _slots
+    slots.acquire()
+    context = contextvars.copy_context()
+    done: Future = Future()
+    with _lock:
+        _pending.add(done)
+    done.add_done_callback(lambda finished: _release(finished, slots))
+
+    def start() -> None:
+        task = loop.create_task(coro, context=context)
+        task.add_done_callback(lambda finished: _settle(finished, done))
+
+    loop.call_soon_threadsafe(start)
+    return done
+
+
+async def within_deadline(coro: Coroutine) -> Any:
+    """Await coro, cancelling it and raising DeadlineExceeded once the task deadline (plus a grace) has passed."""
+    left = remaining()
+    try:
+        return await asyncio.wait_for(coro, None if left is None else max(left, 0) + _DEADLINE_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("Task deadline exceeded on the async worker loop") from None
+
+
+def stop(timeout: float = 5.0, drain: Optional[float] = None) -> None:
+    """
+    Stop the loop (worker shutdown). Pipelines already handed to it are waited for first, up to
+    drain seconds (default: the task deadline plus its grace, which none of them can outlive).
+    """
+    global _loop, _thread, _slots
+    with _lock:
+        loop, thread = _loop, _thread
+        pending = list(_pending)
+        _pending.clear()
+        _loop = _thread = _slots = None
+    if loop is None:
+        return
+    if pending:
+        logger.info(f"Waiting for {len(pending)} in-flight tasks before stopping the async worker loop")
+        _, unfinished = wait_futures(
+            pending, settings.TASK_DEADLINE_SECONDS + _DEADLINE_GRACE_SECONDS if drain is None else drain
+        )
+        if unfinished:
+            logger.warning(f"Stopping the async worker loop with {len(unfinished)} tasks still in flight")
+    try:
+        asyncio.run_coroutine_threadsafe(loop.shutdown_default_executor(), loop).result(timeout)
+    except Exception as e:
+        logger.warning(f"Async worker executor did not shut down cleanly: {e}")
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout)
+    if not thread.is_alive():
+        loop.close()
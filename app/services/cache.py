@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+from app.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+_bypass: ContextVar[bool] = ContextVar("cache_bypass", default=False)
+
+
+@contextmanager
+def bypass_cache():
+    """Skip cache reads and writes for everything executed inside the block."""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+class TieredCache:
+    """
+    Two-tier string cache: an in-process LRU in front of a shared Redis tier.
+    Redis errors are logged and treated as misses so the cache never breaks a task.
+    """
+
+    def __init__(self, namespace: str, max_entries: int, default_ttl: int):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "sets": 0}
+
+    def _redis_key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _set_local(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        if not settings.CACHE_ENABLED or _bypass.get():
+            return None
+
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._local.move_to_end(key)
+                    self.stats["local_hits"] += 1
+                    CACHE_REQUESTS.labels(self.namespace, "local_hit").inc()
+                    return value
+                del self._local[key]
+
+        try:
+            client = get_redis()
+            pipe = client.pipeline(transaction=False)
+            pipe.get(self._redis_key(key))
+            pipe.ttl(self._redis_key(key))
+            raw, ttl = pipe.execute()
+        except Exception as e:
+            logger.warning(f"Cache read from Redis failed ({self.namespace}): {e}")
+            raw, ttl = None, None
+
+        if raw is None:
+            self._count("misses")
+            CACHE_REQUESTS.labels(self.namespace, "miss").inc()
+            return None
+
+        value = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+        # Promote into the local tier, but never past the remaining Redis TTL
+        self._set_local(key, value, ttl if ttl and ttl > 0 else self.default_ttl)
+        self._count("redis_hits")
+        CACHE_REQUESTS.labels(self.namespace, "redis_hit").inc()
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        if not settings.CACHE_ENABLED or _bypass.get():
+            return
+        ttl = ttl or self.default_ttl
+        self._set_local(key, value, ttl)
+        self._count("sets")
+        try:
+            get_redis().set(self._redis_key(key), value, ex=ttl)
+        except Exception as e:
+            logger.warning(f"Cache write to Redis failed ({self.namespace}): {e}")
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so formatting-only differences share a cache entry."""
+    return " ".join(prompt.split())
+
+
+def llm_cache_key(model: str, temperature: Optional[float], prompt: str) -> str:
+    prompt_hash = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+    return f"{model}:{temperature}:{prompt_hash}"
+
+
+def search_cache_key(query: str, max_results: int) -> str:
+    """Case, whitespace and word order do not change what a search returns."""
+    normalized = " ".join(sorted(query.lower().split()))
+    query_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+    return f"{max_results}:{query_hash}"
+
+
+llm_cache = TieredCache(
+    "llm",
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    default_ttl=settings.LLM_CACHE_TTL_SECONDS,
+)
+
+search_cache = TieredCache(
+    "search",
+    max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+    default_ttl=settings.SEARCH_CACHE_TTL_SECONDS,
+)
@@ -1,6 +1,13 @@
 from celery import Celery
+from app.agents.constants import AgentType
 from app.core.config import settings
 
+# Registered names of the tasks in app.services.queue. The API publishes by name (send_task)
+# so it never imports the worker module and the agents behind it.
+ROUTE_TASK = "app.services.queue.route_task"
+PROCESS_TASK = "app.services.queue.process_task"
+COMPACT_SESSION_TASK = "app.services.queue.compact_session"
+
 celery_app = Celery(
     "worker",
     broker=settings.REDIS_URL,
@@ -8,6 +15,26 @@ celery_app = Celery(
     include=["app.services.queue"]
 )
 
+# Tasks that still need an LLM routing decision go to the router pool; process_task is
+# published straight to the agent's queue (queue_for_agent) once the agent is known.
 celery_app.conf.task_routes = {
-    "app.services.queue.process_task": "main-queue"
+    ROUTE_TASK: settings.ROUTER_QUEUE,
+    PROCESS_TASK: settings.CONTENT_QUEUE,
+    # Session summaries are content-agent LLM calls
+    COMPACT_SESSION_TASK: settings.CONTENT_QUEUE,
+}
+
+# Redis emulates priorities with one list per step; 0 is served first
+celery_app.conf.broker_transport_options = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
 }
+# Results are read by status polls shortly after completion; task_logs keeps the permanent record
+celery_app.conf.result_expires = settings.RESULT_TTL_SECONDS
+# Prefetching defeats priorities; pools that want more can raise it with --prefetch-multiplier
+celery_app.conf.worker_prefetch_multiplier = 1
+
+
+def queue_for_agent(agent: str) -> str:
+    return settings.DEV_QUEUE if agent == AgentType.DEV.value else settings.CONTENT_QUEUE
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, expired
+from app.core.metrics import CIRCUIT_OPENED, CIRCUIT_REJECTIONS
+from app.services.redis_client import get_redis, redis_available, report_redis_error
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# KEYS: open (expires when the breaker may half-open), tripped (set until a call succeeds again),
+# probe (the single half-open trial call), failures (consecutive, within the window).
+# Returns 0 when the call may go ahead, the ms left open, or -1 while another caller probes.
+_ALLOW_SCRIPT = """
+local open = redis.call('PTTL', KEYS[1])
+if open > 0 then return open end
+if redis.call('EXISTS', KEYS[2]) == 0 then return 0 end
+if redis.call('SET', KEYS[3], '1', 'NX', 'PX', ARGV[1]) then return 0 end
+return -1
+"""
+
+# Opens the breaker at the threshold, or at once when it failed while half-open. Returns 1 if this call opened it.
+_FAILURE_SCRIPT = """
+if redis.call('PTTL', KEYS[1]) > 0 then return 0 end
+local failures = redis.call('INCR', KEYS[4])
+if failures == 1 then redis.call('PEXPIRE', KEYS[4], ARGV[2]) end
+if redis.call('EXISTS', KEYS[2]) == 0 and failures < tonumber(ARGV[1]) then return 0 end
+redis.call('SET', KEYS[1], '1', 'PX', ARGV[3])
+redis.call('SET', KEYS[2], '1')
+redis.call('DEL', KEYS[3], KEYS[4])
+return 1
+"""
+
+# Resets the failure streak; returns 1 if the call closed a tripped breaker
+_SUCCESS_SCRIPT = """
+redis.call('DEL', KEYS[4])
+if redis.call('DEL', KEYS[2]) == 1 then
+    redis.call('DEL', KEYS[3])
+    return 1
+end
+return 0
+"""
+
+
+class CircuitOpenError(Exception):
+    """A dependency call was refused because its breaker is open."""
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _is_dependency_failure(error: Exception) -> bool:
+    """Timeouts, connection errors, 5xx and 429s count; our own bad requests and spent deadlines do not."""
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded)) or expired():
+        return False
+    status = _status_code(error)
+    return status is None or status >= 500 or status == 429
+
+
+class CircuitBreaker:
+    """
+    Breaker for one external dependency, shared by every worker process through Redis, so
+    one process's failures spare the others the same timeouts. While open, calls fail at once
+    and callers take their fallbacks; after CIRCUIT_OPEN_SECONDS a single probe call may close it.
+    Redis errors fail open (calls go ahead), and after a connection error the breaker leaves Redis
+    alone for REDIS_RETRY_AFTER_SECONDS.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._keys = [f"circuit:{{{name}}}:{part}" for part in ("open", "tripped", "probe", "failures")]
+        # Known-open state is cached locally so rejected calls skip Redis as well
+        self._open_until = 0.0
+
+    def _reject(self) -> bool:
+        CIRCUIT_REJECTIONS.labels(self.name).inc()
+        return False
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead; while half-open only the caller that wins the probe may."""
+        if not settings.CIRCUIT_BREAKER_ENABLED:
+            return True
+        if time.monotonic() < self._open_until:
+            return self._reject()
+        if not redis_available():
+            return True
+        try:
+            script = get_redis().register_script(_ALLOW_SCRIPT)
+            verdict = int(script(keys=self._keys[:3], args=[settings.CIRCUIT_PROBE_LEASE_SECONDS * 1000]))
+        except Exception as e:
+            report_redis_error(e)
+            logger.warning(f"Circuit breaker {self.name} unavailable, allowing call: {e}")
+            return True
+        if verdict == 0:
+            return True
+        if verdict > 0:
+            self._open_until = time.monotonic() + verdict / 1000
+        return self._reject()
+
+    def is_open(self) -> bool:
+        """Read-only check (does not take the probe), for skipping work that needs the dependency later."""
+        if not settings.CIRCUIT_BREAKER_ENABLED:
+            return False
+        if time.monotonic() < self._open_until:
+            return True
+        if not redis_available():
+            return False
+        try:
+            ttl = get_redis().pttl(self._keys[0])
+        except Exception as e:
+            report_redis_error(e)
+            logger.warning(f"Circuit breaker {self.name} unavailable: {e}")
+            return False
+        if ttl > 0:
+            self._open_until = time.monotonic() + ttl / 1000
+            return True
+        return False
+
+    def record_failure(self, error: Exception) -> None:
+        if not settings.CIRCUIT_BREAKER_ENABLED or not _is_dependency_failure(error) or not redis_available():
+            return
+        try:
+            script = get_redis().register_script(_FAILURE_SCRIPT)
+            opened = int(script(keys=self._keys, args=[
+                settings.CIRCUIT_FAILURE_THRESHOLD,
+                settings.CIRCUIT_FAILURE_WINDOW_SECONDS * 1000,
+                settings.CIRCUIT_OPEN_SECONDS * 1000,
+            ]))
+        except Exception as e:
+            report_redis_error(e)
+            logger.warning(f"Failed to record {self.name} failure: {e}")
+            return
+        if opened:
+            self._open_until = time.monotonic() + settings.CIRCUIT_OPEN_SECONDS
+            CIRCUIT_OPENED.labels(self.name).inc()
+            logger.error(f"Circuit {self.name} opened for {settings.CIRCUIT_OPEN_SECONDS}s after: {error!r}")
+
+    def record_success(self) -> None:
+        if not settings.CIRCUIT_BREAKER_ENABLED or not redis_available():
+            return
+        try:
+            closed = int(get_redis().register_script(_SUCCESS_SCRIPT)(keys=self._keys))
+        except Exception as e:
+            report_redis_error(e)
+            logger.warning(f"Failed to record {self.name} success: {e}")
+            return
+        if closed:
+            self._open_until = 0.0
+            logger.info(f"Circuit {self.name} closed")
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """Run fn() through the breaker; raises CircuitOpenError without calling it while open."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+        try:
+            result = fn()
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+    async def acall(self, fn: Callable[[], Awaitable[T]]) -> T:
+        if not await asyncio.to_thread(self.allow):
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+        try:
+            result = await fn()
+        except Exception as e:
+            await asyncio.to_thread(self.record_failure, e)
+            raise
+        await asyncio.to_thread(self.record_success)
+        return result
+
+
+openai_breaker = CircuitBreaker("openai")
+search_breaker = CircuitBreaker("google_cse")
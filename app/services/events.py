@@ -0,0 +1,176 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+_current_task_id: ContextVar[Optional[str]] = ContextVar("current_task_id", default=None)
+
+DONE_EVENT = "done"
+
+
+@contextmanager
+def bind_task(task_id: str):
+    """Make task_id the target of events published inside the block (threads inherit it via copied contexts)."""
+    token = _current_task_id.set(task_id)
+    try:
+        yield
+    finally:
+        _current_task_id.reset(token)
+
+
+def streaming_enabled() -> bool:
+    return settings.TASK_EVENTS_ENABLED and _current_task_id.get() is not None
+
+
+def stream_key(task_id: str) -> str:
+    return f"task-events:{task_id}"
+
+
+def queued_key(task_id: str) -> str:
+    return f"task-queued:{task_id}"
+
+
+def mark_enqueued(task_ids: List[str]) -> None:
+    """
+    Record that tasks were handed to the broker, for as long as the backend keeps results, so status
+    polls can tell a task still in flight from one the backend has forgotten. Best-effort.
+    """
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.set(queued_key(task_id), 1, ex=settings.RESULT_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to mark {len(task_ids)} tasks as enqueued: {e}")
+
+
+async def is_known(task_id: str) -> bool:
+    """Whether the task still has an enqueue marker or an event stream."""
+    return await get_async_redis().exists(queued_key(task_id), stream_key(task_id)) > 0
+
+
+def _entry(event: str, data) -> dict:
+    return {"event": event, "data": json.dumps(data, default=str)}
+
+
+def publish_event(event: str, data=None, task_id: Optional[str] = None) -> None:
+    """Append an event to the task's Redis stream. Best-effort: failures are logged, never raised."""
+    task_id = task_id or _current_task_id.get()
+    if not task_id or not settings.TASK_EVENTS_ENABLED:
+        return
+    key = stream_key(task_id)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.xadd(key, _entry(event, data), maxlen=settings.TASK_EVENTS_MAXLEN, approximate=True)
+        pipe.expire(key, settings.TASK_EVENTS_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to publish '{event}' event for task {task_id}: {e}")
+
+
+async def apublish_event(event: str, data=None, task_id: Optional[str] = None) -> None:
+    task_id = task_id or _current_task_id.get()
+    if not task_id or not settings.TASK_EVENTS_ENABLED:
+        return
+    key = stream_key(task_id)
+    try:
+        pipe = get_async_redis().pipeline(transaction=False)
+        pipe.xadd(key, _entry(event, data), maxlen=settings.TASK_EVENTS_MAXLEN, approximate=True)
+        pipe.expire(key, settings.TASK_EVENTS_TTL_SECONDS)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to publish '{event}' event for task {task_id}: {e}")
+
+
+class TokenBuffer:
+    """
+    Coalesces streamed tokens so a long completion is not one Redis write per token.
+    The first token goes out immediately (time-to-first-byte), later ones at most every interval.
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = settings.TASK_EVENTS_TOKEN_FLUSH_SECONDS if interval is None else interval
+        self._pending: List[str] = []
+        self._last_flush = 0.0
+
+    def add(self, token: str) -> Optional[str]:
+        if token:
+            self._pending.append(token)
+        if self._pending and time.monotonic() - self._last_flush >= self.interval:
+            return self.drain()
+        return None
+
+    def drain(self) -> Optional[str]:
+        if not self._pending:
+            return None
+        text = "".join(self._pending)
+        self._pending = []
+        self._last_flush = time.monotonic()
+        return text
+
+
+async def iter_events(
+    task_id: str,
+    last_event_id: str = "0-0",
+    block_ms: int = 15000,
+) -> AsyncIterator[Optional[Tuple[str, str, str]]]:
+    """
+    Relay a task's stream with blocking XREAD (no polling).
+    Yields (event_id, event, data) tuples, or None whenever block_ms passes with nothing new,
+    so callers can send keep-alives. Stops after the done event.
+    """
+    client = get_async_redis()
+    key = stream_key(task_id)
+    while True:
+        response = await client.xread({key: last_event_id}, block=block_ms, count=100)
+        if not response:
+            yield None
+            continue
+        for _, entries in response:
+            for entry_id, fields in entries:
+                last_event_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+                event = fields.get(b"event", b"").decode()
+                data = fields.get(b"data", b"null").decode()
+                yield last_event_id, event, data
+                if event == DONE_EVENT:
+                    return
+
+
+def _scan_for_done(response) -> Tuple[Optional[str], Optional[dict]]:
+    """Returns (last entry id, done payload or None) for an XREAD response."""
+    last_event_id = None
+    for _, entries in response:
+        for entry_id, fields in entries:
+            last_event_id = entry_id
+            if fields.get(b"event", b"").decode() == DONE_EVENT:
+                return last_event_id, json.loads(fields.get(b"data", b"null"))
+    return last_event_id, None
+
+
+async def wait_for_done(task_id: str, timeout: float) -> Optional[dict]:
+    """
+    Block (XREAD, no polling) until the task's done event is available or timeout passes.
+    Returns the done payload, or None on timeout. A done event that was already
+    published is returned immediately.
+    """
+    client = get_async_redis()
+    key = stream_key(task_id)
+    last_event_id = "0-0"
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining_ms = int((deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            return None
+        response = await client.xread({key: last_event_id}, block=remaining_ms, count=100)
+        if not response:
+            return None
+        last_event_id, done = _scan_for_done(response)
+        if done is not None:
+            return done
@@ -0,0 +1,118 @@
+import asyncio
+import contextlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from app.core.config import settings
+from app.services.celery_app import celery_app
+from app.services import mongo
+from app.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+def _probe_redis():
+    get_redis().ping()
+
+
+def _probe_mongo():
+    mongo.ping()
+
+
+def _probe_celery():
+    # control.ping waits the full timeout for replies, which is why it only runs in the background
+    replies = celery_app.control.ping(timeout=settings.HEALTH_CELERY_PING_TIMEOUT_SECONDS)
+    if not replies:
+        raise RuntimeError("No Celery workers available")
+
+
+class HealthProber:
+    """
+    Probes dependencies on an interval with the shared pooled clients and caches the outcome,
+    so health endpoints answer from memory instead of opening connections per request.
+    """
+
+    def __init__(self, probes: Dict[str, Callable[[], None]], interval: float, required: tuple):
+        self.probes = probes
+        self.interval = interval
+        self.required = required
+        self.components: Dict[str, dict] = {}
+        self.last_probe_at: Optional[float] = None
+        self._pool = ThreadPoolExecutor(max_workers=len(probes), thread_name_prefix="health-probe")
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _run_probe(probe: Callable[[], None]) -> dict:
+        start = time.perf_counter()
+        try:
+            probe()
+            status, error = "ok", None
+        except Exception as e:
+            status, error = "down", str(e)
+        return {
+            "status": status,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "checked_at": time.time(),
+            "error": error,
+        }
+
+    def probe_once(self) -> None:
+        futures = {name: self._pool.submit(self._run_probe, probe) for name, probe in self.probes.items()}
+        components = {name: future.result() for name, future in futures.items()}
+        for name, component in components.items():
+            previous = self.components.get(name, {}).get("status")
+            if previous != component["status"]:
+                logger.warning(f"Health of {name} changed: {previous} -> {component['status']} ({component['error']})")
+        self.components = components
+        self.last_probe_at = time.time()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.probe_once)
+            except Exception:
+                logger.exception("Health probe failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            # Let the cancellation land so shutdown does not destroy a pending task
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    def is_stale(self) -> bool:
+        return self.last_probe_at is None or time.time() - self.last_probe_at > 3 * self.interval
+
+    def is_ready(self) -> bool:
+        if self.is_stale():
+            return False
+        return all(self.components.get(name, {}).get("status") == "ok" for name in self.required)
+
+    def snapshot(self) -> dict:
+        if self.last_probe_at is None:
+            status = "starting"
+        elif all(c["status"] == "ok" for c in self.components.values()) and not self.is_stale():
+            status = "ok"
+        else:
+            status = "degraded"
+        return {
+            "status": status,
+            "ready": self.is_ready(),
+            "last_probe_at": self.last_probe_at,
+            "components": self.components,
+        }
+
+
+health_prober = HealthProber(
+    probes={"redis": _probe_redis, "mongodb": _probe_mongo, "celery": _probe_celery},
+    interval=settings.HEALTH_PROBE_INTERVAL_SECONDS,
+    required=tuple(name.strip() for name in settings.HEALTH_READY_COMPONENTS.split(",") if name.strip()),
+)
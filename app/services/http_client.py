@@ -0,0 +1,47 @@
+import asyncio
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+
+_session = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Returns a shared keep-alive session with a bounded connection pool,
+    so repeated calls to the same host skip the TCP + TLS handshake.
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=settings.HTTP_POOL_CONNECTIONS,
+            pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns a pooled AsyncClient for the running event loop.
+    httpx connections are bound to the loop that opened them, so each loop gets its own client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_MAXSIZE,
+                max_keepalive_connections=settings.HTTP_POOL_MAXSIZE,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
@@ -0,0 +1,215 @@
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from app.core.config import settings
+from app.core.metrics import TASK_LOG_FLUSH_SECONDS
+from app.services.mongo import get_logs_collection
+
+logger = logging.getLogger(__name__)
+
+
+def _revive(document: dict) -> dict:
+    # The spill file is JSON; created_at must go back in as a date for range queries and the TTL index
+    if isinstance(document.get("created_at"), str):
+        document["created_at"] = datetime.fromisoformat(document["created_at"])
+    return document
+
+
+class BufferedLogWriter:
+    """
+    Collects task log documents and writes them with unordered insert_many.
+    A background thread flushes when the batch fills up or the interval passes,
+    so Mongo latency never sits on a task's critical path. Documents that cannot
+    be written are appended to a local JSON-lines spill file, which the flusher
+    retries every replay_interval seconds.
+    """
+
+    def __init__(
+        self,
+        max_batch: int,
+        flush_interval: float,
+        spill_path: str,
+        replay_interval: float = 30.0,
+        stale_claim_seconds: float = 300.0,
+    ):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.spill_path = Path(spill_path)
+        self.replay_interval = replay_interval
+        self.stale_claim_seconds = stale_claim_seconds
+        # Replay claims this process holds (kept when a replay could neither write nor re-spill them)
+        self._claims: List[Path] = []
+        self._claims_pid: Optional[int] = None
+        self._buffer: List[dict] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def add(self, document: dict) -> None:
+        with self._lock:
+            self._buffer.append(document)
+            full = len(self._buffer) >= self.max_batch
+        self._ensure_flusher()
+        if full:
+            self._wakeup.set()
+
+    def _ensure_flusher(self) -> None:
+        # Threads do not survive fork, so each worker process starts its own
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="task-log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        next_replay = 0.0
+        while True:
+            if time.monotonic() >= next_replay:
+                next_replay = time.monotonic() + self.replay_interval
+                try:
+                    self.replay_spill()
+                except Exception as e:
+                    logger.error(f"Replaying spilled task logs failed: {e}")
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of documents handled."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            self._write(batch)
+            return len(batch)
+
+    def _write(self, batch: List[dict]) -> bool:
+        """Returns False only when documents were neither written nor spilled."""
+        try:
+            with TASK_LOG_FLUSH_SECONDS.time():
+                get_logs_collection().insert_many(batch, ordered=False)
+            return True
+        except BulkWriteError as e:
+            # Unordered inserts keep going past bad documents; spill only the failures
+            failed = [batch[err["index"]] for err in e.details.get("writeErrors", [])]
+            logger.error(f"Bulk task log write partially failed ({len(failed)}/{len(batch)})")
+            return self._spill(failed)
+        except Exception as e:
+            logger.error(f"Bulk task log write failed, spilling {len(batch)} documents: {e}")
+            return self._spill(batch)
+
+    def _spill(self, documents: List[dict]) -> bool:
+        if not documents:
+            return True
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for doc in documents:
+                    doc.pop("_id", None)
+                    f.write(json.dumps(doc, default=str) + "\n")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to spill task logs to {self.spill_path}: {e}")
+            return False
+
+    def _new_claim(self) -> Path:
+        # Workers share the spill directory across containers, where pids repeat: hostname and pid say
+        # who holds a claim, the uuid keeps two holders from ever picking the same name
+        name = f"{self.spill_path.name}.{socket.gethostname()}.{os.getpid()}.{uuid.uuid4().hex}.replay"
+        return self.spill_path.with_name(name)
+
+    def _take(self, source: Path) -> Optional[Path]:
+        """Atomically rename source to a new claim of ours; None if another process got there first."""
+        claimed = self._new_claim()
+        try:
+            # Touched first, so the claim never looks stale to other writers while we replay it
+            os.utime(source)
+            os.replace(source, claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    def _stale_claims(self) -> List[Path]:
+        cutoff = time.time() - self.stale_claim_seconds
+        stale = []
+        for path in self.spill_path.parent.glob(f"{self.spill_path.name}.*.replay"):
+            try:
+                if path not in self._claims and path.stat().st_mtime < cutoff:
+                    stale.append(path)
+            except FileNotFoundError:
+                continue
+        return stale
+
+    def replay_spill(self) -> None:
+        """
+        Re-insert previously spilled documents. The spill file, and any claim left stale by a process
+        that died mid-replay, are first renamed to a claim of our own, so only one process replays each.
+        A claim is removed only once its documents are written (or spilled again), so a failed
+        replay is retried from the same claim next time.
+        """
+        if self._claims_pid != os.getpid():
+            # A forked child does not inherit its parent's claims
+            self._claims, self._claims_pid = [], os.getpid()
+        for source in [*self._stale_claims(), self.spill_path]:
+            claimed = self._take(source)
+            if claimed is not None:
+                if source != self.spill_path:
+                    logger.warning(f"Adopting stale task log replay claim {source.name}")
+                self._claims.append(claimed)
+        for claimed in list(self._claims):
+            if self._replay(claimed):
+                self._claims.remove(claimed)
+
+    def _replay(self, claimed: Path) -> bool:
+        """Write one claim's documents; True once the claim is gone."""
+        try:
+            os.utime(claimed)
+            with open(claimed, encoding="utf-8") as f:
+                lines = list(f)
+        except FileNotFoundError:
+            return True
+        documents = []
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                documents.append(_revive(json.loads(line)))
+            except ValueError as e:
+                # A line cut short by a crash mid-spill; the rest of the file is still good
+                logger.warning(f"Skipping unreadable spilled task log {claimed.name}:{number}: {e}")
+        if documents:
+            logger.info(f"Replaying {len(documents)} spilled task logs")
+            if not self._write(documents):
+                return False
+        claimed.unlink(missing_ok=True)
+        return True
+
+    def close(self) -> None:
+        self.flush()
+
+
+log_writer = BufferedLogWriter(
+    max_batch=settings.TASK_LOG_BATCH_SIZE,
+    flush_interval=settings.TASK_LOG_FLUSH_INTERVAL_SECONDS,
+    spill_path=settings.TASK_LOG_SPILL_PATH,
+    replay_interval=settings.TASK_LOG_REPLAY_INTERVAL_SECONDS,
+    stale_claim_seconds=settings.TASK_LOG_STALE_CLAIM_SECONDS,
+)
+atexit.register(log_writer.close)
@@ -1,18 +1,30 @@
-from pymongo import MongoClient
+import logging
+
+from pymongo import ASCENDING, DESCENDING, AsyncMongoClient, MongoClient
+from pymongo.errors import OperationFailure
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 _client = None
 _db = None
+_async_client = None
+_async_db = None
 
 
 def _get_client():
     global _client, _db
     if _client is None:
-        _client = MongoClient(settings.MONGODB_URL, maxPoolSize=50)
+        _client = MongoClient(settings.MONGODB_URL, maxPoolSize=50, serverSelectionTimeoutMS=5000)
         _db = _client[settings.MONGODB_DB_NAME]
     return _client
 
 
+def ping() -> None:
+    """Round trip to the server on the shared pooled client; raises when MongoDB is unreachable."""
+    _get_client().admin.command("ping")
+
+
 def get_logs_collection():
     """
     Returns the MongoDB collection used for task log persistence.
@@ -21,3 +33,56 @@ def get_logs_collection():
     if _db is None:
         _get_client()
     return _db["task_logs"]
+
+
+def get_results_collection():
+    """Large task results offloaded from the Celery backend (see app.services.result_store)."""
+    if _db is None:
+        _get_client()
+    return _db["task_results"]
+
+
+def _get_async_db():
+    # Created lazily so it binds to the loop that first uses it
+    global _async_client, _async_db
+    if _async_db is None:
+        _async_client = AsyncMongoClient(settings.MONGODB_URL, maxPoolSize=50, serverSelectionTimeoutMS=2000)
+        _async_db = _async_client[settings.MONGODB_DB_NAME]
+    return _async_db
+
+
+def get_async_logs_collection():
+    """Async counterpart of get_logs_collection for code running on an event loop."""
+    return _get_async_db()["task_logs"]
+
+
+def get_async_results_collection():
+    return _get_async_db()["task_results"]
+
+
+def _ensure_ttl_index(collection, field: str, seconds: int) -> None:
+    try:
+        collection.create_index([(field, ASCENDING)], name=field, expireAfterSeconds=seconds)
+    except OperationFailure as e:
+        # IndexOptionsConflict: the retention changed since the index was built, so update it in place
+        if e.code != 85:
+            raise
+        collection.database.command("collMod", collection.name, index={"name": field, "expireAfterSeconds": seconds})
+
+
+def ensure_indexes():
+    """Create task_logs and task_results indexes; idempotent and best-effort so startup never fails on it."""
+    try:
+        logs = get_logs_collection()
+        logs.create_index([("task_id", ASCENDING)], name="task_id")
+        # Log queries page newest first on (created_at, _id), optionally within one agent or status
+        logs.create_index([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id")
+        logs.create_index([("agent", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="agent_created_at")
+        logs.create_index([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="status_created_at")
+        _ensure_ttl_index(logs, "created_at", settings.TASK_LOG_RETENTION_DAYS * 86400)
+        results = get_results_collection()
+        results.create_index([("task_id", ASCENDING)], name="task_id", unique=True)
+        # Offloaded bodies expire with the backend pointers that reference them
+        results.create_index([("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0)
+    except Exception as e:
+        logger.error(f"Failed to create indexes: {e}")
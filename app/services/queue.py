@@ -1,23 +1,80 @@
+import asyncio
 import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+from celery import states
+from celery.signals import worker_process_init, worker_process_shutdown, worker_ready, worker_shutdown
 
 from app.agents.constants import AgentType
 from app.agents.content import ContentAgent
 from app.agents.dev import DevAgent
-from app.agents.peer import PeerAgent
+from app.agents.peer import PeerAgent, RouteDecision
 from app.api.models import TaskResult
-from app.services.celery_app import celery_app
-from app.services.mongo import get_logs_collection
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, check_deadline, stage_timeout, task_deadline
+from app.core.metrics import (
+    QUEUE_WAIT_SECONDS,
+    TASK_SECONDS,
+    TASKS_TOTAL,
+    current_task_metrics,
+    mark_process_dead,
+    start_worker_exporter,
+    timed_stage,
+    track_task,
+)
+from app.services.cache import bypass_cache
+from app.services.celery_app import COMPACT_SESSION_TASK, PROCESS_TASK, ROUTE_TASK, celery_app, queue_for_agent
+from app.services import async_worker, session_memory, singleflight
+from app.services.events import (
+    DONE_EVENT,
+    apublish_event,
+    bind_task,
+    publish_event,
+    streaming_enabled,
+)
+from app.services.log_writer import log_writer
+from app.services.mongo import ensure_indexes
+from app.services.result_store import pack_result
 
 logger = logging.getLogger(__name__)
 
 
-peer_agent = PeerAgent()
-dev_agent = DevAgent()
-content_agent = ContentAgent()
+_agents = {}
+_agents_lock = threading.Lock()
+
+
+def _get_agent(cls):
+    """Build each agent once per process, on first use (LLM clients, OUTPUT_DIR) rather than at import."""
+    agent = _agents.get(cls)
+    if agent is None:
+        with _agents_lock:
+            agent = _agents.get(cls)
+            if agent is None:
+                agent = _agents[cls] = cls()
+    return agent
+
+
+def get_peer_agent() -> PeerAgent:
+    return _get_agent(PeerAgent)
+
+
+def get_dev_agent() -> DevAgent:
+    return _get_agent(DevAgent)
+
+
+def get_content_agent() -> ContentAgent:
+    return _get_agent(ContentAgent)
+
 
 def _log_to_mongo(task_result: TaskResult):
     try:
-        get_logs_collection().insert_one(task_result.model_dump())
+        # Buffered: the document is flushed with insert_many off the task's critical path
+        log_writer.add(task_result.model_dump())
     except Exception as log_err:
         # Best-effort logging; do not break task completion if logging fails
         logger.error(
@@ -25,43 +82,483 @@ def _log_to_mongo(task_result: TaskResult):
             extra={"task_id": task_result.task_id, "error": str(log_err)}
         )
 
-@celery_app.task(name="app.services.queue.process_task")
-def process_task(task_id: str, task_description: str):
+
+@worker_process_init.connect
+def _build_agents(**kwargs):
+    # Each prefork child builds its own after the fork, before taking its first task
+    get_peer_agent()
+    get_dev_agent()
+    get_content_agent()
+
+
+@worker_ready.connect
+def _create_indexes(**kwargs):
+    ensure_indexes()
+
+
+@worker_ready.connect
+def _start_metrics_exporter(**kwargs):
+    start_worker_exporter()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _stop_async_loop(**kwargs):
+    async_worker.stop()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _flush_task_logs(**kwargs):
+    log_writer.close()
+
+
+@worker_process_shutdown.connect
+def _retire_metrics(**kwargs):
+    mark_process_dead(os.getpid())
+
+
+def _queue_wait(task, enqueued_at: Optional[float], timings: Optional[dict]) -> dict:
+    """Seed a hop's timings with the time its message sat in the queue (wall clock, set by the publisher)."""
+    timings = dict(timings or {})
+    if enqueued_at is None:
+        return timings
+    wait = max(0.0, time.time() - enqueued_at)
+    queue = (task.request.delivery_info or {}).get("routing_key") or "unknown"
+    QUEUE_WAIT_SECONDS.labels(queue).observe(wait)
+    timings["queue_wait"] = round(timings.get("queue_wait", 0.0) + wait * 1000, 2)
+    return timings
+
+
+def _finish(result: TaskResult, started: float) -> TaskResult:
+    """Attach the task's stage timings, token usage and serving model, and count it."""
+    elapsed = time.perf_counter() - started
+    result.created_at = datetime.now(timezone.utc)
+    result.duration_ms = round(elapsed * 1000, 2)
+    task_metrics = current_task_metrics()
+    if task_metrics is not None:
+        task_metrics.add_timing("total", elapsed * 1000)
+        result.timings, result.usage = task_metrics.snapshot()
+        # Coalesced copies keep the model of the leader's answer
+        if task_metrics.model is not None:
+            result.model, result.cascade_tier = task_metrics.model, task_metrics.cascade_tier
+    agent = result.agent or "unknown"
+    TASK_SECONDS.labels(agent, result.status).observe(elapsed)
+    TASKS_TOTAL.labels(agent, result.status).inc()
+    return result
+
+
+def _persist(result: TaskResult) -> None:
+    # Timed for the histogram only: the document was already built, and the write is buffered
+    with timed_stage("persist"):
+        _log_to_mongo(result)
+
+
+def _target_agent(decision: RouteDecision) -> str:
+    return decision.agent_type.value if hasattr(decision.agent_type, "value") else decision.agent_type
+
+
+def _build_result(task_id: str, decision: RouteDecision, target_agent: str, result) -> TaskResult:
+    result_content = ""
+    file_path = None
+    if isinstance(result, dict):
+        file_path = result.get("file_path")
+        result_content = result.get("message") or result.get("result") or ""
+    else:
+        result_content = result
+
+    return TaskResult(
+        task_id=task_id,
+        status="completed",
+        agent=target_agent,
+        result=result_content,
+        reasoning=decision.reasoning,
+        file_path=file_path
+    )
+
+
+def _deadline(deadline_at: Optional[float], enqueued_at: Optional[float]) -> float:
+    # Messages published before deadlines existed get the default budget from their enqueue time
+    if deadline_at is not None:
+        return deadline_at
+    return (enqueued_at or time.time()) + settings.TASK_DEADLINE_SECONDS
+
+
+def _pre_routed(agent: Optional[str], reasoning: Optional[str]) -> Optional[RouteDecision]:
+    if not agent:
+        return None
+    return RouteDecision(agent_type=AgentType(agent), reasoning=reasoning or "Pre-routed")
+
+
+@celery_app.task(name=ROUTE_TASK, ignore_result=True)
+def route_task(
+    task_id: str,
+    task_description: str,
+    use_cache: bool = True,
+    priority: int = 0,
+    dedupe: bool = True,
+    enqueued_at: Optional[float] = None,
+    deadline_at: Optional[float] = None,
+    session_id: Optional[str] = None,
+):
+    """
+    Lightweight routing step for tasks the local router was unsure about.
+    Publishes process_task to the chosen agent's queue under the same task id;
+    ignore_result keeps this task from writing over that id in the result backend.
+    """
+    deadline_at = _deadline(deadline_at, enqueued_at)
+    dispatch = lambda decision, task_metrics: _dispatch(
+        task_id, task_description, decision, task_metrics,
+        use_cache=use_cache, priority=priority, dedupe=dedupe, deadline_at=deadline_at, session_id=session_id,
+    )
+    with track_task(_queue_wait(route_task, enqueued_at, None)) as task_metrics, task_deadline(deadline_at), \
+            session_memory.bind_history(session_memory.load_history(session_id)):
+        if async_worker.async_mode():
+            # Routing waits on the LLM on the process's event loop; this pool thread moves on to the next message
+            async_worker.submit(_aroute_and_dispatch(task_id, task_description, task_metrics, dispatch))
+            return
+        try:
+            with timed_stage("route"):
+                decision = get_peer_agent().route(task_description)
+        except Exception as e:
+            logger.error(f"LLM routing failed for {task_id}, using local router: {e}")
+            decision = get_peer_agent().local_router.classify(task_description)
+    dispatch(decision, task_metrics)
+
+
+async def _aroute_and_dispatch(task_id: str, task_description: str, task_metrics, dispatch: Callable) -> None:
+    try:
+        with timed_stage("route"):
+            decision = await async_worker.within_deadline(get_peer_agent().aroute(task_description))
+    except Exception as e:
+        logger.error(f"LLM routing failed for {task_id}, using local router: {e}")
+        decision = get_peer_agent().local_router.classify(task_description)
+    try:
+        await asyncio.to_thread(dispatch, decision, task_metrics)
+    except Exception as e:
+        logger.error(f"Failed to publish {task_id} to its agent queue: {e}")
+
+
+def _dispatch(
+    task_id: str,
+    task_description: str,
+    decision: RouteDecision,
+    task_metrics,
+    use_cache: bool,
+    priority: int,
+    dedupe: bool,
+    deadline_at: float,
+    session_id: Optional[str],
+) -> None:
+    agent = _target_agent(decision)
+    timings, usage = task_metrics.snapshot()
+    process_task.apply_async(
+        args=[task_id, task_description],
+        kwargs={
+            "use_cache": use_cache,
+            "agent": agent,
+            "reasoning": decision.reasoning,
+            "dedupe": dedupe,
+            "enqueued_at": time.time(),
+            "deadline_at": deadline_at,
+            "timings": timings,
+            "usage": usage,
+            "session_id": session_id,
+        },
+        task_id=task_id,
+        queue=queue_for_agent(agent),
+        priority=priority,
+    )
+
+
+@celery_app.task(name=PROCESS_TASK)
+def process_task(
+    task_id: str,
+    task_description: str,
+    use_cache: bool = True,
+    agent: Optional[str] = None,
+    reasoning: Optional[str] = None,
+    dedupe: bool = True,
+    enqueued_at: Optional[float] = None,
+    timings: Optional[dict] = None,
+    usage: Optional[dict] = None,
+    deadline_at: Optional[float] = None,
+    session_id: Optional[str] = None,
+):
+    started = time.perf_counter()
+    deadline_at = _deadline(deadline_at, enqueued_at)
+    timings = _queue_wait(process_task, enqueued_at, timings)
+    with bind_task(task_id), track_task(timings, usage), task_deadline(deadline_at), \
+            (nullcontext() if use_cache else bypass_cache()):
+        decision = _pre_routed(agent, reasoning)
+        coalesce = use_cache and dedupe
+        if async_worker.async_mode():
+            # The pipeline runs on the process's event loop and stores its own result, so this pool
+            # thread returns at once and takes the next message. Ignoring this request's result keeps
+            # Celery from storing None over it (raising Ignore would too, but formats a traceback per task)
+            async_worker.submit(_aprocess(task_id, task_description, decision, coalesce, session_id, started))
+            process_task.request.ignore_result = True
+            return None
+        result = _pipeline(task_id, task_description, decision, coalesce, session_id)
+        # The backend keeps a compact copy; the status endpoints rehydrate it
+        with timed_stage("store_result"):
+            return _pack_and_publish(result)
+
+
+async def _aprocess(
+    task_id: str,
+    task_description: str,
+    decision: Optional[RouteDecision],
+    coalesce: bool,
+    session_id: Optional[str],
+    started: float,
+) -> None:
+    try:
+        result = await async_worker.within_deadline(_apipeline(task_id, task_description, decision, coalesce, session_id))
+    except DeadlineExceeded as e:
+        # The pipeline hung past its budget and was cancelled before it could record a result
+        result = await asyncio.to_thread(_failed, task_id, e, started)
+    try:
+        with timed_stage("store_result"):
+            await asyncio.to_thread(_store_result, task_id, result)
+    except Exception as e:
+        logger.error(f"Failed to store the result of {task_id}: {e}")
+
+
+def _store_result(task_id: str, result: dict) -> None:
+    # What Celery stores when process_task returns the packed result itself
+    process_task.backend.store_result(task_id, _pack_and_publish(result), states.SUCCESS)
+
+
+def _pack_and_publish(result: dict) -> dict:
+    """
+    Compact the result for the backend and publish that same copy as the done event, so the stream
+    never holds a full body; readers rehydrate it with aunpack_result.
+    """
+    packed = pack_result(result)
+    publish_event(DONE_EVENT, packed)
+    return packed
+
+
+def _pipeline(
+    task_id: str,
+    task_description: str,
+    decision: Optional[RouteDecision],
+    coalesce: bool,
+    session_id: Optional[str],
+) -> dict:
+    run = lambda: _run_task(task_id, task_description, decision)
+    if session_id:
+        # Answers depend on the conversation, so session tasks are never coalesced
+        with session_memory.bind_history(session_memory.load_history(session_id)):
+            result = run()
+        _record_turn(session_id, task_description, result)
+        return result
+    if not (coalesce and settings.SINGLEFLIGHT_ENABLED):
+        return run()
+    return _run_coalesced(task_id, task_description, run)
+
+
+def _record_turn(session_id: str, task_description: str, result: dict) -> None:
+    if result.get("status") != "completed":
+        return
+    with timed_stage("session"):
+        if not session_memory.record_turn(session_id, task_description, str(result.get("result"))):
+            return
+        # Summarizing is an LLM call; run it as its own task so this one's result is not held back
+        try:
+            compact_session.delay(session_id)
+        except Exception as e:
+            logger.warning(f"Failed to schedule compaction of session {session_id}: {e}")
+
+
+@celery_app.task(name=COMPACT_SESSION_TASK, ignore_result=True)
+def compact_session(session_id: str):
+    """Fold a session's oldest turns into its running summary once it outgrew the history budget."""
+    try:
+        session_memory.compact(session_id, get_content_agent().summarize)
+    except Exception as e:
+        logger.warning(f"Failed to compact session {session_id}: {e}")
+
+
+def _follower_result(task_id: str, leader_id: str, shared: dict, started: float) -> dict:
+    # Timings and usage are this copy's own; the leader's tokens are already counted on the leader
+    shared = {**shared, "task_id": task_id, "deduplicated_from": leader_id, "timings": None, "usage": None}
+    result = _finish(TaskResult(**shared), started)
+    _persist(result)
+    return result.model_dump()
+
+
+def _run_coalesced(task_id: str, task_description: str, run: Callable[[], dict]) -> dict:
+    """
+    Singleflight: the first copy of a task executes; identical copies arriving while it runs
+    (or within SINGLEFLIGHT_WINDOW_SECONDS after) wait for and reuse its result under their own id.
+    """
+    started = time.perf_counter()
+    fingerprint = singleflight.task_fingerprint(task_description)
     try:
-        # 1. Route
-        decision = peer_agent.route(task_description)
-        target_agent = decision.agent_type.value if hasattr(decision.agent_type, "value") else decision.agent_type
+        leader_id, shared = singleflight.join(fingerprint, task_id)
+    except Exception as e:
+        logger.warning(f"Singleflight unavailable, executing {task_id} directly: {e}")
+        return run()
+
+    if leader_id is None:
+        with singleflight.hold(fingerprint, task_id):
+            result = run()
+        try:
+            singleflight.complete(fingerprint, task_id, result)
+        except Exception as e:
+            logger.warning(f"Failed to share singleflight result for {task_id}: {e}")
+        return result
+
+    if shared is None:
+        logger.info(f"Task {task_id} attached to in-flight duplicate {leader_id}")
+        try:
+            with timed_stage("coalesce_wait"):
+                shared = singleflight.wait(
+                    fingerprint, leader_id, stage_timeout(settings.TASK_DEADLINE_SECONDS, "coalesce_wait")
+                )
+        except Exception as e:
+            logger.warning(f"Waiting on {leader_id} failed: {e}")
+    if not shared or shared.get("status") != "completed":
+        # The leader failed or vanished; do the work ourselves rather than share a failure
+        return run()
+
+    return _follower_result(task_id, leader_id, shared, started)
+
+
+def _run_task(task_id: str, task_description: str, decision: Optional[RouteDecision] = None):
+    started = time.perf_counter()
+    try:
+        # Tasks that outlived their budget in the queue are failed without spending anything on them
+        check_deadline("execution")
+
+        # 1. Route (skipped when the API or route_task already decided)
+        if decision is None:
+            with timed_stage("route"):
+                decision = get_peer_agent().route(task_description)
+        target_agent = _target_agent(decision)
+        publish_event("routed", {"agent": target_agent, "reasoning": decision.reasoning})
         
         # 2. Execute
-        result_content = ""
-        file_path = None
         if target_agent == AgentType.DEV.value:
-            result = dev_agent.execute(task_description)
+            result = get_dev_agent().execute(task_description)
         else:
-            result = content_agent.execute(task_description)
+            result = get_content_agent().execute(task_description)
 
-        if isinstance(result, dict):
-            file_path = result.get("file_path")
-            result_content = result.get("message") or result.get("result") or ""
-        else:
-            result_content = result
-            
         # 3. Persist and return
-        result = TaskResult(
-            task_id=task_id,
-            status="completed",
-            agent=target_agent,
-            result=result_content,
-            reasoning=decision.reasoning,
-            file_path=file_path
+        result = _finish(_build_result(task_id, decision, target_agent, result), started)
+        _persist(result)
+        return result.model_dump()
+    except Exception as e:
+        return _failed(task_id, e, started)
+
+
+def _failed(task_id: str, error: Exception, started: float) -> dict:
+    error_result = _finish(TaskResult(
+        task_id=task_id,
+        status="failed",
+        error=str(error)
+    ), started)
+    _persist(error_result)
+    return error_result.model_dump()
+
+
+async def aprocess_task(
+    task_id: str,
+    task_description: str,
+    use_cache: bool = True,
+    agent: Optional[str] = None,
+    reasoning: Optional[str] = None,
+    dedupe: bool = True,
+    session_id: Optional[str] = None,
+):
+    """Async-native pipeline: route, execute and persist without blocking the event loop."""
+    deadline_at = time.time() + settings.TASK_DEADLINE_SECONDS
+    with bind_task(task_id), track_task(), task_deadline(deadline_at), (nullcontext() if use_cache else bypass_cache()):
+        result = await _apipeline(
+            task_id, task_description, _pre_routed(agent, reasoning), use_cache and dedupe, session_id
         )
-        _log_to_mongo(result)
+        if streaming_enabled():
+            await asyncio.to_thread(_pack_and_publish, result)
+        return result
+
+
+async def _apipeline(
+    task_id: str,
+    task_description: str,
+    decision: Optional[RouteDecision],
+    coalesce: bool,
+    session_id: Optional[str],
+) -> dict:
+    run = lambda: _arun_task(task_id, task_description, decision)
+    if session_id:
+        history = await asyncio.to_thread(session_memory.load_history, session_id)
+        with session_memory.bind_history(history):
+            result = await run()
+        await asyncio.to_thread(_record_turn, session_id, task_description, result)
+        return result
+    if not (coalesce and settings.SINGLEFLIGHT_ENABLED):
+        return await run()
+    return await _arun_coalesced(task_id, task_description, run)
+
+
+async def _arun_coalesced(task_id: str, task_description: str, run: Callable[[], Awaitable[dict]]) -> dict:
+    started = time.perf_counter()
+    fingerprint = singleflight.task_fingerprint(task_description)
+    try:
+        leader_id, shared = await asyncio.to_thread(singleflight.join, fingerprint, task_id)
+    except Exception as e:
+        logger.warning(f"Singleflight unavailable, executing {task_id} directly: {e}")
+        return await run()
+
+    if leader_id is None:
+        with singleflight.hold(fingerprint, task_id):
+            result = await run()
+        try:
+            await asyncio.to_thread(singleflight.complete, fingerprint, task_id, result)
+        except Exception as e:
+            logger.warning(f"Failed to share singleflight result for {task_id}: {e}")
+        return result
+
+    if shared is None:
+        logger.info(f"Task {task_id} attached to in-flight duplicate {leader_id}")
+        try:
+            with timed_stage("coalesce_wait"):
+                shared = await singleflight.await_result(
+                    fingerprint, leader_id, stage_timeout(settings.TASK_DEADLINE_SECONDS, "coalesce_wait")
+                )
+        except Exception as e:
+            logger.warning(f"Waiting on {leader_id} failed: {e}")
+    if not shared or shared.get("status") != "completed":
+        return await run()
+
+    return _follower_result(task_id, leader_id, shared, started)
+
+
+async def _arun_task(task_id: str, task_description: str, decision: Optional[RouteDecision] = None):
+    started = time.perf_counter()
+    try:
+        check_deadline("execution")
+        if decision is None:
+            with timed_stage("route"):
+                decision = await get_peer_agent().aroute(task_description)
+        target_agent = _target_agent(decision)
+        await apublish_event("routed", {"agent": target_agent, "reasoning": decision.reasoning})
+
+        if target_agent == AgentType.DEV.value:
+            result = await get_dev_agent().aexecute(task_description)
+        else:
+            result = await get_content_agent().aexecute(task_description)
+
+        result = _finish(_build_result(task_id, decision, target_agent, result), started)
+        _persist(result)
         return result.model_dump()
     except Exception as e:
-        error_result = TaskResult(
+        error_result = _finish(TaskResult(
             task_id=task_id,
             status="failed",
             error=str(e)
-        )
-        _log_to_mongo(error_result)
+        ), started)
+        _persist(error_result)
         return error_result.model_dump()
@@ -0,0 +1,362 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, remaining
+from app.core.metrics import LLM_CONCURRENCY_LIMIT, LLM_RATE_LIMIT_WAIT_SECONDS, LLM_THROTTLED, record_stage
+from app.services.redis_client import get_async_redis, get_redis, redis_available, report_redis_error
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Two token buckets per model (requests and tokens per minute), refilled continuously and checked
+# together against the Redis clock so every worker shares one budget. Returns 0 when the call may
+# go ahead (both buckets debited), otherwise the milliseconds to wait before asking again.
+_RESERVE_SCRIPT = """
+local cooldown = redis.call('PTTL', KEYS[3])
+if cooldown > 0 then return cooldown end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local function level(key, capacity)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    return math.min(capacity, tokens + (now - ts) * capacity / 60000)
+end
+local rpm = tonumber(ARGV[1])
+local tpm = tonumber(ARGV[2])
+local need = math.min(tonumber(ARGV[3]), tpm)
+local requests = level(KEYS[1], rpm)
+local tokens = level(KEYS[2], tpm)
+local wait = 0
+if requests < 1 then wait = math.max(wait, math.ceil((1 - requests) * 60000 / rpm)) end
+if tokens < need then wait = math.max(wait, math.ceil((need - tokens) * 60000 / tpm)) end
+if wait > 0 then return wait end
+redis.call('HSET', KEYS[1], 'tokens', requests - 1, 'ts', now)
+redis.call('HSET', KEYS[2], 'tokens', tokens - need, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+redis.call('PEXPIRE', KEYS[2], 120000)
+return 0
+"""
+
+# Settle the token bucket once the real usage is known (ARGV[2] = actual - estimated, may be negative)
+_RECONCILE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local capacity = tonumber(ARGV[1])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * capacity / 60000) - tonumber(ARGV[2])
+redis.call('HSET', KEYS[1], 'tokens', math.min(capacity, tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 120000)
+return 0
+"""
+
+
+def _keys(model: str) -> list:
+    # One hash tag per model keeps the keys in the same Redis Cluster slot
+    return [f"ratelimit:{{{model}}}:rpm", f"ratelimit:{{{model}}}:tpm", f"ratelimit:{{{model}}}:cooldown"]
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _retry_after_ms(error: Exception) -> int:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return int(float(headers["retry-after-ms"]))
+        if headers.get("retry-after"):
+            return int(float(headers["retry-after"]) * 1000)
+    except (TypeError, ValueError):
+        pass
+    return settings.LLM_RATE_LIMIT_COOLDOWN_MS
+
+
+class AdaptiveConcurrency:
+    """
+    Per-process cap on in-flight LLM calls, adjusted AIMD-style: +1/limit per healthy call,
+    halved on a 429, trimmed when latency climbs well above its moving average.
+    Waiters (threads or coroutines) are served FIFO and handed their slot directly; a waiter gives up
+    with DeadlineExceeded once the task's deadline passes.
+    """
+
+    def __init__(self, model: str, initial: int, minimum: int, maximum: int):
+        self.model = model
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self._lock = threading.Lock()
+        self._waiters: deque = deque()
+        LLM_CONCURRENCY_LIMIT.labels(model).set(int(self.limit))
+
+    def _grant(self) -> list:
+        """Assign free slots to waiters; returns their wake-up callbacks to run outside the lock."""
+        wake = []
+        while self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            wake.append(self._waiters.popleft())
+        return wake
+
+    def acquire(self) -> None:
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            left = remaining()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded(f"Task deadline exceeded waiting for a {self.model} slot")
+            event = threading.Event()
+            self._waiters.append(event.set)
+        if event.wait(left):
+            return
+        with self._lock:
+            if event.is_set():
+                # Granted just as the wait ran out; the slot is ours
+                return
+            self._waiters.remove(event.set)
+        raise DeadlineExceeded(f"Task deadline exceeded waiting for a {self.model} slot")
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            future = loop.create_future()
+
+            def resolve():
+                # A waiter cancelled after being granted a slot passes it on
+                if future.cancelled():
+                    self.release()
+                else:
+                    future.set_result(None)
+
+            left = remaining()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded(f"Task deadline exceeded waiting for a {self.model} slot")
+            def waiter():
+                loop.call_soon_threadsafe(resolve)
+
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(future, left)
+        except asyncio.TimeoutError:
+            with self._lock:
+                # Not yet granted: leave the queue. Already granted: resolve() sees the cancelled future
+                # and passes the slot on
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            raise DeadlineExceeded(f"Task deadline exceeded waiting for a {self.model} slot") from None
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            wake = self._grant()
+        for callback in wake:
+            callback()
+
+    def _set_limit(self, limit: float) -> None:
+        self.limit = max(float(self.minimum), min(float(self.maximum), limit))
+        LLM_CONCURRENCY_LIMIT.labels(self.model).set(int(self.limit))
+
+    def on_success(self, latency: float) -> None:
+        with self._lock:
+            slow = self.latency_ewma is not None and latency > self.latency_ewma * settings.LLM_AIMD_LATENCY_FACTOR
+            self.latency_ewma = latency if self.latency_ewma is None else 0.9 * self.latency_ewma + 0.1 * latency
+            self._set_limit(self.limit * 0.9 if slow else self.limit + 1 / self.limit)
+            wake = self._grant()
+        for callback in wake:
+            callback()
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self._set_limit(self.limit / 2)
+
+
+class LlmRateLimiter:
+    """
+    Gate for every OpenAI call: waits for the cluster-wide RPM/TPM buckets of the model
+    (queueing rather than failing), then for a local concurrency slot. A 429 halves local
+    concurrency, pauses the model for every worker (Retry-After) and retries the call.
+    Redis errors fail open, leaving only the local limit in force; after a connection error the
+    buckets are skipped for REDIS_RETRY_AFTER_SECONDS.
+    """
+
+    def __init__(self):
+        self._concurrency: Dict[str, AdaptiveConcurrency] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def limits(model: str) -> Tuple[int, int]:
+        """(requests, tokens) per minute: OPENAI_RATE_LIMITS overrides ("model=rpm:tpm,...") or the defaults."""
+        for entry in settings.OPENAI_RATE_LIMITS.split(","):
+            name, _, values = entry.strip().partition("=")
+            if name == model and ":" in values:
+                rpm, tpm = values.split(":", 1)
+                return int(rpm), int(tpm)
+        return settings.OPENAI_RPM_LIMIT, settings.OPENAI_TPM_LIMIT
+
+    def concurrency(self, model: str) -> AdaptiveConcurrency:
+        limiter = self._concurrency.get(model)
+        if limiter is None:
+            with self._lock:
+                limiter = self._concurrency.get(model)
+                if limiter is None:
+                    limiter = self._concurrency[model] = AdaptiveConcurrency(
+                        model,
+                        settings.LLM_INITIAL_CONCURRENCY,
+                        1,
+                        settings.LLM_MAX_CONCURRENCY,
+                    )
+        return limiter
+
+    def _record_wait(self, model: str, waited: float) -> None:
+        LLM_RATE_LIMIT_WAIT_SECONDS.labels(model).observe(waited)
+        if waited > 0:
+            record_stage("rate_limit_wait", waited * 1000)
+
+    @staticmethod
+    def _check_deadline(model: str, wait_ms: int) -> None:
+        left = remaining()
+        if left is not None and wait_ms / 1000 >= left:
+            raise DeadlineExceeded(f"Task deadline would pass while waiting for {model} capacity")
+
+    def _reserve(self, model: str, tokens: int) -> None:
+        rpm, tpm = self.limits(model)
+        start = time.monotonic()
+        while redis_available():
+            try:
+                script = get_redis().register_script(_RESERVE_SCRIPT)
+                wait_ms = int(script(keys=_keys(model), args=[rpm, tpm, tokens]))
+            except Exception as e:
+                report_redis_error(e)
+                logger.warning(f"Rate limiter unavailable for {model}, proceeding: {e}")
+                break
+            if wait_ms <= 0:
+                break
+            self._check_deadline(model, wait_ms)
+            if time.monotonic() - start > settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS:
+                logger.warning(f"Waited {settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS}s for {model} capacity, proceeding")
+                break
+            time.sleep(min(wait_ms, 1000) / 1000)
+        self._record_wait(model, time.monotonic() - start)
+
+    async def _areserve(self, model: str, tokens: int) -> None:
+        rpm, tpm = self.limits(model)
+        start = time.monotonic()
+        while redis_available():
+            try:
+                script = get_async_redis().register_script(_RESERVE_SCRIPT)
+                wait_ms = int(await script(keys=_keys(model), args=[rpm, tpm, tokens]))
+            except Exception as e:
+                report_redis_error(e)
+                logger.warning(f"Rate limiter unavailable for {model}, proceeding: {e}")
+                break
+            if wait_ms <= 0:
+                break
+            self._check_deadline(model, wait_ms)
+            if time.monotonic() - start > settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS:
+                logger.warning(f"Waited {settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS}s for {model} capacity, proceeding")
+                break
+            await asyncio.sleep(min(wait_ms, 1000) / 1000)
+        self._record_wait(model, time.monotonic() - start)
+
+    def _reconcile(self, model: str, estimated: int, actual: Optional[int]) -> None:
+        if actual is None or actual == estimated or not redis_available():
+            return
+        try:
+            get_redis().register_script(_RECONCILE_SCRIPT)(
+                keys=[_keys(model)[1]], args=[self.limits(model)[1], actual - estimated]
+            )
+        except Exception as e:
+            report_redis_error(e)
+            logger.warning(f"Failed to reconcile token usage for {model}: {e}")
+
+    def _throttled(self, model: str, error: Exception) -> None:
+        LLM_THROTTLED.labels(model).inc()
+        self.concurrency(model).on_throttle()
+        cooldown_ms = _retry_after_ms(error)
+        logger.warning(f"OpenAI rate limited {model}; pausing all workers for {cooldown_ms} ms")
+        if not redis_available():
+            return
+        try:
+            get_redis().set(_keys(model)[2], 1, px=cooldown_ms)
+        except Exception as e:
+            report_redis_error(e)
+            logger.warning(f"Failed to share cooldown for {model}: {e}")
+
+    def call(
+        self,
+        model: str,
+        estimated_tokens: int,
+        fn: Callable[[], T],
+        tokens_used: Callable[[T], Optional[int]] = lambda result: None,
+    ) -> T:
+        """Run fn() under the limits; tokens_used(result) settles the token estimate afterwards."""
+        if not settings.LLM_RATE_LIMIT_ENABLED:
+            return fn()
+        limiter = self.concurrency(model)
+        attempt = 0
+        while True:
+            self._reserve(model, estimated_tokens)
+            limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                if not _is_rate_limited(e):
+                    raise
+                self._throttled(model, e)
+                attempt += 1
+                if attempt > settings.LLM_RATE_LIMIT_RETRIES:
+                    raise
+                continue
+            finally:
+                limiter.release()
+            limiter.on_success(time.monotonic() - start)
+            self._reconcile(model, estimated_tokens, tokens_used(result))
+            return result
+
+    async def acall(
+        self,
+        model: str,
+        estimated_tokens: int,
+        fn: Callable[[], Awaitable[T]],
+        tokens_used: Callable[[T], Optional[int]] = lambda result: None,
+    ) -> T:
+        if not settings.LLM_RATE_LIMIT_ENABLED:
+            return await fn()
+        limiter = self.concurrency(model)
+        attempt = 0
+        while True:
+            await self._areserve(model, estimated_tokens)
+            await limiter.aacquire()
+            start = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as e:
+                if not _is_rate_limited(e):
+                    raise
+                await asyncio.to_thread(self._throttled, model, e)
+                attempt += 1
+                if attempt > settings.LLM_RATE_LIMIT_RETRIES:
+                    raise
+                continue
+            finally:
+                limiter.release()
+            limiter.on_success(time.monotonic() - start)
+            await asyncio.to_thread(self._reconcile, model, estimated_tokens, tokens_used(result))
+            return result
+
+
+llm_rate_limiter = LlmRateLimiter()
@@ -0,0 +1,60 @@
+import asyncio
+import time
+import weakref
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from app.core.config import settings
+
+_client = None
+# Monotonic time until which best-effort callers skip Redis after a connection failure
+_unavailable_until = 0.0
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncRedis]" = weakref.WeakKeyDictionary()
+
+
+def get_redis() -> Redis:
+    """
+    Returns a shared Redis client backed by a connection pool.
+    Lazily initialized so forked worker processes build their own pool.
+    """
+    global _client
+    if _client is None:
+        _client = Redis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=1,
+            socket_timeout=2,
+            health_check_interval=30,
+        )
+    return _client
+
+
+def get_async_redis() -> AsyncRedis:
+    """
+    Returns an asyncio Redis client for the running event loop.
+    No socket timeout, so blocking reads (XREAD BLOCK) can wait as long as they ask to.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncRedis.from_url(
+            settings.REDIS_URL,
+            socket_connect_timeout=1,
+            health_check_interval=30,
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def redis_available() -> bool:
+    """False for REDIS_RETRY_AFTER_SECONDS after a connection failure was reported in this process."""
+    return time.monotonic() >= _unavailable_until
+
+
+def report_redis_error(error: Exception) -> None:
+    """Note a failed Redis call; connection-level failures make redis_available() false for a while."""
+    global _unavailable_until
+    if isinstance(error, (RedisConnectionError, RedisTimeoutError, OSError)):
+        _unavailable_until = time.monotonic() + settings.REDIS_RETRY_AFTER_SECONDS
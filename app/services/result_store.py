@@ -0,0 +1,112 @@
+import base64
+import json
+import logging
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import RESULT_STORED_BYTES, RESULTS_STORED
+from app.services.mongo import get_async_results_collection, get_results_collection
+
+logger = logging.getLogger(__name__)
+
+# Set on backend copies whose "result" body is not stored as-is
+ENCODING_FIELD = "result_encoding"
+ZLIB = "zlib+base64"
+MONGO = "mongo"
+
+
+def _decode(compressed: bytes) -> Any:
+    return json.loads(zlib.decompress(compressed))
+
+
+def _offload(task_id: str, compressed: bytes) -> bool:
+    """Move a compressed body to task_results; False (and the body stays inline) if Mongo is unavailable."""
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=settings.RESULT_TTL_SECONDS)
+    try:
+        get_results_collection().replace_one(
+            {"task_id": task_id},
+            {"task_id": task_id, "body": compressed, "expires_at": expires_at},
+            upsert=True,
+        )
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to offload result of {task_id}, keeping it in the backend: {e}")
+        return False
+
+
+def pack_result(result: dict) -> dict:
+    """
+    Compact copy of a task result for the Celery backend. The body is kept as-is when small,
+    zlib-compressed above RESULT_COMPRESS_MIN_BYTES, and moved to Mongo when still above
+    RESULT_OFFLOAD_MIN_BYTES compressed, leaving only the metadata in Redis.
+    """
+    body = result.get("result")
+    if body is None:
+        RESULTS_STORED.labels("inline").inc()
+        return result
+    raw = json.dumps(body, default=str).encode("utf-8")
+    if len(raw) < settings.RESULT_COMPRESS_MIN_BYTES:
+        RESULTS_STORED.labels("inline").inc()
+        return result
+
+    compressed = zlib.compress(raw, 6)
+    RESULT_STORED_BYTES.labels("raw").inc(len(raw))
+    if len(compressed) >= settings.RESULT_OFFLOAD_MIN_BYTES and _offload(result["task_id"], compressed):
+        RESULTS_STORED.labels("mongo").inc()
+        return {**result, "result": None, ENCODING_FIELD: MONGO}
+    encoded = base64.b64encode(compressed).decode("ascii")
+    RESULT_STORED_BYTES.labels("stored").inc(len(encoded))
+    RESULTS_STORED.labels("zlib").inc()
+    return {**result, "result": encoded, ENCODING_FIELD: ZLIB}
+
+
+def _restore(stored: dict, compressed: Optional[bytes]) -> dict:
+    result = {k: v for k, v in stored.items() if k != ENCODING_FIELD}
+    if compressed is None:
+        logger.warning(f"Offloaded result of {stored.get('task_id')} is gone (expired?)")
+        result["result"] = None
+    else:
+        result["result"] = _decode(compressed)
+    return result
+
+
+def _is_packed(stored: Any) -> bool:
+    return isinstance(stored, dict) and ENCODING_FIELD in stored
+
+
+def unpack_result(stored: Any) -> Any:
+    """The full result for a backend value written by pack_result; anything else is returned unchanged."""
+    if not _is_packed(stored):
+        return stored
+    if stored[ENCODING_FIELD] == ZLIB:
+        return _restore(stored, base64.b64decode(stored["result"]))
+    document = get_results_collection().find_one({"task_id": stored["task_id"]}, {"body": 1})
+    return _restore(stored, document["body"] if document else None)
+
+
+async def aunpack_result(stored: Any) -> Any:
+    if not _is_packed(stored) or stored[ENCODING_FIELD] == ZLIB:
+        return unpack_result(stored)
+    document = await get_async_results_collection().find_one({"task_id": stored["task_id"]}, {"body": 1})
+    return _restore(stored, document["body"] if document else None)
+
+
+def unpack_results(stored_results: List[Any]) -> List[Any]:
+    """unpack_result for many values, fetching every offloaded body in one query."""
+    offloaded = [s["task_id"] for s in stored_results if _is_packed(s) and s[ENCODING_FIELD] == MONGO]
+    bodies = {}
+    if offloaded:
+        try:
+            cursor = get_results_collection().find({"task_id": {"$in": offloaded}}, {"task_id": 1, "body": 1})
+            bodies = {document["task_id"]: document["body"] for document in cursor}
+        except Exception as e:
+            logger.error(f"Failed to fetch {len(offloaded)} offloaded results: {e}")
+    unpacked = []
+    for stored in stored_results:
+        if _is_packed(stored) and stored[ENCODING_FIELD] == MONGO:
+            unpacked.append(_restore(stored, bodies.get(stored["task_id"])))
+        else:
+            unpacked.append(unpack_result(stored))
+    return unpacked
@@ -0,0 +1,136 @@
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.tokens import count_tokens, truncate_tokens
+from app.services.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Rendered history of the session the current task belongs to; prefixed to its LLM prompts
+_history: ContextVar[Optional[str]] = ContextVar("session_history", default=None)
+
+
+def _keys(session_id: str) -> Tuple[str, str, str]:
+    base = f"session:{{{session_id}}}"
+    return f"{base}:turns", f"{base}:summary", f"{base}:compacting"
+
+
+def _transcript(turns: List[dict]) -> str:
+    return "\n".join(f"User: {turn['user']}\nAssistant: {turn['assistant']}" for turn in turns)
+
+
+def load(session_id: str) -> Tuple[str, List[dict]]:
+    """The session's running summary and verbatim recent turns (oldest first)."""
+    turns_key, summary_key, _ = _keys(session_id)
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.get(summary_key)
+    pipe.lrange(turns_key, 0, -1)
+    summary, raw_turns = pipe.execute()
+    return (summary or b"").decode("utf-8"), [json.loads(raw) for raw in raw_turns]
+
+
+def render(summary: str, turns: List[dict]) -> str:
+    if not summary and not turns:
+        return ""
+    parts = ["Conversation so far (context only; respond to the latest request below):"]
+    if summary:
+        parts.append(f"Summary of earlier turns: {summary}")
+    if turns:
+        parts.append(_transcript(turns))
+    return "\n".join(parts)
+
+
+def load_history(session_id: Optional[str]) -> str:
+    """Rendered history for a session; empty (the task runs without it) when there is none or Redis fails."""
+    if not session_id:
+        return ""
+    try:
+        return render(*load(session_id))
+    except Exception as e:
+        logger.warning(f"Failed to load session {session_id}, continuing without history: {e}")
+        return ""
+
+
+@contextmanager
+def bind_history(history: str):
+    """Make history the conversation context of LLM prompts built inside the block."""
+    token = _history.set(history or None)
+    try:
+        yield
+    finally:
+        _history.reset(token)
+
+
+def with_history(prompt: str) -> str:
+    history = _history.get()
+    return f"{history}\n\n{prompt}" if history else prompt
+
+
+def _fold_count(summary: str, turns: List[dict]) -> int:
+    """How many of the oldest turns to fold into the summary so the history fits the budget again."""
+    sizes = [count_tokens(_transcript([turn])) for turn in turns]
+    if count_tokens(summary) + sum(sizes) <= settings.SESSION_HISTORY_TOKEN_BUDGET:
+        return 0
+    # Verbatim turns get what the (bounded) summary leaves of the budget
+    target = settings.SESSION_HISTORY_TOKEN_BUDGET - settings.SESSION_SUMMARY_MAX_TOKENS
+    fold = 0
+    remaining = sum(sizes)
+    while fold < len(turns) - settings.SESSION_KEEP_RECENT_TURNS and remaining > target:
+        remaining -= sizes[fold]
+        fold += 1
+    return fold
+
+
+def compact(session_id: str, summarize: Callable[[str, str], str]) -> int:
+    """
+    Fold the oldest turns into the running summary once the session exceeds its token budget.
+    summarize(summary, transcript) returns the updated summary. One process compacts a session
+    at a time; turns appended meanwhile are kept. Returns the number of turns folded.
+    """
+    turns_key, summary_key, lock_key = _keys(session_id)
+    client = get_redis()
+    if not client.set(lock_key, 1, nx=True, ex=settings.SESSION_COMPACT_LEASE_SECONDS):
+        return 0
+    try:
+        summary, turns = load(session_id)
+        fold = _fold_count(summary, turns)
+        if not fold:
+            return 0
+        updated = truncate_tokens(summarize(summary, _transcript(turns[:fold])), settings.SESSION_SUMMARY_MAX_TOKENS)
+        pipe = client.pipeline(transaction=True)
+        pipe.set(summary_key, updated, ex=settings.SESSION_TTL_SECONDS)
+        # Turns only ever get appended on the right, so the folded ones are still the first `fold`
+        pipe.ltrim(turns_key, fold, -1)
+        pipe.execute()
+        logger.info(f"Session {session_id}: folded {fold} turns into the summary")
+        return fold
+    finally:
+        client.delete(lock_key)
+
+
+def record_turn(session_id: str, task: str, answer: str) -> bool:
+    """
+    Append a finished exchange to the session. Returns whether the session grew past its budget
+    and should be compacted; the caller schedules that off the task's path. Best-effort.
+    """
+    turns_key, summary_key, _ = _keys(session_id)
+    turn = {
+        "user": truncate_tokens(task, settings.SESSION_TURN_MAX_TOKENS),
+        "assistant": truncate_tokens(answer, settings.SESSION_TURN_MAX_TOKENS),
+    }
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.rpush(turns_key, json.dumps(turn))
+        pipe.expire(turns_key, settings.SESSION_TTL_SECONDS)
+        pipe.expire(summary_key, settings.SESSION_TTL_SECONDS)
+        pipe.get(summary_key)
+        pipe.lrange(turns_key, 0, -1)
+        *_, summary, raw_turns = pipe.execute()
+        return _fold_count((summary or b"").decode("utf-8"), [json.loads(raw) for raw in raw_turns]) > 0
+    except Exception as e:
+        logger.warning(f"Failed to update session {session_id}: {e}")
+        return False
@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+from app.core.config import settings
+from app.services.redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger(__name__)
+
+# Delete the lock only if we still own it, so a leader whose lease ran out cannot drop a successor's lock
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Extend the lease only while we still own it
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def task_fingerprint(task: str) -> str:
+    normalized = " ".join(task.casefold().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _lock_key(fingerprint: str) -> str:
+    return f"singleflight:lock:{fingerprint}"
+
+
+def _result_key(fingerprint: str) -> str:
+    return f"singleflight:result:{fingerprint}"
+
+
+def join(fingerprint: str, task_id: str) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Join the flight for a task fingerprint.
+    Returns (None, None) when the caller leads and must execute, (leader_id, None) when
+    another task is executing it, or (leader_id, result) when a result from the last
+    SINGLEFLIGHT_WINDOW_SECONDS can be reused right away.
+    """
+    client = get_redis()
+    for _ in range(2):
+        raw = client.get(_result_key(fingerprint))
+        if raw is not None:
+            shared = json.loads(raw)
+            return shared.get("task_id"), shared
+        if client.set(_lock_key(fingerprint), task_id, nx=True, ex=settings.SINGLEFLIGHT_LEASE_SECONDS):
+            return None, None
+        leader = client.get(_lock_key(fingerprint))
+        if leader is not None:
+            return leader.decode(), None
+        # The lock expired between SET NX and GET; try once more
+    return None, None
+
+
+def complete(fingerprint: str, task_id: str, result: dict) -> None:
+    """Share a leader's successful result for the dedupe window, then release its lock."""
+    client = get_redis()
+    if result.get("status") == "completed":
+        client.set(_result_key(fingerprint), json.dumps(result, default=str), ex=settings.SINGLEFLIGHT_WINDOW_SECONDS)
+    release(fingerprint, task_id)
+
+
+def release(fingerprint: str, task_id: str) -> None:
+    get_redis().eval(_RELEASE_SCRIPT, 1, _lock_key(fingerprint), task_id)
+
+
+def renew(fingerprint: str, task_id: str) -> bool:
+    return bool(get_redis().eval(_RENEW_SCRIPT, 1, _lock_key(fingerprint), task_id, settings.SINGLEFLIGHT_LEASE_SECONDS))
+
+
+@contextmanager
+def hold(fingerprint: str, task_id: str):
+    """
+    Keep the leader's lock alive while it executes. The lease is short so that a crashed leader's
+    followers take over within SINGLEFLIGHT_LEASE_SECONDS; a live leader renews it every third of that.
+    """
+    stopped = threading.Event()
+
+    def heartbeat() -> None:
+        while not stopped.wait(settings.SINGLEFLIGHT_LEASE_SECONDS / 3):
+            try:
+                if not renew(fingerprint, task_id):
+                    return
+            except Exception as e:
+                logger.warning(f"Failed to renew singleflight lease for {task_id}: {e}")
+
+    thread = threading.Thread(target=heartbeat, name=f"singleflight-{task_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+
+
+def _settled(leader_id: str, raw_result: Optional[bytes], raw_leader: Optional[bytes]) -> Tuple[bool, Optional[dict]]:
+    if raw_result is not None:
+        return True, json.loads(raw_result)
+    # Lock gone or taken over: the leader failed (never shared), crashed or let its lease lapse
+    return raw_leader is None or raw_leader.decode() != leader_id, None
+
+
+def wait(fingerprint: str, leader_id: str, timeout: float) -> Optional[dict]:
+    """
+    Poll for the result the leader shares on completion. Returns None as soon as the leader stops
+    holding the lock without sharing one, or after timeout. Independent of task events being enabled.
+    """
+    client = get_redis()
+    deadline = time.monotonic() + timeout
+    while True:
+        settled, shared = _settled(leader_id, *client.mget(_result_key(fingerprint), _lock_key(fingerprint)))
+        if settled or time.monotonic() >= deadline:
+            return shared
+        time.sleep(settings.SINGLEFLIGHT_POLL_INTERVAL_MS / 1000)
+
+
+async def await_result(fingerprint: str, leader_id: str, timeout: float) -> Optional[dict]:
+    """Async counterpart of wait()."""
+    client = get_async_redis()
+    deadline = time.monotonic() + timeout
+    while True:
+        settled, shared = _settled(leader_id, *await client.mget(_result_key(fingerprint), _lock_key(fingerprint)))
+        if settled or time.monotonic() >= deadline:
+            return shared
+        await asyncio.sleep(settings.SINGLEFLIGHT_POLL_INTERVAL_MS / 1000)
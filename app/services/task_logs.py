@@ -0,0 +1,151 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from app.api.models import TaskResult
+from app.services.mongo import get_async_logs_collection
+
+LOG_FIELDS = frozenset(TaskResult.model_fields)
+
+# Newest first; ties on created_at are broken by _id so pages never skip or repeat documents
+_SORT = [("created_at", -1), ("_id", -1)]
+
+_PERCENTILES = (0.5, 0.95, 0.99)
+
+
+class InvalidLogQuery(ValueError):
+    """A malformed cursor or unknown field in a task log query."""
+
+
+def encode_cursor(document: dict) -> str:
+    """Opaque keyset cursor: the (created_at, _id) of the last document on a page."""
+    raw = json.dumps({"t": document["created_at"].isoformat(), "id": str(document["_id"])})
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(data["t"]), ObjectId(data["id"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise InvalidLogQuery("Invalid cursor") from e
+
+
+def _time_range(since: Optional[datetime], until: Optional[datetime]) -> dict:
+    # Documents written before created_at existed are left out rather than sorted as nulls
+    created_at = {"$exists": True}
+    if since is not None:
+        created_at["$gte"] = since
+    if until is not None:
+        created_at["$lt"] = until
+    return created_at
+
+
+def build_query(
+    agent: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+) -> dict:
+    query = {"created_at": _time_range(since, until)}
+    if agent:
+        query["agent"] = agent
+    if status:
+        query["status"] = status
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}},
+        ]
+    return query
+
+
+def requested_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validated names from a comma-separated field list; None means whole documents."""
+    if not fields:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(names) - LOG_FIELDS)
+    if unknown:
+        raise InvalidLogQuery(f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def _as_utc(value: datetime) -> datetime:
+    # PyMongo returns naive UTC datetimes
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+async def query_logs(
+    agent: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> dict:
+    """One page of task logs, newest first, served from the (filter, created_at, _id) indexes."""
+    query = build_query(agent, status, since, until, cursor)
+    names = requested_fields(fields)
+    # created_at (and _id, included by default) are always fetched to build the next cursor
+    projection = None if names is None else {**{name: 1 for name in names}, "created_at": 1}
+    documents: List[dict] = await (
+        get_async_logs_collection().find(query, projection).sort(_SORT).limit(limit + 1).to_list(limit + 1)
+    )
+    next_cursor = encode_cursor(documents[limit - 1]) if len(documents) > limit else None
+
+    items = []
+    for document in documents[:limit]:
+        document.pop("_id", None)
+        document["created_at"] = _as_utc(document["created_at"])
+        if names is not None:
+            document = {name: document[name] for name in names if name in document}
+        items.append(document)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def log_stats(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    agent: Optional[str] = None,
+) -> dict:
+    """
+    Per-agent task counts, failures and duration percentiles over a time range (default: the last
+    24 hours), aggregated in Mongo so only one row per agent comes back. Needs MongoDB 7.0+ ($percentile).
+    """
+    since = since or datetime.now(timezone.utc) - timedelta(days=1)
+    match = {"created_at": _time_range(since, until)}
+    if agent:
+        match["agent"] = agent
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": "$agent",
+            "count": {"$sum": 1},
+            "failed": {"$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}},
+            "avg_ms": {"$avg": "$duration_ms"},
+            "percentiles_ms": {
+                "$percentile": {"input": "$duration_ms", "p": list(_PERCENTILES), "method": "approximate"}
+            },
+        }},
+        {"$sort": {"count": -1}},
+    ]
+    rows = await (await get_async_logs_collection().aggregate(pipeline)).to_list(None)
+    agents = []
+    for row in rows:
+        percentiles = row.get("percentiles_ms") or [None] * len(_PERCENTILES)
+        agents.append({
+            "agent": row["_id"] or "unknown",
+            "count": row["count"],
+            "failed": row["failed"],
+            "avg_ms": row["avg_ms"],
+            **{f"p{round(p * 100)}_ms": value for p, value in zip(_PERCENTILES, percentiles)},
+        })
+    return {"since": _as_utc(since), "until": _as_utc(until) if until else None, "agents": agents}
@@ -0,0 +1,289 @@
+"""
+Deterministic local stand-ins for everything the pipeline calls over the network:
+the OpenAI chat model, Google CSE, Redis and MongoDB. Latencies are configurable so
+benchmarks measure our own overhead (queueing, routing, caching, persistence) repeatably.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+from app.agents.routing import LocalRouter
+
+
+class StageRecorder:
+    """Thread-safe collector of per-stage durations in milliseconds."""
+
+    def __init__(self):
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, duration_ms: float) -> None:
+        with self._lock:
+            self._samples[stage].append(duration_ms)
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self) -> Dict[str, List[float]]:
+        with self._lock:
+            return {stage: list(samples) for stage, samples in self._samples.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+class Latency:
+    """Base delay plus uniform jitter, from a seeded generator so runs are repeatable."""
+
+    def __init__(self, base_ms: float, jitter_ms: float = 0.0, seed: int = 0):
+        self.base_ms = base_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.base_ms + jitter) / 1000
+
+    def sleep(self) -> None:
+        time.sleep(self.sample())
+
+    async def asleep(self) -> None:
+        await asyncio.sleep(self.sample())
+
+
+_local_router = LocalRouter()
+
+
+def _links(query: str, count: int = 5) -> List[str]:
+    # Half the links depend only on the first word, so related queries overlap like real results do
+    topic = (query.split() or ["topic"])[0].lower()
+    digest = hashlib.sha1(query.lower().encode("utf-8")).hexdigest()
+    shared = [f"https://{topic}.example.com/article/{i}" for i in range(count // 2)]
+    unique = [f"https://news{i}.example.org/{digest[:8]}" for i in range(count - len(shared))]
+    return shared + unique
+
+
+def fake_reply(prompt: str) -> tuple:
+    """Returns (stage, text): a plausible response for each prompt the agents send."""
+    if "Peer Agent responsible for routing" in prompt:
+        task = prompt.split("Task:", 1)[-1].split("\n", 1)[0].strip()
+        decision = _local_router.classify(task)
+        return "llm.route", json.dumps({
+            "agent_type": decision.agent_type.value,
+            "reasoning": "Benchmark stand-in decision",
+            "confidence": 0.9,
+        })
+    if "complementary, concise English web search queries" in prompt:
+        task = prompt.rsplit("User request:", 1)[-1].strip()
+        return "llm.rewrite", "\n".join(f"{task} {angle}" for angle in ("latest news", "official", "timeline"))
+    if "concise, English web search query" in prompt:
+        return "llm.rewrite", prompt.rsplit("User request:", 1)[-1].strip()
+    if "Write the full code for this request" in prompt:
+        task = prompt.split("Request:", 1)[-1].split("\n", 1)[0].strip()
+        slug = hashlib.sha1(task.encode("utf-8")).hexdigest()[:8]
+        return "llm.code", json.dumps({
+            "filename": f"bench_{slug}.py",
+            "language": "python",
+            "code": f"def main():\n    print({task!r})\n\n\nif __name__ == \"__main__\":\n    main()\n",
+        })
+    if "You are a research assistant" in prompt:
+        sources = [line.split("Source:", 1)[1].strip() for line in prompt.splitlines() if "Source:" in line]
+        return "llm.answer", "Answer: Benchmark answer.\nSources:\n" + "\n".join(f"- {s}" for s in sources[:3])
+    return "llm.answer", "Benchmark answer to: " + prompt[:200]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model with canned replies and simulated latency. Streaming yields the first chunk
+    after the full latency and the rest `chunk_ms` apart, like a real time-to-first-token.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model_name: str = "fake-llm"
+    temperature: float = 0.2
+    latency: Latency
+    recorder: StageRecorder
+    chunk_ms: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @staticmethod
+    def _prompt(messages: List[BaseMessage]) -> str:
+        return "\n".join(str(m.content) for m in messages)
+
+    @staticmethod
+    def _chunks(text: str) -> List[str]:
+        words = text.split(" ")
+        return [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        stage, text = fake_reply(self._prompt(messages))
+        with self.recorder.time(stage):
+            self.latency.sleep()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        stage, text = fake_reply(self._prompt(messages))
+        with self.recorder.time(stage):
+            await self.latency.asleep()
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        stage, text = fake_reply(self._prompt(messages))
+        start = time.perf_counter()
+        self.latency.sleep()
+        for i, chunk in enumerate(self._chunks(text)):
+            if i and self.chunk_ms:
+                time.sleep(self.chunk_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+        self.recorder.record(stage, (time.perf_counter() - start) * 1000)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        stage, text = fake_reply(self._prompt(messages))
+        start = time.perf_counter()
+        await self.latency.asleep()
+        for i, chunk in enumerate(self._chunks(text)):
+            if i and self.chunk_ms:
+                await asyncio.sleep(self.chunk_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+        self.recorder.record(stage, (time.perf_counter() - start) * 1000)
+
+
+class FakeSearchResponse:
+    def __init__(self, query: str, count: int):
+        self._items = [
+            {"title": f"{query} result {i}", "snippet": f"Snippet {i} about {query}.", "link": link}
+            for i, link in enumerate(_links(query, count))
+        ]
+
+    def raise_for_status(self) -> None:
+        return None
+
+    def json(self) -> dict:
+        return {"items": self._items}
+
+
+class FakeSearchSession:
+    """Stands in for both the requests session and the httpx client used for Google CSE."""
+
+    def __init__(self, latency: Latency, recorder: StageRecorder):
+        self.latency = latency
+        self.recorder = recorder
+
+    def get(self, url: str, params: Optional[dict] = None, timeout: Any = None) -> FakeSearchResponse:
+        params = params or {}
+        with self.recorder.time("search"):
+            self.latency.sleep()
+        return FakeSearchResponse(params.get("q", ""), int(params.get("num", 5)))
+
+
+class FakeAsyncSearchClient(FakeSearchSession):
+    is_closed = False
+
+    async def get(self, url: str, params: Optional[dict] = None, timeout: Any = None) -> FakeSearchResponse:
+        params = params or {}
+        with self.recorder.time("search"):
+            await self.latency.asleep()
+        return FakeSearchResponse(params.get("q", ""), int(params.get("num", 5)))
+
+
+def _matches(document: dict, query: dict) -> bool:
+    return all(
+        document.get(field) in value["$in"] if isinstance(value, dict) else document.get(field) == value
+        for field, value in query.items()
+    )
+
+
+class InMemoryCollection:
+    """The slice of the pymongo Collection API the app uses, kept in a list."""
+
+    def __init__(self, latency: Latency, recorder: StageRecorder):
+        self.latency = latency
+        self.recorder = recorder
+        self.documents: List[dict] = []
+        self._lock = threading.Lock()
+
+    def create_index(self, keys, **kwargs) -> str:
+        return kwargs.get("name", "index")
+
+    def insert_one(self, document: dict):
+        self.insert_many([document])
+
+    def insert_many(self, documents: List[dict], ordered: bool = True):
+        with self.recorder.time("mongo.insert"):
+            self.latency.sleep()
+            with self._lock:
+                self.documents.extend(dict(d) for d in documents)
+
+    def replace_one(self, query: dict, document: dict, upsert: bool = False):
+        with self.recorder.time("mongo.insert"):
+            self.latency.sleep()
+            with self._lock:
+                self.documents = [d for d in self.documents if not _matches(d, query)]
+                self.documents.append(dict(document))
+
+    def find_one(self, query: dict, projection: Optional[dict] = None) -> Optional[dict]:
+        with self._lock:
+            for document in reversed(self.documents):
+                if _matches(document, query):
+                    return {k: v for k, v in document.items() if k != "_id"}
+        return None
+
+    def find(self, query: dict, projection: Optional[dict] = None) -> List[dict]:
+        with self._lock:
+            return [{k: v for k, v in d.items() if k != "_id"} for d in self.documents if _matches(d, query)]
+
+
+class AsyncInMemoryCollection:
+    def __init__(self, collection: InMemoryCollection):
+        self._collection = collection
+
+    async def insert_one(self, document: dict):
+        with self._collection.recorder.time("mongo.insert"):
+            await self._collection.latency.asleep()
+            with self._collection._lock:
+                self._collection.documents.append(dict(document))
+
+    async def find_one(self, query: dict, projection: Optional[dict] = None) -> Optional[dict]:
+        return self._collection.find_one(query, projection)
+
+
+class InMemoryDatabase(dict):
+    def __init__(self, factory):
+        super().__init__()
+        self._factory = factory
+
+    def __missing__(self, name: str):
+        self[name] = self._factory(name)
+        return self[name]
+
+
+class InMemoryMongoClient:
+    """Answers the health probe's admin ping."""
+
+    class admin:
+        @staticmethod
+        def command(name: str) -> dict:
+            return {"ok": 1}
@@ -0,0 +1,222 @@
+"""
+Wires the fakes into the application and runs Celery workers in-process, so
+API -> broker -> worker -> agents -> Mongo runs end to end without external services
+(mode "memory") or against a local Redis and MongoDB (mode "local").
+"""
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from celery.contrib.testing.worker import start_worker
+from celery.signals import task_postrun, task_prerun
+
+from app.core.config import settings
+from benchmarks.fakes import (
+    AsyncInMemoryCollection,
+    FakeAsyncSearchClient,
+    FakeChatModel,
+    FakeSearchSession,
+    InMemoryCollection,
+    InMemoryDatabase,
+    InMemoryMongoClient,
+    Latency,
+    StageRecorder,
+)
+
+ASYNC_POOL_THREADS = 2
+
+
+@dataclass
+class BenchConfig:
+    mode: str = "memory"
+    llm_latency_ms: float = 400.0
+    llm_jitter_ms: float = 100.0
+    llm_chunk_ms: float = 5.0
+    search_latency_ms: float = 150.0
+    search_jitter_ms: float = 50.0
+    mongo_latency_ms: float = 2.0
+    # Task slots: pool threads in sync mode, pipelines in flight on the event loop in async mode
+    worker_concurrency: int = 8
+    # "sync" blocks a worker thread per task, like a prefork child; "async" runs pipelines on one event loop
+    worker_mode: str = "sync"
+    seed: int = 0
+
+
+class TaskTimeline:
+    """Submit, start and finish times per task id, fed by the client and Celery signals."""
+
+    def __init__(self, recorder: StageRecorder):
+        self.recorder = recorder
+        self.submitted: Dict[str, float] = {}
+        self._started: Dict[tuple, float] = {}
+        self._queued_once = set()
+        self._lock = threading.Lock()
+
+    def submit(self, task_id: str) -> None:
+        with self._lock:
+            self.submitted[task_id] = time.perf_counter()
+
+    def on_prerun(self, task_id=None, task=None, **kwargs) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            self._started[(task_id, task.name)] = now
+            submitted = self.submitted.get(task_id)
+            first_start = task_id not in self._queued_once
+            self._queued_once.add(task_id)
+        if submitted is not None and first_start:
+            self.recorder.record("queue_wait", (now - submitted) * 1000)
+
+    def on_postrun(self, task_id=None, task=None, **kwargs) -> None:
+        with self._lock:
+            started = self._started.pop((task_id, task.name), None)
+        if started is not None:
+            self.recorder.record(f"celery.{task.name.rsplit('.', 1)[-1]}", (time.perf_counter() - started) * 1000)
+
+
+def _install_fake_redis(stack: ExitStack) -> None:
+    import fakeredis
+
+    from app.services import redis_client
+
+    server = fakeredis.FakeServer()
+
+    class _AsyncFactory:
+        @staticmethod
+        def from_url(url, **kwargs):
+            return fakeredis.FakeAsyncRedis(server=server)
+
+    previous = redis_client._client, redis_client.AsyncRedis
+    redis_client._client = fakeredis.FakeRedis(server=server)
+    redis_client.AsyncRedis = _AsyncFactory
+    redis_client._async_clients.clear()
+
+    def restore():
+        redis_client._client, redis_client.AsyncRedis = previous
+        redis_client._async_clients.clear()
+
+    stack.callback(restore)
+
+
+def _install_fake_mongo(stack: ExitStack, latency: Latency, recorder: StageRecorder) -> None:
+    from app.services import mongo
+
+    sync_db = InMemoryDatabase(lambda name: InMemoryCollection(latency, recorder))
+    async_db = InMemoryDatabase(lambda name: AsyncInMemoryCollection(sync_db[name]))
+    previous = mongo._client, mongo._db, mongo._async_db
+    mongo._client, mongo._db, mongo._async_db = InMemoryMongoClient(), sync_db, async_db
+
+    def restore():
+        mongo._client, mongo._db, mongo._async_db = previous
+
+    stack.callback(restore)
+
+
+def _drop_celery_connections(app) -> None:
+    # Pools and the result backend are built lazily from conf and then cached; drop them when conf changes
+    app._pool = None
+    app.amqp._producer_pool = None
+    app._backend_cache = None
+    app._local = threading.local()
+
+
+def _set(stack: ExitStack, obj, name: str, value) -> None:
+    previous = getattr(obj, name)
+    setattr(obj, name, value)
+    stack.callback(setattr, obj, name, previous)
+
+
+def install_fakes(stack: ExitStack, config: BenchConfig, recorder: StageRecorder) -> None:
+    """
+    Fake LLM and search on every agent, and the worker settings for config: execution mode, task slots,
+    and rate limits lifted so the pools set the pace. Undone when stack closes.
+    """
+    from app.agents import content as content_module
+    from app.services import async_worker, queue
+    from app.services.cache import llm_cache, search_cache
+    from app.services.rate_limiter import llm_rate_limiter
+
+    llm_latency = Latency(config.llm_latency_ms, config.llm_jitter_ms, seed=config.seed)
+    search_latency = Latency(config.search_latency_ms, config.search_jitter_ms, seed=config.seed + 1)
+
+    _set(stack, settings, "WORKER_EXECUTION_MODE", config.worker_mode)
+    _set(stack, settings, "WORKER_ASYNC_MAX_IN_FLIGHT", config.worker_concurrency)
+    stack.callback(async_worker.stop)
+    # The fake LLM has no provider quota; the pools, not the RPM/TPM buckets, should set the pace
+    _set(stack, settings, "OPENAI_RATE_LIMITS", "")
+    _set(stack, settings, "OPENAI_RPM_LIMIT", 1_000_000)
+    _set(stack, settings, "OPENAI_TPM_LIMIT", 1_000_000_000)
+    # Every task slot may have an LLM call out, as with one task per prefork child
+    for name in ("LLM_INITIAL_CONCURRENCY", "LLM_MAX_CONCURRENCY"):
+        _set(stack, settings, name, config.worker_concurrency)
+    _set(stack, llm_rate_limiter, "_concurrency", {})
+
+    # Routing and search only take the LLM/CSE path when keys are configured
+    for name in ("OPENAI_API_KEY", "GOOGLE_API_KEY", "GOOGLE_CSE_ID"):
+        _set(stack, settings, name, "benchmark")
+    agents = ((queue.get_peer_agent(), 0.0), (queue.get_dev_agent(), 0.2), (queue.get_content_agent(), 0.2))
+    for agent, temperature in agents:
+        model = FakeChatModel(
+            temperature=temperature,
+            latency=llm_latency,
+            recorder=recorder,
+            chunk_ms=config.llm_chunk_ms,
+        )
+        _set(stack, agent, "llm", model)
+    _set(stack, queue.get_dev_agent(), "output_dir", Path(stack.enter_context(tempfile.TemporaryDirectory())))
+    _set(stack, content_module, "get_http_session", lambda: FakeSearchSession(search_latency, recorder))
+    _set(stack, content_module, "get_async_http_client", lambda: FakeAsyncSearchClient(search_latency, recorder))
+    llm_cache.clear_local()
+    search_cache.clear_local()
+
+
+def pool_concurrency(config: BenchConfig) -> int:
+    # Async pool threads only hand messages to the loop, so a couple keep it fed
+    return ASYNC_POOL_THREADS if config.worker_mode == "async" else config.worker_concurrency
+
+
+@contextmanager
+def bench_environment(config: BenchConfig, recorder: Optional[StageRecorder] = None):
+    """
+    Installs fake LLM and search everywhere, in-memory Redis/Mongo/Celery transport in "memory" mode,
+    and an in-process thread-pool worker consuming every queue. Yields the task timeline.
+    """
+    from app.services.celery_app import celery_app
+    from app.services.log_writer import log_writer
+
+    recorder = recorder or StageRecorder()
+    timeline = TaskTimeline(recorder)
+    mongo_latency = Latency(config.mongo_latency_ms, seed=config.seed + 2)
+
+    with ExitStack() as stack:
+        if config.mode == "memory":
+            _install_fake_redis(stack)
+            _install_fake_mongo(stack, mongo_latency, recorder)
+            # Runs before the fakes are removed, and keeps a real spill file out of the fake database
+            stack.callback(log_writer.flush)
+            _set(stack, log_writer, "spill_path", Path(stack.enter_context(tempfile.TemporaryDirectory())) / "spill.jsonl")
+            _set(stack, celery_app.conf, "broker_url", "memory://")
+            _set(stack, celery_app.conf, "result_backend", "cache+memory://")
+            # The memory transport polls (Redis blocks on BRPOP); poll fast so queue_wait is not the poll interval
+            _set(stack, celery_app.conf, "broker_transport_options",
+                 {**celery_app.conf.broker_transport_options, "polling_interval": 0.005})
+            _drop_celery_connections(celery_app)
+            stack.callback(_drop_celery_connections, celery_app)
+        install_fakes(stack, config, recorder)
+
+        task_prerun.connect(timeline.on_prerun, weak=False)
+        task_postrun.connect(timeline.on_postrun, weak=False)
+        stack.callback(task_prerun.disconnect, timeline.on_prerun)
+        stack.callback(task_postrun.disconnect, timeline.on_postrun)
+
+        stack.enter_context(start_worker(
+            celery_app,
+            concurrency=pool_concurrency(config),
+            pool="threads",
+            perform_ping_check=False,
+            queues=[settings.ROUTER_QUEUE, settings.DEV_QUEUE, settings.CONTENT_QUEUE],
+        ))
+        yield timeline
@@ -0,0 +1,61 @@
+"""
+Celery worker process for benchmarks.pools: installs the fake LLM, search and Mongo, then runs a
+real `celery worker` with the given pool. Redis is whatever REDIS_URL points at.
+
+    BENCH_CONFIG='{"worker_mode": "sync", "worker_concurrency": 8}' python -m benchmarks.pool_worker --pool prefork
+
+Prints READY once the worker consumes, so the driver starts the clock after startup.
+"""
+import argparse
+import json
+import os
+import tempfile
+from contextlib import ExitStack
+from pathlib import Path
+
+from celery.signals import worker_ready
+
+from app.core.config import settings
+from benchmarks.fakes import Latency, StageRecorder
+from benchmarks.harness import BenchConfig, _install_fake_mongo, _set, install_fakes, pool_concurrency
+
+READY = "READY"
+
+
+@worker_ready.connect
+def _announce(**kwargs):
+    # Celery redirects sys.stdout to its logger; the driver reads the real stdout
+    os.write(1, f"{READY}\n".encode())
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pool", choices=("prefork", "threads"), required=True)
+    parser.add_argument("--prefetch-multiplier", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    from app.services.celery_app import celery_app
+    from app.services.log_writer import log_writer
+
+    config = BenchConfig(**json.loads(os.environ.get("BENCH_CONFIG", "{}")))
+    recorder = StageRecorder()
+    with ExitStack() as stack:
+        _install_fake_mongo(stack, Latency(config.mongo_latency_ms, seed=config.seed + 2), recorder)
+        _set(stack, log_writer, "spill_path", Path(stack.enter_context(tempfile.TemporaryDirectory())) / "spill.jsonl")
+        # Built here, before a prefork pool forks, so every child inherits the fakes
+        install_fakes(stack, config, recorder)
+        celery_app.worker_main([
+            "worker",
+            f"--pool={args.pool}",
+            f"--concurrency={pool_concurrency(config)}",
+            f"--queues={settings.ROUTER_QUEUE},{settings.DEV_QUEUE},{settings.CONTENT_QUEUE}",
+            f"--prefetch-multiplier={args.prefetch_multiplier}",
+            "--loglevel=warning",
+            "--without-gossip",
+            "--without-mingle",
+            "--without-heartbeat",
+        ])
+
+
+if __name__ == "__main__":
+    main()
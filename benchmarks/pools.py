@@ -0,0 +1,371 @@
+"""
+Worker pool benchmark: the same process_task load against real Celery worker processes, one pool at a
+time, with the memory and thread count of each worker's whole process tree.
+
+    python -m benchmarks.pools --requests 400 --concurrency 80
+    python -m benchmarks.pools --pools prefork:8 threads:80 async:80 --compare benchmarks/results/<previous-pools>.json
+
+A pool is <kind>:<slots>:
+- prefork: N child processes, one blocking pipeline each (the docker-compose default).
+- threads: one process with N pool threads, one blocking pipeline each.
+- async: one process whose couple of pool threads hand tasks to its event loop, with N pipelines in flight.
+
+Redis is fakeredis's TCP server in this process (broker, result backend and the app's own keys), so every
+worker child talks to the same instance. The LLM, search and Mongo are the harness fakes, installed in the
+worker before it forks (benchmarks.pool_worker).
+"""
+import argparse
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.harness import BenchConfig, _drop_celery_connections, pool_concurrency
+from benchmarks.pool_worker import READY
+from benchmarks.run import RESULTS_DIR, _git_commit, build_tasks, percentiles
+
+POOL_KINDS = ("prefork", "threads", "async")
+
+
+def _children(pid: int) -> List[int]:
+    found = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                found += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    return found
+
+
+def _process_tree(pid: int) -> List[int]:
+    tree, todo = [], [pid]
+    while todo:
+        current = todo.pop()
+        tree.append(current)
+        todo += _children(current)
+    return tree
+
+
+def _status_field(pid: int, field: str) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def _pss_kb(pid: int) -> int:
+    # Proportional set size: pages shared copy-on-write by prefork children are split between them
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return _status_field(pid, "VmRSS")
+
+
+def tree_usage(pid: int) -> Dict[str, float]:
+    """Processes, threads, summed RSS and summed PSS (MB) of pid and its descendants (Linux /proc)."""
+    usage = {"processes": 0, "threads": 0, "rss_mb": 0.0, "pss_mb": 0.0}
+    for member in _process_tree(pid):
+        try:
+            usage["threads"] += _status_field(member, "Threads")
+            usage["rss_mb"] += _status_field(member, "VmRSS") / 1024
+            usage["pss_mb"] += _pss_kb(member) / 1024
+            usage["processes"] += 1
+        except OSError:
+            continue
+    return usage
+
+
+def _sample_tree(pid: int, peaks: Dict[str, float], stop: threading.Event, interval: float = 0.1) -> None:
+    while not stop.is_set():
+        for name, value in tree_usage(pid).items():
+            key = f"peak_{name}"
+            peaks[key] = max(peaks.get(key, 0), round(value, 1))
+        stop.wait(interval)
+
+
+def parse_pool(spec: str) -> tuple:
+    kind, _, slots = spec.partition(":")
+    if kind not in POOL_KINDS or not slots.isdigit():
+        raise argparse.ArgumentTypeError(f"expected <{'|'.join(POOL_KINDS)}>:<slots>, got {spec!r}")
+    return kind, int(slots)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_redis() -> str:
+    """fakeredis over TCP on a free local port, served from a daemon thread; returns its URL."""
+    from fakeredis import TcpFakeServer
+
+    port = _free_port()
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+
+    class _NoDelayHandler(server.RequestHandlerClass):
+        def setup(self) -> None:
+            # Replies are small writes; without this, Nagle and delayed ACKs hold each kombu round trip ~40 ms
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            super().setup()
+
+    server.RequestHandlerClass = _NoDelayHandler
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-redis", daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0"
+
+
+def prefetch_multiplier(kind: str, config: BenchConfig) -> int:
+    """
+    Prefork children wake the consumer when they finish. Pool threads do not, so a freed thread waits for the
+    consumer's next tick unless a message is already reserved for it: one spare per thread, and for async
+    pools enough to fill every slot on the loop.
+    """
+    if kind == "prefork":
+        return 1
+    if kind == "threads":
+        return 2
+    return math.ceil(config.worker_concurrency / pool_concurrency(config))
+
+
+def _start_worker(kind: str, config: BenchConfig, redis_url: str, timeout: float) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "REDIS_URL": redis_url,
+        "BENCH_CONFIG": json.dumps(asdict(config)),
+        # Every worker would bind the same exporter port
+        "METRICS_ENABLED": "false",
+    }
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.pool_worker", "--pool", "prefork" if kind == "prefork" else "threads",
+         "--prefetch-multiplier", str(prefetch_multiplier(kind, config))],
+        cwd=Path(__file__).parent.parent, env=env, stdout=subprocess.PIPE, text=True,
+    )
+    ready = threading.Event()
+
+    def watch() -> None:
+        # The startup banner comes first; keep draining afterwards so the pipe never fills
+        for line in worker.stdout:
+            if line.strip() == READY:
+                ready.set()
+
+    threading.Thread(target=watch, daemon=True).start()
+    if not ready.wait(timeout):
+        worker.kill()
+        raise RuntimeError(f"{kind} worker did not become ready within {timeout}s")
+    return worker
+
+
+def _stop_worker(worker: subprocess.Popen, timeout: float = 30.0) -> None:
+    worker.terminate()
+    try:
+        worker.wait(timeout)
+    except subprocess.TimeoutExpired:
+        worker.kill()
+        worker.wait()
+
+
+def _drive(tasks: List[str], concurrency: int, timeout: float, poll_interval: float) -> tuple:
+    """
+    Keep `concurrency` process_task messages outstanding until every task finished, checking the result
+    backend every poll_interval. Returns (samples, failures, wall_s): end-to-end latency, plus the queue wait
+    and pipeline time each worker recorded on its result.
+    """
+    from app.services.celery_app import PROCESS_TASK, celery_app
+    from app.services.result_store import unpack_result
+
+    backend = celery_app.backend
+    waiting = list(reversed(tasks))
+    outstanding: Dict[str, float] = {}
+    samples: Dict[str, List[float]] = {"latency_ms": [], "queue_wait_ms": [], "pipeline_ms": []}
+    failures: List[str] = []
+
+    def publish() -> None:
+        task_id = str(uuid.uuid4())
+        now = time.time()
+        celery_app.send_task(
+            PROCESS_TASK,
+            args=[task_id, waiting.pop()],
+            kwargs={"enqueued_at": now, "deadline_at": now + timeout},
+            task_id=task_id,
+        )
+        outstanding[task_id] = time.perf_counter()
+
+    start = time.perf_counter()
+    while waiting or outstanding:
+        while waiting and len(outstanding) < concurrency:
+            publish()
+        time.sleep(poll_interval)
+        ids = list(outstanding)
+        for task_id, raw in zip(ids, backend.client.mget([backend.get_key_for_task(i) for i in ids])):
+            if raw is None:
+                continue
+            samples["latency_ms"].append((time.perf_counter() - outstanding.pop(task_id)) * 1000)
+            result = unpack_result(backend.decode_result(raw)["result"])
+            if not isinstance(result, dict) or result.get("status") != "completed":
+                failures.append(str(result.get("error") if isinstance(result, dict) else result))
+                continue
+            samples["queue_wait_ms"].append((result.get("timings") or {}).get("queue_wait", 0.0))
+            samples["pipeline_ms"].append(result.get("duration_ms") or 0.0)
+        if time.perf_counter() - start > timeout:
+            failures += [f"task {task_id} timed out" for task_id in outstanding]
+            break
+    return samples, failures, time.perf_counter() - start
+
+
+def run_pool(kind: str, slots: int, redis_url: str, tasks: List[str], args) -> dict:
+    from app.services.celery_app import celery_app
+
+    celery_app.backend.client.flushall()
+    config = BenchConfig(
+        mode="local",
+        llm_latency_ms=args.llm_latency_ms,
+        llm_jitter_ms=args.llm_jitter_ms,
+        llm_chunk_ms=args.llm_chunk_ms,
+        search_latency_ms=args.search_latency_ms,
+        search_jitter_ms=args.search_jitter_ms,
+        mongo_latency_ms=args.mongo_latency_ms,
+        worker_concurrency=slots,
+        worker_mode="async" if kind == "async" else "sync",
+        seed=args.seed,
+    )
+    worker = _start_worker(kind, config, redis_url, args.startup_timeout)
+    idle = tree_usage(worker.pid)
+    peaks: Dict[str, float] = {}
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample_tree, args=(worker.pid, peaks, stop), daemon=True)
+    sampler.start()
+    try:
+        samples, failures, wall = _drive(tasks, args.concurrency, args.timeout, args.poll_interval)
+    finally:
+        stop.set()
+        sampler.join()
+        _stop_worker(worker)
+    completed = len(samples["pipeline_ms"])
+    return {
+        "kind": kind,
+        "slots": slots,
+        "prefetch_multiplier": prefetch_multiplier(kind, config),
+        "completed": completed,
+        "errors": len(failures),
+        "error_samples": failures[:5],
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(completed / wall, 2) if wall else 0.0,
+        **{metric: percentiles(values) for metric, values in samples.items()},
+        "idle": {name: round(value, 1) for name, value in idle.items()},
+        "resources": peaks,
+    }
+
+
+def run_benchmark(args) -> dict:
+    from app.services.celery_app import celery_app
+
+    redis_url = start_redis()
+    celery_app.conf.broker_url = celery_app.conf.result_backend = redis_url
+    _drop_celery_connections(celery_app)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "cpus": os.cpu_count(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "pools": {},
+    }
+    for kind, slots in args.pools:
+        tasks = build_tasks(args.requests, 0.0, args.seed)
+        # Distinct texts per pool so no run warms another's cache
+        tasks = [f"{task} [{kind}:{slots}]" for task in tasks]
+        report["pools"][f"{kind}:{slots}"] = run_pool(kind, slots, redis_url, tasks, args)
+    return report
+
+
+def compare(report: dict, baseline: dict) -> List[str]:
+    lines = []
+    for name, current in report["pools"].items():
+        previous = baseline.get("pools", {}).get(name)
+        if not previous:
+            continue
+        pairs = [("throughput_rps", current["throughput_rps"], previous["throughput_rps"])]
+        pairs += [(f"latency {p}", current["latency_ms"].get(p), previous["latency_ms"].get(p)) for p in ("p50", "p95")]
+        pairs += [
+            (metric, current["resources"].get(metric), previous["resources"].get(metric))
+            for metric in ("peak_threads", "peak_rss_mb", "peak_pss_mb")
+        ]
+        for metric, now, before in pairs:
+            if now is None or not before:
+                continue
+            lines.append(f"{name:12} {metric:15} {before:>10} -> {now:>10} ({(now - before) / before:+.1%})")
+    return lines
+
+
+def _print_summary(report: dict) -> None:
+    for name, pool in report["pools"].items():
+        latency, peaks = pool["latency_ms"], pool["resources"]
+        print(
+            f"{name:12} {pool['completed']} ok / {pool['errors']} errors, {pool['throughput_rps']} req/s, "
+            f"p50 {latency.get('p50')} ms, p95 {latency.get('p95')} ms, "
+            f"peak {peaks.get('peak_processes')} processes / {peaks.get('peak_threads')} threads / "
+            f"{peaks.get('peak_rss_mb')} MB RSS / {peaks.get('peak_pss_mb')} MB PSS"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pools", nargs="+", type=parse_pool, default=[("prefork", 8), ("threads", 80), ("async", 80)],
+                        help="<prefork|threads|async>:<slots>, run one after another")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=80, help="process_task messages kept outstanding")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--llm-chunk-ms", type=float, default=5.0)
+    parser.add_argument("--search-latency-ms", type=float, default=150.0)
+    parser.add_argument("--search-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--mongo-latency-ms", type=float, default=2.0)
+    parser.add_argument("--poll-interval", type=float, default=0.02, help="Seconds between result backend checks")
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Report path (default: benchmarks/results/pools-<time>-<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="Previous pools report to diff against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    report = run_benchmark(args)
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = RESULTS_DIR / f"pools-{stamp}-{report['meta']['commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    _print_summary(report)
+    if args.compare:
+        for line in compare(report, json.loads(args.compare.read_text())):
+            print(line)
+    print(f"Report written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Load-test the API -> Celery -> agents -> Mongo path with fake LLM and search backends.
+
+    python -m benchmarks.run --requests 200 --concurrency 20
+    python -m benchmarks.run --mode local --scenarios execute --compare benchmarks/results/<previous>.json
+    python -m benchmarks.run --scenarios execute --worker-mode async --workers 80 --compare <sync report>.json
+
+Drives the FastAPI app in-process through httpx's ASGI transport and writes a JSON report
+(latency percentiles, throughput, per-stage timings, peak threads and RSS) to benchmarks/results/.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import threading
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.fakes import StageRecorder
+from benchmarks.harness import BenchConfig, TaskTimeline, bench_environment
+
+RESULTS_DIR = Path(__file__).parent / "results"
+SCENARIOS = ("execute", "sync")
+
+# Mix of clearly-dev, clearly-content and ambiguous tasks (the last escalate to the LLM router)
+WORKLOAD = [
+    "Write a Python function that parses ISO dates",
+    "Create a bash script that rotates log files",
+    "Fix the bug in this JavaScript debounce helper",
+    "What is the latest news about the Champions League final?",
+    "When is the next Galatasaray match in Istanbul?",
+    "Summarize the history of the Ottoman Empire",
+    "Explain how a hash map works",
+    "Help me plan a talk about caching",
+]
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+        return round(ordered[index], 2)
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.fmean(ordered), 2),
+        "p50": pct(50),
+        "p95": pct(95),
+        "p99": pct(99),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def build_tasks(count: int, duplicate_ratio: float, seed: int) -> List[str]:
+    """Unique task texts (so caches start cold), with a share repeating earlier ones."""
+    rng = random.Random(seed)
+    tasks: List[str] = []
+    for i in range(count):
+        if tasks and rng.random() < duplicate_ratio:
+            tasks.append(rng.choice(tasks))
+        else:
+            tasks.append(f"{WORKLOAD[i % len(WORKLOAD)]} (request {i})")
+    return tasks
+
+
+def _rss_mb() -> float:
+    """Current resident set size of this process (Linux), else the peak so far."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def _sample_resources(peaks: Dict[str, float], interval: float = 0.1) -> None:
+    # API, workers and fakes share this process, so these are totals for the whole pipeline
+    while True:
+        peaks["peak_threads"] = max(peaks.get("peak_threads", 0), threading.active_count())
+        peaks["peak_rss_mb"] = max(peaks.get("peak_rss_mb", 0.0), round(_rss_mb(), 1))
+        await asyncio.sleep(interval)
+
+
+async def _drive(tasks: List[str], concurrency: int, call) -> tuple:
+    """Run call(task) for every task with at most `concurrency` in flight; returns (samples, errors, wall_s)."""
+    samples: Dict[str, List[float]] = {}
+    errors: List[str] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for task in tasks:
+        queue.put_nowait(task)
+
+    async def worker():
+        while True:
+            try:
+                task = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                for name, value in (await call(task)).items():
+                    samples.setdefault(name, []).append(value)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, errors, time.perf_counter() - start
+
+
+async def run_execute(client: httpx.AsyncClient, timeline: TaskTimeline, tasks: List[str], args) -> tuple:
+    async def call(task: str) -> Dict[str, float]:
+        start = time.perf_counter()
+        response = await client.post("/v1/agent/execute", json={"task": task})
+        response.raise_for_status()
+        enqueued = time.perf_counter()
+        task_id = response.json()["task_id"]
+        timeline.submit(task_id)
+        deadline = start + args.timeout
+        while True:
+            status = await client.get(f"/v1/agent/status/{task_id}", params={"wait": args.status_wait})
+            status.raise_for_status()
+            payload = status.json()
+            if payload["status"] == "SUCCESS":
+                break
+            if payload["status"] == "FAILURE":
+                raise RuntimeError(payload.get("error"))
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"task {task_id} still {payload['status']}")
+            if not args.status_wait:
+                await asyncio.sleep(args.poll_interval)
+        done = time.perf_counter()
+        return {"latency_ms": (done - start) * 1000, "enqueue_ms": (enqueued - start) * 1000}
+
+    return await _drive(tasks, args.concurrency, call)
+
+
+async def run_sync(client: httpx.AsyncClient, timeline: TaskTimeline, tasks: List[str], args) -> tuple:
+    async def call(task: str) -> Dict[str, float]:
+        start = time.perf_counter()
+        response = await client.post("/v1/agent/execute/sync", json={"task": task})
+        response.raise_for_status()
+        if response.json().get("status") != "completed":
+            raise RuntimeError(response.json().get("error"))
+        return {"latency_ms": (time.perf_counter() - start) * 1000}
+
+    return await _drive(tasks, args.concurrency, call)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run_benchmark(args) -> dict:
+    from app.main import app
+
+    config = BenchConfig(
+        mode=args.mode,
+        llm_latency_ms=args.llm_latency_ms,
+        llm_jitter_ms=args.llm_jitter_ms,
+        llm_chunk_ms=args.llm_chunk_ms,
+        search_latency_ms=args.search_latency_ms,
+        search_jitter_ms=args.search_jitter_ms,
+        mongo_latency_ms=args.mongo_latency_ms,
+        worker_concurrency=args.workers,
+        worker_mode=args.worker_mode,
+        seed=args.seed,
+    )
+    runners = {"execute": run_execute, "sync": run_sync}
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "duplicate_ratio": args.duplicate_ratio,
+            "status_wait": args.status_wait,
+            "config": asdict(config),
+        },
+        "scenarios": {},
+    }
+
+    recorder = StageRecorder()
+    with bench_environment(config, recorder) as timeline:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=args.timeout) as client:
+            for name in args.scenarios:
+                recorder.reset()
+                # Same seed per scenario, but distinct task texts so one scenario never warms another's cache
+                tasks = [f"{task} [{name}]" for task in build_tasks(args.requests, args.duplicate_ratio, args.seed)]
+                resources: Dict[str, float] = {}
+                sampler = asyncio.create_task(_sample_resources(resources))
+                try:
+                    samples, errors, wall = await runners[name](client, timeline, tasks, args)
+                finally:
+                    sampler.cancel()
+                completed = len(samples.get("latency_ms", []))
+                report["scenarios"][name] = {
+                    "completed": completed,
+                    "errors": len(errors),
+                    "error_samples": errors[:5],
+                    "wall_seconds": round(wall, 3),
+                    "throughput_rps": round(completed / wall, 2) if wall else 0.0,
+                    "resources": resources,
+                    **{metric: percentiles(values) for metric, values in samples.items()},
+                    "stages": {stage: percentiles(values) for stage, values in sorted(recorder.snapshot().items())},
+                }
+    return report
+
+
+def compare(report: dict, baseline: dict) -> List[str]:
+    """One line per scenario metric: current vs baseline and the relative change."""
+    lines = []
+    for name, current in report["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        pairs = [("throughput_rps", current["throughput_rps"], previous["throughput_rps"])]
+        pairs += [
+            (f"latency {p}", current["latency_ms"].get(p), previous.get("latency_ms", {}).get(p))
+            for p in ("p50", "p95", "p99")
+        ]
+        pairs += [
+            (metric, current.get("resources", {}).get(metric), previous.get("resources", {}).get(metric))
+            for metric in ("peak_threads", "peak_rss_mb")
+        ]
+        for metric, now, before in pairs:
+            if now is None or not before:
+                continue
+            lines.append(f"{name:8} {metric:15} {before:>10} -> {now:>10} ({(now - before) / before:+.1%})")
+    return lines
+
+
+def _print_summary(report: dict) -> None:
+    for name, scenario in report["scenarios"].items():
+        latency = scenario.get("latency_ms", {})
+        print(
+            f"{name:8} {scenario['completed']} ok / {scenario['errors']} errors, "
+            f"{scenario['throughput_rps']} req/s, "
+            f"p50 {latency.get('p50')} ms, p95 {latency.get('p95')} ms, p99 {latency.get('p99')} ms, "
+            f"peak {scenario['resources'].get('peak_threads')} threads / {scenario['resources'].get('peak_rss_mb')} MB RSS"
+        )
+        for stage, stats in scenario["stages"].items():
+            print(f"    {stage:24} n={stats['count']:<6} p50 {stats['p50']:>9} ms  p95 {stats['p95']:>9} ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("memory", "local"), default="memory",
+                        help="memory: in-process Redis/Mongo/broker stand-ins; local: REDIS_URL and MONGODB_URL")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Task slots: in-process worker threads (sync) or pipelines in flight (async)")
+    parser.add_argument("--worker-mode", choices=("sync", "async"), default="sync",
+                        help="sync: one blocking pipeline per worker thread (prefork-like); "
+                             "async: pipelines share one event loop, --workers in flight")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="Share of requests repeating an earlier task")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--llm-chunk-ms", type=float, default=5.0, help="Delay between streamed chunks")
+    parser.add_argument("--search-latency-ms", type=float, default=150.0)
+    parser.add_argument("--search-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--mongo-latency-ms", type=float, default=2.0)
+    parser.add_argument("--status-wait", type=float, default=5.0, help="Long-poll seconds per status call; 0 polls")
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Report path (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="Previous report to diff against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run_benchmark(args))
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = RESULTS_DIR / f"{stamp}-{report['meta']['commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    _print_summary(report)
+    if args.compare:
+        for line in compare(report, json.loads(args.compare.read_text())):
+            print(line)
+    print(f"Report written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
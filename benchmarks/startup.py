@@ -0,0 +1,115 @@
+"""
+Cold-start benchmark: import time, time to first response and memory of a fresh API process,
+compared with a worker process that loads the agents.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --compare benchmarks/results/<previous-startup>.json
+
+Every sample runs in a new interpreter, so nothing is warm from a previous measurement.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.run import RESULTS_DIR, _git_commit
+
+# Each probe prints one JSON object: seconds for its phases, peak RSS and whether LangChain got loaded
+_PROBE_PREFIX = """
+import json, resource, sys, time
+start = time.perf_counter()
+"""
+_PROBE_SUFFIX = """
+print(json.dumps({
+    **phases,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+    "langchain_loaded": "langchain_core" in sys.modules,
+}))
+"""
+PROBES = {
+    "api": """
+import app.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    client.get("/health/live").raise_for_status()
+    first_response = time.perf_counter()
+phases = {"import_s": imported - start, "first_response_s": first_response - start}
+""",
+    "worker": """
+from app.services import queue
+imported = time.perf_counter()
+queue.get_peer_agent(), queue.get_dev_agent(), queue.get_content_agent()
+ready = time.perf_counter()
+phases = {"import_s": imported - start, "agents_ready_s": ready - start}
+""",
+}
+
+
+def sample(probe: str) -> dict:
+    code = _PROBE_PREFIX + PROBES[probe] + _PROBE_SUFFIX
+    completed = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=Path(__file__).parent.parent
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples: List[dict]) -> Dict[str, dict]:
+    summary = {}
+    for metric in samples[0]:
+        values = [s[metric] for s in samples]
+        if isinstance(values[0], bool):
+            summary[metric] = any(values)
+        else:
+            summary[metric] = {"median": round(statistics.median(values), 4), "max": round(max(values), 4)}
+    return summary
+
+
+def compare(report: dict, baseline: dict) -> List[str]:
+    lines = []
+    for probe, metrics in report["probes"].items():
+        for metric, stats in metrics.items():
+            before = baseline.get("probes", {}).get(probe, {}).get(metric)
+            if not isinstance(stats, dict) or not isinstance(before, dict) or not before["median"]:
+                continue
+            now, was = stats["median"], before["median"]
+            lines.append(f"{probe:7} {metric:17} {was:>10} -> {now:>10} ({(now - was) / was:+.1%})")
+    return lines
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--probes", nargs="+", choices=tuple(PROBES), default=list(PROBES))
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path)
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {"commit": _git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(), "runs": args.runs},
+        "probes": {probe: summarize([sample(probe) for _ in range(args.runs)]) for probe in args.probes},
+    }
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = RESULTS_DIR / f"startup-{stamp}-{report['meta']['commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    for probe, metrics in report["probes"].items():
+        print(probe, json.dumps(metrics))
+    if args.compare:
+        for line in compare(report, json.loads(args.compare.read_text())):
+            print(line)
+    print(f"Report written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import os
 import sys
+from unittest.mock import MagicMock
 
 sys.path.append(os.getcwd())
 
 from app.agents.constants import AgentType
 from app.agents.peer import PeerAgent
+from app.core.metrics import ROUTE_DECISIONS
 
 
 def test_peer_agent_routes_to_dev():
@@ -26,3 +28,37 @@ def test_peer_agent_fallback_has_reasoning():
     agent.llm = None
     decision = agent.route("Write javascript code")
     assert decision.reasoning is not None
+
+
+def test_local_router_is_confident_on_obvious_tasks():
+    agent = PeerAgent()
+    decision = agent.local_router.classify("Python ile bir dosyayı okuyup yazan kod yaz")
+    assert decision.agent_type == AgentType.DEV
+    assert decision.confidence >= 0.75
+
+
+def test_local_router_defers_on_mixed_signals():
+    agent = PeerAgent()
+    decision = agent.local_router.classify("Explain how python decorators work")
+    assert decision.confidence < 0.75
+
+
+def test_confident_tasks_skip_llm():
+    agent = PeerAgent()
+    agent.llm = MagicMock()
+    local = ROUTE_DECISIONS.labels("local")._value.get()
+    decision = agent.route("Write a python script")
+    assert decision.agent_type == AgentType.DEV
+    agent.llm.assert_not_called()
+    assert agent.local_route_ratio == 1.0
+    assert ROUTE_DECISIONS.labels("local")._value.get() == local + 1
+
+
+def test_short_keywords_match_whole_words_only():
+    router = PeerAgent().local_router
+    assert router.classify("Bugün hava nasıl?").agent_type == AgentType.CONTENT
+    assert "bug" not in router.classify("Bugün hava nasıl?").reasoning
+    assert "what" not in router.classify("Do whatever you like").reasoning
+    assert "script" not in router.classify("Quote a scripture verse").reasoning
+    assert "bug" in router.classify("Fix the bugs in this loop").reasoning
+    assert "dosya" in router.classify("Bu dosyayı oku").reasoning
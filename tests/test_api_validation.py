@@ -1,4 +1,5 @@
 import os
+import subprocess
 import sys
 from unittest.mock import MagicMock, patch
 
@@ -7,27 +8,32 @@ from fastapi.testclient import TestClient
 
 sys.path.append(os.getcwd())
 
+from app.core.config import settings
+from app.core.metrics import ROUTE_DECISIONS
 from app.main import app
+from app.services.celery_app import PROCESS_TASK, ROUTE_TASK, celery_app
 
 
 @pytest.fixture(autouse=True)
-def mock_celery_delay():
-    with patch("app.api.routes.process_task") as mock_task:
+def mock_send_task():
+    with patch.object(celery_app, "send_task") as send_task:
         mock_async_result = MagicMock()
         mock_async_result.id = "test-task-id"
-        mock_task.apply_async.return_value = mock_async_result
-        yield mock_task
+        send_task.return_value = mock_async_result
+        yield send_task
 
 
 client = TestClient(app)
 
 
 def test_api_execute_queued():
+    local = ROUTE_DECISIONS.labels("local")._value.get()
     response = client.post("/v1/agent/execute", json={"task": "Write a python hello world"})
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "queued"
     assert "task_id" in data
+    assert ROUTE_DECISIONS.labels("local")._value.get() == local + 1
 
 
 def test_rejects_empty_task():
@@ -62,3 +68,61 @@ def test_rejects_invalid_json():
 def test_handles_unicode_task():
     response = client.post("/v1/agent/execute", json={"task": "Python ile Turkce dosya yaz"})
     assert response.status_code == 200
+
+
+def test_batch_execute_returns_all_task_ids(mock_send_task):
+    tasks = [{"task": f"Write python script {i}"} for i in range(3)]
+    response = client.post("/v1/agent/execute/batch", json={"tasks": tasks})
+    assert response.status_code == 200
+    data = response.json()["tasks"]
+    assert len(data) == 3
+    assert len({item["task_id"] for item in data}) == 3
+    assert mock_send_task.call_count == 3
+
+
+def test_batch_execute_rejects_empty_list():
+    response = client.post("/v1/agent/execute/batch", json={"tasks": []})
+    assert response.status_code == 422
+
+
+def test_batch_status_uses_single_mget():
+    backend = celery_app.backend
+    done = backend.encode({"status": "SUCCESS", "result": {"status": "completed"}, "task_id": "a"})
+    with patch.object(type(backend), "mget", return_value=[done, None]) as mget:
+        response = client.post("/v1/agent/status/batch", json={"task_ids": ["a", "b"]})
+    assert response.status_code == 200
+    data = response.json()["tasks"]
+    assert mget.call_count == 1
+    assert data[0]["status"] == "SUCCESS"
+    assert data[0]["result"] == {"status": "completed"}
+    assert data[1]["status"] == "PENDING"
+
+
+def test_confident_task_goes_straight_to_agent_queue(mock_send_task):
+    client.post("/v1/agent/execute", json={"task": "Write a python hello world", "priority": "bulk"})
+    assert mock_send_task.call_args.args[0] == PROCESS_TASK
+    kwargs = mock_send_task.call_args.kwargs
+    assert kwargs["queue"] == "dev-queue"
+    assert kwargs["priority"] == 9
+    assert kwargs["kwargs"]["agent"] == "dev_agent"
+
+
+def test_unsure_task_goes_to_router_queue(mock_send_task):
+    with patch.object(settings, "OPENAI_API_KEY", "sk-test"):
+        client.post("/v1/agent/execute", json={"task": "Explain how python decorators work"})
+    assert mock_send_task.call_args.args[0] == ROUTE_TASK
+    kwargs = mock_send_task.call_args.kwargs
+    assert kwargs["queue"] == "router-queue"
+    assert kwargs["priority"] == 0
+
+
+def test_rejects_unknown_priority():
+    response = client.post("/v1/agent/execute", json={"task": "hi", "priority": "urgent"})
+    assert response.status_code == 422
+
+
+def test_api_import_does_not_load_agents():
+    # The API only enqueues by task name; LangChain and the agents stay out of its process
+    code = "import sys, app.main; print('langchain_core' in sys.modules, 'app.services.queue' in sys.modules)"
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=os.getcwd())
+    assert completed.stdout.split() == ["False", "False"]
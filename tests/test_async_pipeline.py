@@ -0,0 +1,28 @@
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+sys.path.append(os.getcwd())
+
+from app.agents.constants import AgentType
+from app.services import queue
+
+
+def test_aprocess_task_routes_executes_and_persists():
+    with patch.object(queue, "_log_to_mongo") as log_mock:
+        result = asyncio.run(queue.aprocess_task("t-1", "What is the capital of France?"))
+    assert result["status"] == "completed"
+    assert result["agent"] == AgentType.CONTENT.value
+    log_mock.assert_called_once()
+
+
+def test_concurrent_async_pipelines_keep_their_task_ids():
+    async def run_many():
+        return await asyncio.gather(
+            *(queue.aprocess_task(f"t-{i}", "What is the capital of France?") for i in range(5))
+        )
+
+    with patch.object(queue, "_log_to_mongo"):
+        results = asyncio.run(run_many())
+    assert [r["task_id"] for r in results] == [f"t-{i}" for i in range(5)]
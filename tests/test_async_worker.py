@@ -0,0 +1,154 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+sys.path.append(os.getcwd())
+
+from app.agents.constants import AgentType
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, task_deadline
+from app.core.metrics import current_task_metrics, timed_stage, track_task
+from app.services import async_worker, queue
+
+
+@pytest.fixture
+def worker_loop():
+    async_worker.stop()
+    with patch.object(settings, "WORKER_EXECUTION_MODE", "async"), \
+            patch.object(settings, "WORKER_ASYNC_MAX_IN_FLIGHT", 2):
+        yield
+        async_worker.stop()
+
+
+def test_coroutines_run_on_one_loop_with_the_callers_context(worker_loop):
+    async def stage():
+        with timed_stage("generate"):
+            await asyncio.sleep(0)
+        return threading.current_thread().name, asyncio.get_running_loop()
+
+    with track_task() as task_metrics:
+        thread_name, loop = async_worker.submit(stage()).result(1)
+        assert async_worker.submit(asyncio.sleep(0, current_task_metrics())).result(1) is task_metrics
+    assert thread_name == "async-worker-loop"
+    assert loop is async_worker.get_loop()
+    assert "generate" in task_metrics.timings
+
+
+def test_errors_reach_the_returned_future(worker_loop):
+    async def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        async_worker.submit(fail()).result(1)
+
+
+def test_in_flight_limit_caps_concurrent_pipelines(worker_loop):
+    running = 0
+    peak = 0
+
+    async def pipeline():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+
+    # One submitting thread: it blocks while every slot is taken instead of queueing onto the loop
+    futures = [async_worker.submit(pipeline()) for _ in range(6)]
+    for future in futures:
+        future.result(1)
+    assert peak == settings.WORKER_ASYNC_MAX_IN_FLIGHT
+
+
+def test_stop_waits_for_pipelines_in_flight(worker_loop):
+    finished = []
+
+    async def pipeline(i):
+        await asyncio.sleep(0.05)
+        finished.append(i)
+
+    for i in range(2):
+        async_worker.submit(pipeline(i))
+    async_worker.stop()
+    assert sorted(finished) == [0, 1]
+
+
+def _store_capture():
+    stored = {}
+    return stored, patch.object(queue, "_store_result", lambda task_id, result: stored.__setitem__(task_id, result))
+
+
+def test_process_task_hands_the_async_pipeline_off(worker_loop):
+    stored, store = _store_capture()
+    with patch.object(queue, "_log_to_mongo") as log_mock, store, \
+            patch.object(queue, "_run_task", side_effect=AssertionError("sync pipeline used")):
+        returned = [
+            queue.process_task.apply(args=[f"t-{i}", "What is the capital of France?"]).get()
+            for i in range(3)
+        ]
+        async_worker.stop()
+    # The pool thread returned before the pipeline finished; the pipeline stored the result itself
+    assert returned == [None] * 3
+    assert sorted(stored) == ["t-0", "t-1", "t-2"]
+    assert all(r["status"] == "completed" and r["agent"] == AgentType.CONTENT.value for r in stored.values())
+    assert log_mock.call_count == 3
+
+
+def test_pool_thread_does_not_wait_for_the_pipeline(worker_loop):
+    release = threading.Event()
+    stored, store = _store_capture()
+
+    async def pipeline(*args):
+        await asyncio.to_thread(release.wait, 1)
+        return {"task_id": "t-slow", "status": "completed"}
+
+    with patch.object(queue, "_apipeline", pipeline), store:
+        assert queue.process_task.run("t-slow", "What is the capital of France?") is None
+        assert stored == {}
+        release.set()
+        async_worker.stop()
+    assert stored["t-slow"]["status"] == "completed"
+
+
+def test_within_deadline_cancels_at_the_task_deadline(worker_loop):
+    cancelled = threading.Event()
+
+    async def hang():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with patch.object(async_worker, "_DEADLINE_GRACE_SECONDS", 0.05), task_deadline(time.time() + 0.05):
+        with pytest.raises(DeadlineExceeded):
+            async_worker.submit(async_worker.within_deadline(hang())).result(1)
+    assert cancelled.wait(1)
+
+
+def test_hung_pipeline_fails_the_task_at_its_deadline(worker_loop):
+    async def hang(*args):
+        await asyncio.sleep(60)
+
+    stored, store = _store_capture()
+    with patch.object(queue, "_log_to_mongo"), patch.object(queue, "_apipeline", hang), store, \
+            patch.object(async_worker, "_DEADLINE_GRACE_SECONDS", 0.05):
+        queue.process_task.run("t-hung", "What is the capital of France?", deadline_at=time.time() + 0.05)
+        async_worker.stop()
+    assert stored["t-hung"]["status"] == "failed"
+    assert "deadline" in stored["t-hung"]["error"]
+
+
+def test_route_task_dispatches_from_the_loop(worker_loop):
+    with patch.object(queue.process_task, "apply_async") as publish:
+        queue.route_task.run("t-route", "Write a Python function that parses ISO dates")
+        async_worker.stop()
+    kwargs = publish.call_args.kwargs
+    assert kwargs["task_id"] == "t-route"
+    assert kwargs["kwargs"]["agent"] == AgentType.DEV.value
+    assert "route" in kwargs["kwargs"]["timings"]
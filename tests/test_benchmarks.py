@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.append(os.getcwd())
+
+from app.agents.routing import RouteDecision
+from benchmarks.fakes import fake_reply
+from benchmarks.harness import ASYNC_POOL_THREADS, BenchConfig
+from benchmarks.pools import parse_pool, prefetch_multiplier, tree_usage
+from benchmarks.run import build_tasks, percentiles
+
+
+def test_percentiles():
+    stats = percentiles([float(i) for i in range(1, 101)])
+    assert (stats["p50"], stats["p95"], stats["p99"], stats["max"]) == (50.0, 95.0, 99.0, 100.0)
+    assert percentiles([]) == {"count": 0}
+
+
+def test_fake_router_reply_parses_as_route_decision():
+    stage, text = fake_reply("You are a Peer Agent responsible for routing...\nTask: Write a Python script\n")
+    assert stage == "llm.route"
+    assert RouteDecision(**json.loads(text)).agent_type.value == "dev_agent"
+
+
+def test_build_tasks_is_deterministic_and_duplicates_on_request():
+    assert build_tasks(20, 0.5, seed=1) == build_tasks(20, 0.5, seed=1)
+    assert len(set(build_tasks(20, 0.0, seed=1))) == 20
+    assert len(set(build_tasks(20, 0.5, seed=1))) < 20
+
+
+def test_memory_benchmark_end_to_end(tmp_path):
+    from benchmarks.run import main
+
+    output = tmp_path / "report.json"
+    report = main([
+        "--requests", "4", "--concurrency", "2", "--workers", "2",
+        "--llm-latency-ms", "0", "--llm-jitter-ms", "0", "--llm-chunk-ms", "0",
+        "--search-latency-ms", "0", "--search-jitter-ms", "0", "--mongo-latency-ms", "0",
+        "--output", str(output),
+    ])
+    assert json.loads(output.read_text()) == report
+    for name in ("execute", "sync"):
+        assert report["scenarios"][name]["completed"] == 4
+        assert report["scenarios"][name]["errors"] == 0
+    assert "queue_wait" in report["scenarios"]["execute"]["stages"]
+
+
+def test_memory_benchmark_async_worker_mode(tmp_path):
+    from benchmarks.run import main
+
+    report = main([
+        "--scenarios", "execute", "--worker-mode", "async",
+        "--requests", "6", "--concurrency", "6", "--workers", "6",
+        "--llm-latency-ms", "0", "--llm-jitter-ms", "0", "--llm-chunk-ms", "0",
+        "--search-latency-ms", "0", "--search-jitter-ms", "0", "--mongo-latency-ms", "0",
+        "--output", str(tmp_path / "report.json"),
+    ])
+    assert report["meta"]["config"]["worker_mode"] == "async"
+    assert report["scenarios"]["execute"]["completed"] == 6
+    assert report["scenarios"]["execute"]["errors"] == 0
+
+
+def test_pool_specs_and_prefetch():
+    assert parse_pool("async:80") == ("async", 80)
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_pool("gevent:80")
+    assert prefetch_multiplier("prefork", BenchConfig(worker_concurrency=8)) == 1
+    assert prefetch_multiplier("threads", BenchConfig(worker_concurrency=80)) == 2
+    # An async worker reserves enough messages to fill every slot on its loop
+    config = BenchConfig(worker_concurrency=80, worker_mode="async")
+    assert prefetch_multiplier("async", config) * ASYNC_POOL_THREADS >= 80
+
+
+def test_tree_usage_counts_child_processes():
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)"])
+    try:
+        usage = tree_usage(os.getpid())
+        assert usage["processes"] >= 2
+        assert usage["threads"] >= 2
+        assert usage["pss_mb"] > 0
+    finally:
+        child.kill()
+        child.wait()
@@ -0,0 +1,131 @@
+import os
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+
+sys.path.append(os.getcwd())
+
+from app.agents.peer import PeerAgent
+from app.agents.routing import RouteDecision
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, check_deadline, remaining, stage_timeout, task_deadline
+from app.services import circuit_breaker, redis_client
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+@pytest.fixture(autouse=True)
+def redis_reachable():
+    # Other tests run without a Redis server and leave this process's outage flag set
+    with patch.object(redis_client, "_unavailable_until", 0.0):
+        yield
+
+
+@pytest.fixture
+def fake_redis():
+    client = fakeredis.FakeRedis()
+    with patch.object(circuit_breaker, "get_redis", return_value=client), \
+            patch.object(settings, "CIRCUIT_FAILURE_THRESHOLD", 2):
+        yield client
+
+
+def _fail(breaker, error=ServerError):
+    with pytest.raises(error):
+        breaker.call(MagicMock(side_effect=error()))
+
+
+def test_breaker_opens_for_every_process_after_consecutive_failures(fake_redis):
+    breaker = CircuitBreaker("dep")
+    _fail(breaker)
+    assert breaker.call(lambda: "ok") == "ok"  # a success resets the streak
+    _fail(breaker)
+    _fail(breaker)
+
+    fn = MagicMock()
+    other_process = CircuitBreaker("dep")
+    with pytest.raises(CircuitOpenError):
+        other_process.call(fn)
+    fn.assert_not_called()
+
+
+def test_client_errors_do_not_trip_the_breaker(fake_redis):
+    breaker = CircuitBreaker("dep")
+    for _ in range(3):
+        _fail(breaker, BadRequest)
+    assert breaker.allow()
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success(fake_redis):
+    breaker = CircuitBreaker("dep")
+    _fail(breaker)
+    _fail(breaker)
+    assert not breaker.allow()
+    fake_redis.delete("circuit:{dep}:open")  # the open period ran out
+    breaker._open_until = 0.0
+
+    assert breaker.allow()  # the probe
+    assert not CircuitBreaker("dep").allow()
+    breaker.record_success()
+    assert CircuitBreaker("dep").allow()
+
+
+def test_failed_probe_reopens_at_once(fake_redis):
+    breaker = CircuitBreaker("dep")
+    _fail(breaker)
+    _fail(breaker)
+    fake_redis.delete("circuit:{dep}:open")
+    breaker._open_until = 0.0
+    _fail(breaker)
+    assert fake_redis.pttl("circuit:{dep}:open") > 0
+
+
+def test_redis_outage_fails_open():
+    breaker = CircuitBreaker("dep")
+    with patch.object(circuit_breaker, "get_redis", side_effect=ConnectionError("down")):
+        assert breaker.call(lambda: "ok") == "ok"
+        _fail(breaker)
+
+
+def test_redis_outage_is_remembered_for_a_while():
+    breaker = CircuitBreaker("dep")
+    get_redis = MagicMock(side_effect=ConnectionError("down"))
+    with patch.object(circuit_breaker, "get_redis", get_redis):
+        for _ in range(5):
+            assert breaker.call(lambda: "ok") == "ok"
+    # Only the first allow() went to Redis; the rest of the calls skipped it
+    assert get_redis.call_count == 1
+    with patch.object(redis_client, "_unavailable_until", 0.0), \
+            patch.object(circuit_breaker, "get_redis", get_redis):
+        breaker.allow()
+    assert get_redis.call_count == 2
+
+
+def test_router_falls_back_to_keywords_while_openai_is_down():
+    agent = PeerAgent()
+    agent.llm = MagicMock()
+    local = RouteDecision(agent_type="content_agent", reasoning="keywords", confidence=0.4)
+    with patch.object(agent.local_router, "classify", return_value=local), \
+            patch.object(circuit_breaker.openai_breaker, "allow", return_value=False):
+        assert agent.route("something ambiguous") is local
+    agent.llm.bind.assert_not_called()
+
+
+def test_deadline_caps_stage_timeouts_and_fails_once_spent():
+    with task_deadline(time.time() + 2):
+        assert stage_timeout(30) <= 2
+        with task_deadline(time.time() + 60):  # nested deadlines only tighten
+            assert remaining() <= 2
+    with task_deadline(time.time() - 1):
+        with pytest.raises(DeadlineExceeded):
+            check_deadline("generate")
+    assert stage_timeout(30) == 30
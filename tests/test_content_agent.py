@@ -0,0 +1,74 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+
+sys.path.append(os.getcwd())
+
+from app.agents.content import ContentAgent
+from app.core.config import settings
+from app.services.cache import search_cache, search_cache_key
+
+
+@pytest.fixture(autouse=True)
+def empty_redis_tier():
+    # A fresh Redis tier per test, so results cached by earlier runs cannot turn a miss into a hit
+    with patch("app.services.cache.get_redis", return_value=fakeredis.FakeRedis()):
+        yield
+
+
+def _cse_response(items):
+    resp = MagicMock()
+    resp.json.return_value = {"items": items}
+    return resp
+
+
+def test_search_cache_key_ignores_case_whitespace_and_order():
+    assert search_cache_key("Galatasaray match  date", 5) == search_cache_key("date galatasaray MATCH", 5)
+
+
+def test_repeated_search_served_from_cache():
+    search_cache.clear_local()
+    session = MagicMock()
+    session.get.return_value = _cse_response([{"title": "t", "snippet": "s", "link": "https://a"}])
+    with patch.object(settings, "GOOGLE_API_KEY", "k"), patch.object(settings, "GOOGLE_CSE_ID", "cx"), \
+            patch("app.agents.content.get_http_session", return_value=session):
+        agent = ContentAgent()
+        first = agent._google_search("Galatasaray match date")
+        second = agent._google_search("date galatasaray MATCH")
+    assert first == second
+    assert session.get.call_count == 1
+
+
+def test_parse_queries_strips_list_markers_and_duplicates():
+    queries = ContentAgent._parse_queries("1. galatasaray next match\n- Galatasaray next match\n* gs fixtures 2026\n", 3)
+    assert queries == ["galatasaray next match", "gs fixtures 2026"]
+
+
+def test_merge_results_dedupes_by_url_and_interleaves():
+    merged = ContentAgent._merge_results([
+        [{"link": "https://a.com/x/"}, {"link": "https://b.com"}],
+        [{"link": "https://A.com/x"}, {"link": "https://c.com"}],
+        None,
+    ])
+    assert [item["link"] for item in merged] == ["https://a.com/x/", "https://b.com", "https://c.com"]
+
+
+def test_research_searches_raw_task_and_rewritten_queries():
+    search_cache.clear_local()
+    agent = ContentAgent()
+    agent.llm = MagicMock()
+    searched = []
+
+    def fake_search(query, max_results=5):
+        searched.append(query)
+        return [{"link": f"https://{len(searched)}.com"}]
+
+    with patch.object(settings, "GOOGLE_API_KEY", "k"), patch.object(settings, "GOOGLE_CSE_ID", "cx"), \
+            patch.object(agent, "_rewrite_queries", return_value=["q1", "q2"]), \
+            patch.object(agent, "_google_search", side_effect=fake_search):
+        items = agent._research("raw task")
+    assert sorted(searched) == ["q1", "q2", "raw task"]
+    assert len(items) == 3
@@ -0,0 +1,36 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+from app.agents.content import ContentAgent
+from app.agents.context_packer import pack_context
+
+ITEMS = [
+    {"title": "Weather today", "snippet": "Sunny skies expected across the region this weekend.", "link": "https://weather.example"},
+    {"title": "Galatasaray fixtures", "snippet": "Galatasaray play Fenerbahce on 12 May at 20:00 in Istanbul.", "link": "https://gs.example/fixtures"},
+    {"title": "Galatasaray fixtures", "snippet": "Galatasaray play Fenerbahce on 12 May at 20:00 in Istanbul!", "link": "https://mirror.example/gs"},
+    {"title": "Derby preview", "snippet": "The Istanbul derby between Galatasaray and Fenerbahce kicks off in May.", "link": "https://news.example/derby"},
+]
+
+
+def test_near_duplicates_dropped_and_relevant_results_first():
+    packed = pack_context("When do Galatasaray play Fenerbahce?", ITEMS, token_budget=1000)
+    links = [item["link"] for item in packed.items]
+    assert packed.duplicates_dropped == 1
+    assert "https://mirror.example/gs" not in links
+    assert links[-1] == "https://weather.example"
+    assert packed.text.startswith("[1] ")
+
+
+def test_budget_is_respected_and_savings_reported():
+    packed = pack_context("When do Galatasaray play Fenerbahce?", ITEMS, token_budget=40)
+    assert 0 < packed.tokens <= 40
+    assert packed.over_budget_dropped > 0
+    assert packed.tokens_saved > 0
+
+
+def test_grounded_prompt_lists_each_link_once():
+    prompt = ContentAgent._grounded_prompt("When do Galatasaray play Fenerbahce?", ITEMS)
+    assert prompt.count("https://gs.example/fixtures") == 1
+    assert prompt.count("https://news.example/derby") == 1
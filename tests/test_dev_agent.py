@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.getcwd())
+
+from app.agents.dev import DevAgent
+from app.core.config import settings
+from app.services.cache import bypass_cache
+
+
+def _agent(tmp_path):
+    agent = DevAgent()
+    agent.output_dir = tmp_path
+    return agent
+
+
+def test_repeated_names_get_unique_suffixes(tmp_path):
+    agent = _agent(tmp_path)
+    with patch.object(settings, "OUTPUT_SHARDING", "none"):
+        paths = [agent.write_file("hello_world.py", f"print({i})")["file_path"] for i in range(3)]
+    assert [os.path.basename(p) for p in paths] == ["hello_world.py", "hello_world_1.py", "hello_world_2.py"]
+    assert open(paths[2], encoding="utf-8").read() == "print(2)"
+
+
+def test_counter_skips_names_created_before_it(tmp_path):
+    agent = _agent(tmp_path)
+    for name in ("a.py", "a_1.py", "a_2.py"):
+        (tmp_path / name).write_text("")
+    with patch.object(settings, "OUTPUT_SHARDING", "none"):
+        result = agent.write_file("a.py", "x")
+    assert os.path.basename(result["file_path"]) == "a_3.py"
+
+
+def test_hash_sharding_uses_prefix_subdirectory(tmp_path):
+    agent = _agent(tmp_path)
+    with patch.object(settings, "OUTPUT_SHARDING", "hash"):
+        result = agent.write_file("script.sh", "echo hi")
+    shard = os.path.relpath(os.path.dirname(result["file_path"]), tmp_path)
+    assert len(shard) == 2
+
+
+def test_rejects_path_traversal(tmp_path):
+    agent = _agent(tmp_path)
+    assert agent.write_file("../etc/passwd", "x") == {"message": "Invalid filename"}
+
+
+def _agent_with_llm(tmp_path, response):
+    agent = _agent(tmp_path)
+    agent.llm = MagicMock()
+    agent.llm.model_name = "fake-model"
+    agent.llm.temperature = 0.2
+    agent.llm.invoke.return_value = MagicMock(content=response)
+    return agent
+
+
+def test_file_task_makes_one_structured_llm_call(tmp_path):
+    response = json.dumps({"filename": "pipes.py", "language": "python", "code": "print('a|b')"})
+    agent = _agent_with_llm(tmp_path, response)
+    with patch.object(settings, "OUTPUT_SHARDING", "none"), bypass_cache():
+        result = agent.execute("Write a python script that prints a pipe")
+    assert agent.llm.invoke.call_count == 1
+    assert os.path.basename(result["file_path"]) == "pipes.py"
+    assert open(result["file_path"], encoding="utf-8").read() == "print('a|b')"
+
+
+def test_unstructured_reply_is_saved_under_heuristic_name(tmp_path):
+    agent = _agent_with_llm(tmp_path, "```python\nprint('hi')\n```")
+    with patch.object(settings, "OUTPUT_SHARDING", "none"), bypass_cache():
+        result = agent.execute("Write a python hello world")
+    assert os.path.basename(result["file_path"]) == "write-a-python-hello-world.py"
+    assert open(result["file_path"], encoding="utf-8").read() == "print('hi')"
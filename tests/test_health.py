@@ -0,0 +1,50 @@
+import asyncio
+import os
+import sys
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+sys.path.append(os.getcwd())
+
+from app.main import app
+from app.services.health import HealthProber
+
+client = TestClient(app)
+
+
+def _failing_probe():
+    raise ConnectionError("refused")
+
+
+def test_liveness_never_touches_dependencies():
+    response = client.get("/health/live")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_readiness_answers_from_probe_cache():
+    prober = HealthProber({"redis": lambda: None, "celery": _failing_probe}, interval=5, required=("redis",))
+    with patch("app.main.health_prober", prober):
+        assert client.get("/health/ready").status_code == 503
+        prober.probe_once()
+        assert client.get("/health/ready").status_code == 200
+        detail = client.get("/health").json()
+    assert detail["status"] == "degraded"
+    assert detail["components"]["celery"]["error"] == "refused"
+    assert detail["components"]["redis"]["latency_ms"] >= 0
+
+
+def test_stop_waits_for_the_cancelled_prober():
+    prober = HealthProber({"redis": lambda: None}, interval=60, required=("redis",))
+
+    async def run():
+        prober.start()
+        task = prober._task
+        await asyncio.sleep(0)
+        await prober.stop()
+        return task
+
+    task = asyncio.run(run())
+    assert task.done() and task.cancelled()
+    assert prober._task is None
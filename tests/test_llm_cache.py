@@ -0,0 +1,58 @@
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+
+sys.path.append(os.getcwd())
+
+from app.agents.base_agent import BaseAgent
+from app.services.cache import TieredCache, bypass_cache, llm_cache, llm_cache_key
+
+
+@pytest.fixture(autouse=True)
+def empty_redis_tier():
+    # A fresh Redis tier per test, so results cached by earlier runs cannot turn a miss into a hit
+    with patch("app.services.cache.get_redis", return_value=fakeredis.FakeRedis()):
+        yield
+
+
+def _agent_with_fake_llm(content="print('hello')"):
+    agent = BaseAgent("Test Agent")
+    agent.llm = MagicMock()
+    agent.llm.model_name = "fake-model"
+    agent.llm.temperature = 0.2
+    agent.llm.invoke.return_value = MagicMock(content=content)
+    return agent
+
+
+def test_repeat_prompt_served_from_cache():
+    llm_cache.clear_local()
+    agent = _agent_with_fake_llm()
+    first = agent.execute("write a   python hello world")
+    second = agent.execute("write a python hello world")
+    assert first == second == "print('hello')"
+    assert agent.llm.invoke.call_count == 1
+
+
+def test_bypass_skips_cache():
+    llm_cache.clear_local()
+    agent = _agent_with_fake_llm()
+    agent.execute("bypass me")
+    with bypass_cache():
+        agent.execute("bypass me")
+    assert agent.llm.invoke.call_count == 2
+
+
+def test_key_depends_on_model_and_temperature():
+    assert llm_cache_key("a", 0.2, "x") != llm_cache_key("b", 0.2, "x")
+    assert llm_cache_key("a", 0.2, "x") != llm_cache_key("a", 0.0, "x")
+
+
+def test_lru_evicts_oldest_entry():
+    cache = TieredCache("test-lru", max_entries=2, default_ttl=60)
+    cache._set_local("a", "1", 60)
+    cache._set_local("b", "2", 60)
+    cache._set_local("c", "3", 60)
+    assert list(cache._local) == ["b", "c"]
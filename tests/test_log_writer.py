@@ -0,0 +1,131 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.getcwd())
+
+from app.services.log_writer import BufferedLogWriter
+
+
+def test_flush_uses_single_unordered_insert_many(tmp_path):
+    writer = BufferedLogWriter(max_batch=100, flush_interval=60, spill_path=str(tmp_path / "spill.jsonl"))
+    collection = MagicMock()
+    with patch("app.services.log_writer.get_logs_collection", return_value=collection):
+        for i in range(3):
+            writer._buffer.append({"task_id": str(i)})
+        assert writer.flush() == 3
+    collection.insert_many.assert_called_once()
+    assert collection.insert_many.call_args.kwargs["ordered"] is False
+
+
+def test_failed_flush_spills_to_file(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    writer = BufferedLogWriter(max_batch=100, flush_interval=60, spill_path=str(spill))
+    collection = MagicMock()
+    collection.insert_many.side_effect = ConnectionError("mongo down")
+    with patch("app.services.log_writer.get_logs_collection", return_value=collection):
+        writer._buffer.append({"task_id": "lost?"})
+        writer.flush()
+    lines = spill.read_text().splitlines()
+    assert json.loads(lines[0])["task_id"] == "lost?"
+
+
+def test_replay_reinserts_spilled_documents(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    spill.write_text(json.dumps({"task_id": "a"}) + "\n")
+    writer = BufferedLogWriter(max_batch=100, flush_interval=60, spill_path=str(spill))
+    collection = MagicMock()
+    with patch("app.services.log_writer.get_logs_collection", return_value=collection):
+        writer.replay_spill()
+    collection.insert_many.assert_called_once_with([{"task_id": "a"}], ordered=False)
+    assert not spill.exists()
+
+
+def test_spilled_created_at_is_replayed_as_a_date(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    created_at = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    writer = BufferedLogWriter(max_batch=100, flush_interval=60, spill_path=str(spill))
+    writer._spill([{"task_id": "a", "created_at": created_at}])
+    collection = MagicMock()
+    with patch("app.services.log_writer.get_logs_collection", return_value=collection):
+        writer.replay_spill()
+    assert collection.insert_many.call_args.args[0][0]["created_at"] == created_at
+
+
+def test_replay_skips_truncated_lines(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    spill.write_text(json.dumps({"task_id": "a"}) + "\n" + '{"task_id": "b", "crea' + "\n" + json.dumps({"task_id": "c"}) + "\n")
+    writer = BufferedLogWriter(max_batch=100, flush_interval=60, spill_path=str(spill))
+    collection = MagicMock()
+    with patch("app.services.log_writer.get_logs_collection", return_value=collection):
+        writer.replay_spill()
+    collection.insert_many.assert_called_once_with([{"task_id": "a"}, {"task_id": "c"}], ordered=False)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_replay_keeps_its_claim_for_the_next_attempt(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    spill.write_text(json.dumps({"task_id": "a"}) + "\n")
+    writer = BufferedLogWriter(max_batch=100, flush_interval=60, spill_path=str(spill))
+    collection = MagicMock()
+    collection.insert_many.side_effect = ConnectionError("mongo down")
+    with patch("app.services.log_writer.get_logs_collection", return_value=collection), \
+            patch.object(writer, "_spill", return_value=False):
+        writer.replay_spill()
+    assert [p.suffix for p in tmp_path.iterdir()] == [".replay"]
+
+    collection.insert_many.side_effect = None
+    with patch("app.services.log_writer.get_logs_collection", return_value=collection):
+        writer.replay_spill()
+    assert collection.insert_many.call_args.args[0] == [{"task_id": "a"}]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_claims_are_unique_per_replay(tmp_path):
+    writer = BufferedLogWriter(max_batch=100, flush_interval=60, spill_path=str(tmp_path / "spill.jsonl"))
+    first, second = writer._new_claim(), writer._new_claim()
+    assert first != second
+    with patch("app.services.log_writer.socket.gethostname", return_value="worker-a"):
+        assert writer._new_claim().name.startswith(f"spill.jsonl.worker-a.{os.getpid()}.")
+
+
+def test_stale_claim_of_a_dead_process_is_adopted(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    orphan = tmp_path / "spill.jsonl.other-host.1.deadbeef.replay"
+    orphan.write_text(json.dumps({"task_id": "orphan"}) + "\n")
+    os.utime(orphan, (time.time() - 600, time.time() - 600))
+    writer = BufferedLogWriter(max_batch=100, flush_interval=60, spill_path=str(spill), stale_claim_seconds=300)
+    collection = MagicMock()
+    with patch("app.services.log_writer.get_logs_collection", return_value=collection):
+        writer.replay_spill()
+    collection.insert_many.assert_called_once_with([{"task_id": "orphan"}], ordered=False)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_fresh_claim_of_another_process_is_left_alone(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    held = tmp_path / "spill.jsonl.other-host.1.deadbeef.replay"
+    held.write_text(json.dumps({"task_id": "held"}) + "\n")
+    writer = BufferedLogWriter(max_batch=100, flush_interval=60, spill_path=str(spill), stale_claim_seconds=300)
+    collection = MagicMock()
+    with patch("app.services.log_writer.get_logs_collection", return_value=collection):
+        writer.replay_spill()
+    collection.insert_many.assert_not_called()
+    assert list(tmp_path.iterdir()) == [held]
+
+
+def test_flusher_retries_spills_written_while_running(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    writer = BufferedLogWriter(max_batch=100, flush_interval=0.01, spill_path=str(spill), replay_interval=0.05)
+    collection = MagicMock()
+    with patch("app.services.log_writer.get_logs_collection", return_value=collection):
+        writer.add({"task_id": "a"})
+        writer._spill([{"task_id": "spilled"}])
+        for _ in range(100):
+            if not spill.exists() and len(collection.insert_many.call_args_list) >= 2:
+                break
+            time.sleep(0.01)
+    assert [{"task_id": "spilled"}] in [c.args[0] for c in collection.insert_many.call_args_list]
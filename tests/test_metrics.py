@@ -0,0 +1,56 @@
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+sys.path.append(os.getcwd())
+
+from app.core.metrics import record_llm_usage, timed_stage, track_task
+from app.main import app
+from app.services import queue
+
+
+def test_stage_timings_and_usage_accumulate_per_task():
+    with track_task({"queue_wait": 5.0}) as task_metrics:
+        with timed_stage("search"):
+            time.sleep(0.01)
+        with timed_stage("search"):
+            pass
+        record_llm_usage("content_agent", "fake-model", {"input_tokens": 10, "output_tokens": 4})
+        record_llm_usage("content_agent", "fake-model", {"input_tokens": 6, "output_tokens": 1})
+        record_llm_usage("content_agent", "fake-model", None)
+    timings, usage = task_metrics.snapshot()
+    assert timings["queue_wait"] == 5.0
+    assert timings["search"] >= 10
+    assert usage == {"llm_calls": 2, "prompt_tokens": 16, "completion_tokens": 5, "total_tokens": 21}
+
+
+def test_task_result_carries_timings_and_queue_wait(tmp_path):
+    with patch.object(queue, "_log_to_mongo") as log_mock, patch.object(queue.get_dev_agent(), "output_dir", tmp_path):
+        result = queue.process_task.run(
+            "t-metrics", "Write a python hello world", agent="dev_agent", dedupe=False,
+            enqueued_at=time.time() - 0.25, timings={"route": 1.5},
+        )
+    assert result["timings"]["queue_wait"] >= 250
+    assert result["timings"]["route"] == 1.5
+    assert "total" in result["timings"]
+    # The logged document is the same one returned, timings included
+    assert log_mock.call_args.args[0].timings == result["timings"]
+
+
+def test_async_pipeline_records_timings():
+    with patch.object(queue, "_log_to_mongo"):
+        result = asyncio.run(queue.aprocess_task("t-async-metrics", "What is the capital of France?", dedupe=False))
+    assert "total" in result["timings"]
+
+
+def test_metrics_endpoint_exports_prometheus_text():
+    client = TestClient(app)
+    client.get("/health/live")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "text/plain" in response.headers["content-type"]
+    assert 'agent_api_request_seconds_count{method="GET",route="/health/live",status="200"}' in response.text
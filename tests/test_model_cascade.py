@@ -0,0 +1,102 @@
+import json
+import os
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+sys.path.append(os.getcwd())
+
+from app.agents.content import ContentAgent
+from app.agents.dev import DevAgent
+from app.api.models import TaskResult
+from app.core.config import settings
+from app.core.metrics import track_task
+from app.services.cache import bypass_cache
+from app.services.queue import _finish
+
+
+def _llm(model_name, response):
+    llm = MagicMock()
+    llm.model_name = model_name
+    llm.temperature = 0.2
+    llm.invoke.return_value = MagicMock(content=response, usage_metadata=None)
+    return llm
+
+
+def _artifact(code):
+    return json.dumps({"filename": "job.py", "language": "python", "code": code})
+
+
+def _dev_agent(tmp_path, *responses):
+    agent = DevAgent()
+    agent.output_dir = tmp_path
+    agent.llm, *agent.escalation_llms = [_llm(f"tier-{i}", r) for i, r in enumerate(responses)]
+    return agent
+
+
+def test_valid_code_is_served_by_the_cheapest_model(tmp_path):
+    agent = _dev_agent(tmp_path, _artifact("print('ok')"), _artifact("print('strong')"))
+    with patch.object(settings, "OUTPUT_SHARDING", "none"), bypass_cache(), track_task() as task_metrics:
+        result = agent.execute("Write a python script that prints ok")
+    assert open(result["file_path"], encoding="utf-8").read() == "print('ok')"
+    agent.escalation_llms[0].invoke.assert_not_called()
+    assert (task_metrics.model, task_metrics.cascade_tier) == ("tier-0", 0)
+
+
+def test_code_that_does_not_parse_escalates(tmp_path):
+    agent = _dev_agent(tmp_path, _artifact("def broken(:\n    pass"), _artifact("def fixed():\n    pass"))
+    with patch.object(settings, "OUTPUT_SHARDING", "none"), bypass_cache(), track_task() as task_metrics:
+        result = agent.execute("Write a python function")
+    assert open(result["file_path"], encoding="utf-8").read() == "def fixed():\n    pass"
+    assert (task_metrics.model, task_metrics.cascade_tier) == ("tier-1", 1)
+    assert task_metrics.usage["cascade_escalations"] == 1
+
+
+def test_last_tier_is_accepted_as_is(tmp_path):
+    agent = _dev_agent(tmp_path, _artifact("if:"), _artifact("while:"))
+    with patch.object(settings, "OUTPUT_SHARDING", "none"), bypass_cache(), track_task() as task_metrics:
+        result = agent.execute("Write a python script")
+        finished = _finish(TaskResult(task_id="t", status="completed"), time.perf_counter())
+    assert open(result["file_path"], encoding="utf-8").read() == "while:"
+    assert (finished.model, finished.cascade_tier) == ("tier-1", 1)
+
+
+def test_non_python_code_is_not_syntax_checked(tmp_path):
+    shell = json.dumps({"filename": "run.sh", "language": "bash", "code": "if [ -f x ]; then"})
+    agent = _dev_agent(tmp_path, shell, _artifact("print('strong')"))
+    with patch.object(settings, "OUTPUT_SHARDING", "none"), bypass_cache():
+        agent.execute("Write a bash script")
+    agent.escalation_llms[0].invoke.assert_not_called()
+
+
+def test_grounded_answers_need_a_sources_section():
+    review = ContentAgent._review_grounded
+    assert review("Answer: 42\n**Sources:**\n- https://example.com")[1] is None
+    assert review("Answer: 42\n## Sources:\n- https://example.com (docs)")[1] is None
+    assert review("Answer: 42")[1] == "missing_sources"
+    assert review("Answer: 42\nSources:\n- none")[1] == "missing_sources"
+
+
+def test_content_answer_without_sources_escalates():
+    agent = ContentAgent()
+    agent.llm = _llm("small", "Answer: 42")
+    agent.escalation_llms = [_llm("large", "Answer: 42\nSources:\n- https://example.com")]
+    items = [{"title": "t", "snippet": "42", "link": "https://example.com"}]
+    with patch.object(settings, "CONTENT_RESEARCH_MODE", True), \
+            patch.object(agent, "_research", return_value=items), \
+            patch("app.agents.content.openai_breaker.is_open", return_value=False), \
+            bypass_cache(), track_task() as task_metrics:
+        answer = agent.execute("What is the answer?")
+    assert answer.endswith("https://example.com")
+    assert task_metrics.cascade_tier == 1
+
+
+def test_artifact_json_is_not_streamed_but_the_code_is_published(tmp_path):
+    agent = _dev_agent(tmp_path, _artifact("print('ok')"))
+    with patch.object(settings, "OUTPUT_SHARDING", "none"), \
+            patch("app.agents.dev.publish_event") as publish, \
+            patch("app.agents.base_agent.streaming_enabled", return_value=True), \
+            bypass_cache():
+        agent.execute("Write a python script that prints ok")
+    agent.llm.stream.assert_not_called()
+    assert publish.call_args_list[0].args == ("token", "print('ok')")
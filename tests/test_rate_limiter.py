@@ -0,0 +1,140 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+
+sys.path.append(os.getcwd())
+
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded, task_deadline
+from app.services import rate_limiter, redis_client
+from app.services.rate_limiter import AdaptiveConcurrency, LlmRateLimiter, _keys
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+@pytest.fixture(autouse=True)
+def redis_reachable():
+    # Other tests run without a Redis server and leave this process's outage flag set
+    with patch.object(redis_client, "_unavailable_until", 0.0):
+        yield
+
+
+@pytest.fixture
+def fake_redis():
+    client = fakeredis.FakeRedis()
+    with patch.object(rate_limiter, "get_redis", return_value=client):
+        yield client
+
+
+def test_aimd_halves_on_throttle_and_grows_additively():
+    limiter = AdaptiveConcurrency("m", initial=8, minimum=1, maximum=16)
+    limiter.on_throttle()
+    assert limiter.limit == 4
+    for _ in range(4):
+        limiter.on_success(1.0)
+    assert 4.9 < limiter.limit < 5.1
+    limiter.on_success(10.0)  # far above the moving average
+    assert limiter.limit < 5
+
+
+def test_waiting_thread_gets_released_slot():
+    limiter = AdaptiveConcurrency("m", initial=1, minimum=1, maximum=1)
+    limiter.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.1)
+    limiter.release()
+    assert acquired.wait(1)
+    thread.join()
+    assert limiter.in_flight == 1
+
+
+def test_async_waiter_gets_released_slot():
+    limiter = AdaptiveConcurrency("m", initial=1, minimum=1, maximum=1)
+
+    async def run():
+        await limiter.aacquire()
+        waiter = asyncio.create_task(limiter.aacquire())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        limiter.release()
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(run())
+    assert limiter.in_flight == 1
+
+
+def test_waiting_thread_gives_up_at_the_deadline():
+    limiter = AdaptiveConcurrency("m", initial=1, minimum=1, maximum=1)
+    limiter.acquire()
+    start = time.monotonic()
+    with task_deadline(time.time() + 0.1), pytest.raises(DeadlineExceeded):
+        limiter.acquire()
+    assert time.monotonic() - start < 1
+    limiter.release()
+    assert limiter.in_flight == 0 and not limiter._waiters
+
+
+def test_async_waiter_gives_up_at_the_deadline():
+    limiter = AdaptiveConcurrency("m", initial=1, minimum=1, maximum=1)
+
+    async def run():
+        await limiter.aacquire()
+        with task_deadline(time.time() + 0.1), pytest.raises(DeadlineExceeded):
+            await limiter.aacquire()
+        assert not limiter._waiters
+        limiter.release()
+
+    asyncio.run(run())
+    assert limiter.in_flight == 0
+
+
+def test_bucket_queues_calls_over_the_rpm_limit(fake_redis):
+    script = fake_redis.register_script(rate_limiter._RESERVE_SCRIPT)
+    keys = _keys("test-model")
+    assert script(keys=keys, args=[2, 100000, 10]) == 0
+    assert script(keys=keys, args=[2, 100000, 10]) == 0
+    # Third request in the same minute must wait about half a minute for one request to refill
+    assert 25000 < script(keys=keys, args=[2, 100000, 10]) <= 30000
+
+
+def test_rate_limited_call_backs_off_cluster_wide_and_retries(fake_redis):
+    limiter = LlmRateLimiter()
+    calls = []
+
+    def flaky():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RateLimitError("slow down")
+        return "ok"
+
+    with patch.object(settings, "LLM_RATE_LIMIT_COOLDOWN_MS", 200):
+        assert limiter.call("test-model", 10, flaky) == "ok"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.15
+    assert limiter.concurrency("test-model").limit < settings.LLM_INITIAL_CONCURRENCY
+
+
+def test_redis_outage_fails_open():
+    limiter = LlmRateLimiter()
+    get_redis = MagicMock(side_effect=ConnectionError("down"))
+    with patch.object(rate_limiter, "get_redis", get_redis):
+        assert limiter.call("test-model", 10, lambda: "ok") == "ok"
+        assert limiter.call("test-model", 10, lambda: "ok", lambda result: 50) == "ok"
+    # The first reservation failed; the second call and its reconcile skipped Redis
+    assert get_redis.call_count == 1
+
+
+def test_per_model_limit_overrides():
+    with patch.object(settings, "OPENAI_RATE_LIMITS", "gpt-4o=100:30000, other=1:2"):
+        assert LlmRateLimiter.limits("gpt-4o") == (100, 30000)
+        assert LlmRateLimiter.limits("gpt-4o-mini") == (settings.OPENAI_RPM_LIMIT, settings.OPENAI_TPM_LIMIT)
@@ -0,0 +1,100 @@
+import json
+import os
+import random
+import string
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+sys.path.append(os.getcwd())
+
+from app.main import app
+from app.services import queue, result_store
+from app.services.celery_app import celery_app
+from app.services.result_store import ENCODING_FIELD, pack_result, unpack_result, unpack_results
+
+
+def _result(body, task_id="t1"):
+    return {"task_id": task_id, "status": "completed", "agent": "content_agent", "result": body}
+
+
+def _incompressible(size: int) -> str:
+    rng = random.Random(7)
+    return "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(size))
+
+
+def test_small_results_are_stored_as_is():
+    result = _result("short answer")
+    assert pack_result(result) is result
+
+
+def test_large_results_are_compressed_and_rehydrated():
+    result = _result("A long research answer. " * 500)
+    packed = pack_result(result)
+    assert packed[ENCODING_FIELD] == result_store.ZLIB
+    assert len(packed["result"]) < len(result["result"]) / 10
+    assert unpack_result(packed) == result
+
+
+def test_oversized_results_move_to_mongo():
+    collection = MagicMock()
+    result = _result(_incompressible(40000))
+    with patch.object(result_store, "get_results_collection", return_value=collection):
+        packed = pack_result(result)
+        assert packed["result"] is None and packed[ENCODING_FIELD] == result_store.MONGO
+        stored = collection.replace_one.call_args.args[1]
+        collection.find_one.return_value = {"body": stored["body"]}
+        collection.find.return_value = [{"task_id": "t1", "body": stored["body"]}]
+        assert unpack_result(packed) == result
+        assert unpack_results([packed, _result("small", "t2")]) == [result, _result("small", "t2")]
+    assert collection.find.call_count == 1
+
+
+def test_offload_failure_keeps_the_compressed_body_inline():
+    collection = MagicMock()
+    collection.replace_one.side_effect = ConnectionError("mongo down")
+    result = _result(_incompressible(40000))
+    with patch.object(result_store, "get_results_collection", return_value=collection):
+        packed = pack_result(result)
+    assert packed[ENCODING_FIELD] == result_store.ZLIB
+    assert unpack_result(packed) == result
+
+
+def test_batch_status_rehydrates_compacted_results():
+    backend = celery_app.backend
+    result = _result("Generated answer line.\n" * 300, "a")
+    stored = backend.encode({"status": "SUCCESS", "result": pack_result(result), "task_id": "a"})
+    with patch.object(type(backend), "mget", return_value=[stored]):
+        response = TestClient(app).post("/v1/agent/status/batch", json={"task_ids": ["a"]})
+    assert response.status_code == 200
+    assert response.json()["tasks"][0]["result"] == result
+
+
+def test_done_event_carries_the_packed_result():
+    result = _result("A long research answer. " * 500)
+    with patch.object(queue, "publish_event") as publish:
+        packed = queue._pack_and_publish(result)
+    assert packed[ENCODING_FIELD] == result_store.ZLIB
+    publish.assert_called_once_with(queue.DONE_EVENT, packed)
+
+
+def test_long_poll_rehydrates_the_done_event():
+    result = _result("A long research answer. " * 500, "abc")
+    pending = MagicMock(status="PENDING", result=None)
+    with patch("app.api.routes.AsyncResult", return_value=pending), \
+            patch("app.api.routes._wait_for_completion", new=AsyncMock(return_value=pack_result(result))):
+        response = TestClient(app).get("/v1/agent/status/abc?wait=5")
+    assert response.json()["status"] == "SUCCESS"
+    assert response.json()["result"] == result
+
+
+def test_stream_rehydrates_the_done_event():
+    result = _result("A long research answer. " * 500, "abc")
+
+    async def fake_events(task_id, last_event_id="0-0", block_ms=15000):
+        yield "1-0", "done", json.dumps(pack_result(result))
+
+    with patch("app.api.routes.iter_events", fake_events):
+        response = TestClient(app).get("/v1/agent/stream/abc")
+    assert response.text.rstrip().endswith(f"data: {json.dumps(result)}")
@@ -0,0 +1,104 @@
+import json
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+
+sys.path.append(os.getcwd())
+
+from app.core.config import settings
+from app.services import session_memory
+from app.services.session_memory import bind_history, compact, load, load_history, record_turn, with_history
+
+
+@pytest.fixture
+def fake_redis():
+    client = fakeredis.FakeRedis()
+    with patch.object(session_memory, "get_redis", return_value=client), \
+            patch.object(settings, "SESSION_HISTORY_TOKEN_BUDGET", 120), \
+            patch.object(settings, "SESSION_SUMMARY_MAX_TOKENS", 40), \
+            patch.object(settings, "SESSION_KEEP_RECENT_TURNS", 2):
+        yield client
+
+
+def _summarize(summary, transcript):
+    return f"{summary} | {transcript.count('User:')} turns".strip(" |")
+
+
+def test_short_sessions_are_kept_verbatim(fake_redis):
+    assert record_turn("s1", "What is Redis?", "An in-memory data store.") is False
+    summary, turns = load("s1")
+    assert summary == ""
+    assert turns == [{"user": "What is Redis?", "assistant": "An in-memory data store."}]
+    history = load_history("s1")
+    assert "User: What is Redis?" in history and "Assistant: An in-memory data store." in history
+    assert 0 < fake_redis.ttl(session_memory._keys("s1")[0]) <= settings.SESSION_TTL_SECONDS
+
+
+def test_oldest_turns_are_folded_into_the_summary(fake_redis):
+    summarize = MagicMock(side_effect=_summarize)
+    for i in range(8):
+        if record_turn("s1", f"Question {i} " + "detail " * 10, f"Answer {i} " + "text " * 10):
+            compact("s1", summarize)
+
+    summary, turns = load("s1")
+    assert summarize.called and summary
+    # The newest turns survive verbatim and the whole history fits the budget again
+    assert len(turns) >= settings.SESSION_KEEP_RECENT_TURNS
+    assert turns[-1]["user"].startswith("Question 7")
+    assert summarize.call_args.args[1].count("User:") >= 1
+    assert "Question 0" not in load_history("s1")
+
+
+def test_concurrent_compaction_is_skipped(fake_redis):
+    turns_key, _, lock_key = session_memory._keys("s1")
+    fake_redis.rpush(turns_key, *[json.dumps({"user": "q " * 60, "assistant": "a " * 60}) for _ in range(4)])
+    fake_redis.set(lock_key, 1)
+    assert compact("s1", _summarize) == 0
+    fake_redis.delete(lock_key)
+    assert compact("s1", _summarize) > 0
+    assert fake_redis.get(lock_key) is None
+
+
+def test_history_prefixes_prompts_only_inside_the_binding():
+    assert with_history("Next question") == "Next question"
+    with bind_history("Conversation so far: ..."):
+        assert with_history("Next question") == "Conversation so far: ...\n\nNext question"
+    with bind_history(""):
+        assert with_history("Next question") == "Next question"
+
+
+def test_session_failures_do_not_fail_the_task():
+    with patch.object(session_memory, "get_redis", side_effect=ConnectionError("redis down")):
+        assert load_history("s1") == ""
+        assert record_turn("s1", "task", "answer") is False
+    assert load_history(None) == ""
+
+
+def test_compaction_runs_as_its_own_task(fake_redis):
+    from app.services import queue
+
+    with patch.object(session_memory, "record_turn", return_value=True), \
+            patch.object(queue.compact_session, "delay") as delay, \
+            patch.object(queue.get_content_agent(), "summarize", side_effect=AssertionError("summarized inline")):
+        queue._record_turn("s1", "task", {"status": "completed", "result": "answer"})
+    delay.assert_called_once_with("s1")
+
+
+def test_answers_see_the_history_but_internal_prompts_do_not():
+    from app.agents.content import ContentAgent
+
+    agent = ContentAgent()
+    agent.llm = MagicMock(model_name="m", temperature=0.2)
+    agent.llm.invoke.return_value = MagicMock(content="reply", usage_metadata=None)
+    agent.escalation_llms = []
+    with bind_history("Conversation so far: ..."), \
+            patch("app.agents.base_agent.llm_cache.get", return_value=None), \
+            patch("app.agents.base_agent.llm_cache.set"):
+        agent._complete("Rewrite this query")
+        agent._cascade("Answer this")
+    prompts = [c.args[0] for c in agent.llm.invoke.call_args_list]
+    assert prompts[0] == "Rewrite this query"
+    assert prompts[1].startswith("Conversation so far: ...")
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import fakeredis
+import pytest
+
+sys.path.append(os.getcwd())
+
+from app.core.config import settings
+from app.services import queue, singleflight
+
+
+@pytest.fixture
+def fake_redis():
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    with patch.object(singleflight, "get_redis", return_value=client), \
+            patch.object(singleflight, "get_async_redis", side_effect=lambda: fakeredis.aioredis.FakeRedis(server=server)), \
+            patch.object(settings, "TASK_EVENTS_ENABLED", False), \
+            patch.object(settings, "SINGLEFLIGHT_POLL_INTERVAL_MS", 10):
+        yield client
+
+
+def test_fingerprint_ignores_case_and_whitespace():
+    assert singleflight.task_fingerprint("What is  Python?") == singleflight.task_fingerprint(" what is python? ")
+    assert singleflight.task_fingerprint("What is Python?") != singleflight.task_fingerprint("What is Rust?")
+
+
+def test_leader_executes_and_shares_result():
+    with patch.object(queue, "_log_to_mongo"), \
+         patch.object(singleflight, "join", return_value=(None, None)), \
+         patch.object(singleflight, "complete") as complete_mock:
+        result = queue.process_task.run("t-leader", "What is the capital of France?")
+    assert result["status"] == "completed"
+    assert result["deduplicated_from"] is None
+    complete_mock.assert_called_once()
+    assert complete_mock.call_args.args[1] == "t-leader"
+
+
+def test_follower_reuses_leader_result_without_executing():
+    shared = {"task_id": "t-leader", "status": "completed", "result": "Paris", "agent": "content_agent"}
+    with patch.object(queue, "_log_to_mongo") as log_mock, \
+         patch.object(queue, "_run_task") as run_mock, \
+         patch.object(singleflight, "join", return_value=("t-leader", None)), \
+         patch.object(singleflight, "wait", return_value=shared):
+        result = queue.process_task.run("t-follower", "What is the capital of France?")
+    run_mock.assert_not_called()
+    assert result["task_id"] == "t-follower"
+    assert result["result"] == "Paris"
+    assert result["deduplicated_from"] == "t-leader"
+    log_mock.assert_called_once()
+
+
+def test_follower_executes_itself_when_leader_fails():
+    failed = {"task_id": "t-leader", "status": "failed", "error": "boom"}
+    with patch.object(queue, "_log_to_mongo"), \
+         patch.object(singleflight, "join", return_value=("t-leader", None)), \
+         patch.object(singleflight, "wait", return_value=failed):
+        result = queue.process_task.run("t-follower", "What is the capital of France?")
+    assert result["status"] == "completed"
+    assert result["deduplicated_from"] is None
+
+
+def test_dedupe_disabled_skips_singleflight():
+    join_mock = MagicMock()
+    with patch.object(queue, "_log_to_mongo"), patch.object(singleflight, "join", join_mock):
+        queue.process_task.run("t-1", "What is the capital of France?", dedupe=False)
+        queue.process_task.run("t-2", "What is the capital of France?", use_cache=False)
+    join_mock.assert_not_called()
+
+
+def test_follower_gets_leader_result_without_task_events(fake_redis):
+    fingerprint = singleflight.task_fingerprint("What is the capital of France?")
+    assert singleflight.join(fingerprint, "t-leader") == (None, None)
+    shared = {"task_id": "t-leader", "status": "completed", "result": "Paris", "agent": "content_agent"}
+    threading.Timer(0.05, singleflight.complete, args=(fingerprint, "t-leader", shared)).start()
+    with patch.object(queue, "_log_to_mongo"), \
+            patch.object(queue, "_run_task", side_effect=AssertionError("follower executed")):
+        result = queue.process_task.run("t-follower", "What is the capital of France?")
+    assert result["result"] == "Paris"
+    assert result["deduplicated_from"] == "t-leader"
+
+
+def test_follower_takes_over_once_leader_lock_is_gone(fake_redis):
+    fingerprint = singleflight.task_fingerprint("What is the capital of France?")
+    fake_redis.set(singleflight._lock_key(fingerprint), "t-crashed", px=50)
+    started = time.monotonic()
+    assert singleflight.wait(fingerprint, "t-crashed", timeout=5) is None
+    assert time.monotonic() - started < 1
+
+
+def test_leader_renews_its_lease_while_running(fake_redis):
+    fingerprint = singleflight.task_fingerprint("slow task")
+    with patch.object(settings, "SINGLEFLIGHT_LEASE_SECONDS", 1):
+        assert singleflight.join(fingerprint, "t-leader") == (None, None)
+        with singleflight.hold(fingerprint, "t-leader"):
+            time.sleep(1.5)
+            assert fake_redis.get(singleflight._lock_key(fingerprint)) == b"t-leader"
+        singleflight.complete(fingerprint, "t-leader", {"task_id": "t-leader", "status": "failed"})
+    assert fake_redis.get(singleflight._lock_key(fingerprint)) is None
+    assert fake_redis.get(singleflight._result_key(fingerprint)) is None
+
+
+def test_async_follower_polls_the_shared_result(fake_redis):
+    fingerprint = singleflight.task_fingerprint("What is the capital of France?")
+    fake_redis.set(singleflight._lock_key(fingerprint), "t-leader")
+    fake_redis.set(singleflight._result_key(fingerprint), json.dumps({"task_id": "t-leader", "status": "completed"}))
+    shared = asyncio.run(singleflight.await_result(fingerprint, "t-leader", timeout=1))
+    assert shared["status"] == "completed"
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import sys
+import time
+from unittest.mock import AsyncMock, MagicMock, PropertyMock, patch
+
+import fakeredis
+from fastapi.testclient import TestClient
+
+sys.path.append(os.getcwd())
+
+from app.api import routes
+from app.core.config import settings
+from app.main import app
+from app.services.celery_app import celery_app
+from app.services.events import TokenBuffer
+
+client = TestClient(app)
+
+
+def test_token_buffer_sends_first_token_immediately_then_coalesces():
+    buffer = TokenBuffer(interval=60)
+    assert buffer.add("Hel") == "Hel"
+    assert buffer.add("lo") is None
+    assert buffer.add(" world") is None
+    assert buffer.drain() == "lo world"
+    assert buffer.drain() is None
+
+
+def test_stream_endpoint_relays_events_until_done():
+    async def fake_events(task_id, last_event_id="0-0", block_ms=15000):
+        yield "1-0", "routed", '{"agent": "dev_agent"}'
+        yield "2-0", "token", '"print(1)"'
+        yield "3-0", "done", '{"status": "completed"}'
+
+    with patch("app.api.routes.iter_events", fake_events):
+        response = client.get("/v1/agent/stream/abc")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    body = response.text
+    assert "event: routed" in body
+    assert 'data: "print(1)"' in body
+    assert body.rstrip().endswith('data: {"status": "completed"}')
+
+
+def _pending_result():
+    result = MagicMock()
+    result.status = "PENDING"
+    result.result = None
+    return result
+
+
+def test_status_wait_returns_done_payload():
+    done = {"task_id": "abc", "status": "completed", "result": "42"}
+    with patch("app.api.routes.AsyncResult", return_value=_pending_result()), \
+            patch("app.api.routes.wait_for_done", new=AsyncMock(return_value=done)) as waiter:
+        response = client.get("/v1/agent/status/abc?wait=5")
+    assert response.json()["status"] == "SUCCESS"
+    assert response.json()["result"] == done
+    assert waiter.await_args.args == ("abc", 5)
+
+
+def test_status_falls_back_to_task_logs_when_backend_forgot():
+    logged = {"task_id": "old", "status": "completed", "result": "from mongo"}
+    with patch("app.api.routes.AsyncResult", return_value=_pending_result()), \
+            patch("app.api.routes.is_known", new=AsyncMock(return_value=False)), \
+            patch("app.api.routes._find_logged_result", new=AsyncMock(return_value=logged)):
+        response = client.get("/v1/agent/status/old")
+    assert response.json()["status"] == "SUCCESS"
+    assert response.json()["result"]["result"] == "from mongo"
+
+
+def test_status_of_in_flight_task_skips_task_logs():
+    with patch("app.api.routes.AsyncResult", return_value=_pending_result()), \
+            patch("app.api.routes.is_known", new=AsyncMock(return_value=True)), \
+            patch("app.api.routes._find_logged_result", new=AsyncMock()) as lookup:
+        response = client.get("/v1/agent/status/running")
+    assert response.json()["status"] == "PENDING"
+    lookup.assert_not_awaited()
+
+
+def test_status_checks_task_logs_after_an_expired_wait():
+    logged = {"task_id": "abc", "status": "completed", "result": "from mongo"}
+    with patch("app.api.routes.AsyncResult", return_value=_pending_result()), \
+            patch("app.api.routes.wait_for_done", new=AsyncMock(return_value=None)), \
+            patch("app.api.routes.is_known", new=AsyncMock(return_value=True)), \
+            patch("app.api.routes._find_logged_result", new=AsyncMock(return_value=logged)):
+        response = client.get("/v1/agent/status/abc?wait=1")
+    assert response.json()["result"]["result"] == "from mongo"
+
+
+def test_status_wait_wakes_on_failure_without_task_events():
+    task_result = MagicMock()
+    type(task_result).status = PropertyMock(side_effect=["PENDING", "FAILURE"])
+    task_result.result = RuntimeError("boom")
+    started = time.monotonic()
+    with patch.object(settings, "TASK_EVENTS_ENABLED", False), \
+            patch("app.api.routes.AsyncResult", return_value=task_result), \
+            patch("app.api.routes._wait_for_backend", new=AsyncMock()), \
+            patch("app.api.routes.wait_for_done", new=AsyncMock()) as events:
+        response = client.get("/v1/agent/status/abc?wait=30")
+    assert time.monotonic() - started < 5
+    assert response.json()["status"] == "FAILURE"
+    assert response.json()["error"] == "boom"
+    events.assert_not_awaited()
+
+
+def test_backend_wait_returns_once_a_final_state_is_published():
+    redis = fakeredis.FakeAsyncRedis()
+    backend = celery_app.backend
+    key = backend.get_key_for_task("abc")
+
+    async def scenario():
+        waiter = asyncio.ensure_future(routes._wait_for_backend("abc"))
+        await asyncio.sleep(0.05)
+        await redis.publish(key, backend.encode({"task_id": "abc", "status": "STARTED", "result": None}))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        meta = backend.encode({"task_id": "abc", "status": "FAILURE", "result": None})
+        await redis.set(key, meta)
+        await redis.publish(key, meta)
+        await asyncio.wait_for(waiter, 1)
+
+    with patch("app.api.routes.get_async_redis", return_value=redis):
+        asyncio.run(scenario())
+
+
+def test_backend_wait_returns_at_once_for_a_stored_result():
+    redis = fakeredis.FakeAsyncRedis()
+    backend = celery_app.backend
+
+    async def scenario():
+        await redis.set(backend.get_key_for_task("abc"), backend.encode({"task_id": "abc", "status": "SUCCESS", "result": 1}))
+        await asyncio.wait_for(routes._wait_for_backend("abc"), 1)
+
+    with patch("app.api.routes.get_async_redis", return_value=redis):
+        asyncio.run(scenario())
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+sys.path.append(os.getcwd())
+
+from app.main import app
+from app.services import task_logs
+from app.services.task_logs import build_query, decode_cursor, encode_cursor, query_logs
+
+client = TestClient(app)
+
+
+def _documents(count: int):
+    start = datetime(2026, 1, 1, 12, 0, 0)
+    return [
+        {"_id": ObjectId(), "task_id": str(i), "status": "completed", "agent": "dev_agent",
+         "duration_ms": 10.0 * i, "created_at": start - timedelta(seconds=i)}
+        for i in range(count)
+    ]
+
+
+def _collection(documents):
+    collection = MagicMock()
+    cursor = collection.find.return_value.sort.return_value.limit.return_value
+    cursor.to_list = AsyncMock(return_value=documents)
+    return collection
+
+
+def test_cursor_round_trips_and_continues_after_the_last_document():
+    document = _documents(1)[0]
+    created_at, last_id = decode_cursor(encode_cursor(document))
+    assert (created_at, last_id) == (document["created_at"], document["_id"])
+
+    query = build_query(agent="dev_agent", cursor=encode_cursor(document))
+    assert query["agent"] == "dev_agent"
+    assert query["$or"] == [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": last_id}},
+    ]
+
+
+def test_page_has_next_cursor_and_projected_fields():
+    documents = _documents(3)
+    last_id = documents[1]["_id"]
+    collection = _collection(documents)
+    with patch.object(task_logs, "get_async_logs_collection", return_value=collection):
+        page = asyncio.run(query_logs(fields="task_id,duration_ms", limit=2))
+    assert page["items"] == [{"task_id": "0", "duration_ms": 0.0}, {"task_id": "1", "duration_ms": 10.0}]
+    assert decode_cursor(page["next_cursor"])[1] == last_id
+    query, projection = collection.find.call_args.args
+    assert projection == {"task_id": 1, "duration_ms": 1, "created_at": 1}
+    collection.find.return_value.sort.return_value.limit.assert_called_once_with(3)
+
+
+def test_last_page_has_no_cursor():
+    with patch.object(task_logs, "get_async_logs_collection", return_value=_collection(_documents(2))):
+        page = asyncio.run(query_logs(limit=5))
+    assert page["next_cursor"] is None
+    assert page["items"][0]["created_at"].tzinfo is not None
+
+
+def test_bad_cursor_and_unknown_fields_are_rejected():
+    assert client.get("/v1/agent/logs", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/v1/agent/logs", params={"fields": "task_id,password"}).status_code == 400
+    assert client.get("/v1/agent/logs", params={"limit": 0}).status_code == 422
+
+
+def test_stats_reshape_server_side_percentiles():
+    collection = MagicMock()
+    rows = [{"_id": "content_agent", "count": 4, "failed": 1, "avg_ms": 250.0, "percentiles_ms": [200.0, 400.0, 480.0]}]
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=rows)
+    collection.aggregate = AsyncMock(return_value=cursor)
+    with patch.object(task_logs, "get_async_logs_collection", return_value=collection):
+        response = client.get("/v1/agent/logs/stats")
+    assert response.status_code == 200
+    assert response.json()["agents"] == [
+        {"agent": "content_agent", "count": 4, "failed": 1, "avg_ms": 250.0, "p50_ms": 200.0, "p95_ms": 400.0, "p99_ms": 480.0}
+    ]
+    group = collection.aggregate.call_args.args[0][1]["$group"]
+    assert group["percentiles_ms"]["$percentile"]["p"] == [0.5, 0.95, 0.99]